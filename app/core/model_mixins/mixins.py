@@ -0,0 +1,92 @@
+from copy import deepcopy
+from django.db.models.fields.files import FieldFile
+
+
+class RastreioAlteracoesMixin:
+    """Guarda os valores dos campos ao carregar da DB para saber o que mudou sem novo SELECT.
+
+    - has_changed("status") / changed_fields / valor_original("status")
+      (para FileField/ImageField o valor guardado e o caminho do ficheiro)
+    - save() de um registo existente grava apenas as colunas alteradas (update_fields)
+    - sem alteracoes grava so os campos auto_now (ou a linha toda, se nao houver), para manter
+      post_save e data_atualizacao; com `ignorar_save_sem_alteracoes = True` nao grava nada
+    - se a linha foi apagada entretanto, o UPDATE parcial nao afeta nenhuma linha e o save
+      levanta DatabaseError (como save(update_fields=...)) em vez de a voltar a inserir;
+      recuperar dentro de um atomic exigiria um savepoint em cada save
+    - depois de gravar chama ao_mudar_<campo>(anterior, novo) para cada campo alterado
+      que tenha esse metodo (ex: ao_mudar_status)
+    """
+
+    ignorar_save_sem_alteracoes = False
+
+    @staticmethod
+    def _copiar(valor):
+        # FieldFile.save() altera o proprio objeto: guarda-se o caminho (name) para comparar
+        if isinstance(valor, FieldFile):
+            return valor.name
+        return deepcopy(valor) if isinstance(valor, (dict, list)) else valor
+
+    def _guardar_estado(self, campos=None):
+        estado = getattr(self, "_estado_original", {})
+        deferidos = self.get_deferred_fields()
+        for campo in self._meta.concrete_fields:
+            if campo.attname in deferidos:
+                continue
+            if campos is not None and campo.name not in campos and campo.attname not in campos:
+                continue
+            estado[campo.attname] = self._copiar(getattr(self, campo.attname))
+        self._estado_original = estado
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        instancia._guardar_estado()
+        return instancia
+
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        self._guardar_estado(fields)
+
+    def _attname(self, campo):
+        return self._meta.get_field(campo).attname
+
+    def valor_original(self, campo):
+        """Valor do campo quando foi carregado (None para registos novos)."""
+        return getattr(self, "_estado_original", {}).get(self._attname(campo))
+
+    def has_changed(self, campo):
+        attname = self._attname(campo)
+        estado = getattr(self, "_estado_original", {})
+        if self._state.adding or attname not in estado:
+            return True
+        return estado[attname] != self._copiar(getattr(self, attname))
+
+    @property
+    def changed_fields(self):
+        """Nomes dos campos alterados desde o carregamento (todos, para registos novos)."""
+        deferidos = self.get_deferred_fields()
+        return [
+            campo.name for campo in self._meta.concrete_fields
+            if not campo.primary_key and campo.attname not in deferidos and self.has_changed(campo.name)
+        ]
+
+    def save(self, *args, **kwargs):
+        alterados = self.changed_fields
+        anteriores = {campo: self.valor_original(campo) for campo in alterados}
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            if not alterados and self.ignorar_save_sem_alteracoes:
+                return
+            # auto_now (data_atualizacao) acompanha sempre a gravacao
+            auto_now = [campo.name for campo in self._meta.concrete_fields if getattr(campo, "auto_now", False)]
+            campos = sorted(set(alterados) | set(auto_now))
+            if campos:
+                kwargs["update_fields"] = campos
+        super().save(*args, **kwargs)
+        gravados = kwargs.get("update_fields")
+        self._guardar_estado(gravados)
+        for campo in alterados:
+            if gravados is not None and campo not in gravados:
+                continue
+            gancho = getattr(self, f"ao_mudar_{campo}", None)
+            if gancho is not None:
+                gancho(anteriores[campo], getattr(self, campo))
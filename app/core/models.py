@@ -8,6 +8,7 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.models import AbstractUser, BaseUserManager, Group, Permission
 from django.core.validators import MinValueValidator, EmailValidator, RegexValidator
 from phonenumber_field.modelfields import PhoneNumberField
+from core.model_mixins.mixins import RastreioAlteracoesMixin
 
 validar_email = EmailValidator(message='Digite um email válido')
 
@@ -37,7 +38,7 @@ class UserManager(BaseUserManager):
         return self.create_user(email, nome, role="ADMIN", password=password, **extra_fields)
 
 
-class User(AbstractUser):
+class User(RastreioAlteracoesMixin, AbstractUser):
     CARGO_CHOICES = [
         ("ADMIN", "Administrador"),
         ("ALUNO", "Aluno"),
@@ -90,7 +91,7 @@ class User(AbstractUser):
         return f"{self.nome} - {self.email} ({self.get_role_display()})"
 
 
-class Encarregado(models.Model):
+class Encarregado(RastreioAlteracoesMixin, models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -115,7 +116,7 @@ class Encarregado(models.Model):
         return f"Encarregado: {self.user.nome} - {self.user.email}"
 
 
-class Aluno(models.Model):
+class Aluno(RastreioAlteracoesMixin, models.Model):
     """Perfil vinculado a um usuário com role=Aluno"""
 
     user = models.OneToOneField(
@@ -172,7 +173,7 @@ class Aluno(models.Model):
         return f"Aluno: {self.user.nome} - {self.user.email}"
 
 
-class Motorista(models.Model):
+class Motorista(RastreioAlteracoesMixin, models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
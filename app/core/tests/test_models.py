@@ -1,6 +1,12 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from core.models import Encarregado
 
 User = get_user_model()
 
@@ -50,3 +56,59 @@ class UserManagerTests(TestCase):
         self.assertEqual(user.role, 'ADMIN')
         self.assertTrue(user.is_staff)
         self.assertTrue(user.is_superuser)
+
+
+class RastreioAlteracoesTests(TestCase):
+
+    def setUp(self):
+        User.objects.create_user(email='rastreio@example.com', nome='Rastreio', password='password123', role='ALUNO')
+        self.user = User.objects.get(email='rastreio@example.com')
+
+    def test_changed_fields(self):
+        """Test only modified fields are reported as changed."""
+        self.assertEqual(self.user.changed_fields, [])
+        self.user.nome = 'Outro Nome'
+        self.assertTrue(self.user.has_changed('nome'))
+        self.assertFalse(self.user.has_changed('email'))
+        self.assertEqual(self.user.changed_fields, ['nome'])
+        self.assertEqual(self.user.valor_original('nome'), 'Rastreio')
+
+    def test_save_updates_only_changed_columns(self):
+        """Test save narrows the UPDATE to the changed columns and resets the state."""
+        self.user.salario = 1000
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertEqual(len(ctx), 1)
+        self.assertIn('"salario"', ctx[0]['sql'])
+        self.assertNotIn('"email"', ctx[0]['sql'])
+        self.assertEqual(self.user.changed_fields, [])
+
+    def test_save_sem_alteracoes(self):
+        """Test save without changes still writes (post_save fires) unless the model opts out."""
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertEqual(len(ctx), 1)
+
+        self.user.ignorar_save_sem_alteracoes = True
+        with CaptureQueriesContext(connection) as ctx:
+            self.user.save()
+        self.assertEqual(len(ctx), 0)
+
+    def test_save_de_linha_apagada(self):
+        """Test a partial save of a row deleted meanwhile fails instead of inserting it again."""
+        User.objects.filter(pk=self.user.pk).delete()
+        self.user.nome = 'Recriado'
+        with self.assertRaises(DatabaseError):
+            self.user.save()
+
+    def test_save_grava_ficheiro_substituido(self):
+        """Test replacing a FileField in place is detected and written by the narrowed save."""
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        with override_settings(MEDIA_ROOT=media):
+            encarregado = Encarregado.objects.create(user=self.user, telefone='+258840000000', nrBI='123456789AB')
+            encarregado.foto.save('antiga.png', ContentFile(b'antiga'))
+            encarregado = Encarregado.objects.get(pk=encarregado.pk)
+            encarregado.foto.save('nova.png', ContentFile(b'nova'))
+            self.assertEqual(encarregado.changed_fields, [])
+            self.assertTrue(Encarregado.objects.get(pk=encarregado.pk).foto.name.endswith('nova.png'))
@@ -1,5 +1,10 @@
 from django.contrib import admin
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from django.utils import timezone
+from financeiro.services.exportacao import exportar_mensalidades, exportar_pagamentos
+from financeiro.models import (
+    Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, ResumoMensal, Tarefa, ChaveIdempotencia,
+    Lancamento, SaldoDiario,
+)
 
 
 @admin.register(Mensalidade)
@@ -18,6 +23,29 @@ class MensalidadeAdmin(admin.ModelAdmin):
     list_filter = ("status", "data_vencimento", "data_limite")
     search_fields = ("aluno__nome",)
     date_hierarchy = "data_vencimento"
+    actions = ["exportar_csv"]
+
+    def exportar_csv(self, request, queryset):
+        return exportar_mensalidades(queryset)
+    exportar_csv.short_description = "Exportar mensalidades selecionadas (CSV)"
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_financials().select_related("aluno__user")
+
+    def valor_atualizado(self, obj):
+        return obj.valor_atualizado
+    valor_atualizado.short_description = "Valor atualizado"
+    valor_atualizado.admin_order_field = "valor_atualizado_sql"
+
+    def total_pago(self, obj):
+        return obj.total_pago
+    total_pago.short_description = "Total pago"
+    total_pago.admin_order_field = "total_pago_sql"
+
+    def valor_devido(self, obj):
+        return obj.valor_devido
+    valor_devido.short_description = "Valor devido"
+    valor_devido.admin_order_field = "valor_devido_sql"
     # readonly_fields = ("valor_atualizado",)
     # # readonly_fields = ("valor_atualizado", "total_pago", "valor_devido")
     # def mostrar_valor_atualizado():
@@ -35,6 +63,11 @@ class PagamentoAdmin(admin.ModelAdmin):
     )
     list_filter = ("metodo_pagamento", "data_pagamento")
     search_fields = ("mensalidade__aluno__nome",)
+    actions = ["exportar_csv"]
+
+    def exportar_csv(self, request, queryset):
+        return exportar_pagamentos(queryset)
+    exportar_csv.short_description = "Exportar pagamentos selecionados (CSV)"
 
 
 @admin.register(Salario)
@@ -45,8 +78,9 @@ class SalarioAdmin(admin.ModelAdmin):
         "valor",
         "status",
         "recibo_gerado",
+        "gerado_pela_folha",
     )
-    list_filter = ("status", "mes_referente")
+    list_filter = ("status", "mes_referente", "gerado_pela_folha")
     search_fields = ("funcionario__username", "funcionario__email")
 
 
@@ -81,3 +115,87 @@ class AlertaEnviadoAdmin(admin.ModelAdmin):
     def alunos_count(self, obj):
         return obj.alunos.count()
     alunos_count.short_description = "Qtd Alunos"
+
+
+@admin.register(ResumoMensal)
+class ResumoMensalAdmin(admin.ModelAdmin):
+    list_display = (
+        "mes",
+        "entidade",
+        "status",
+        "metodo_pagamento",
+        "quantidade",
+        "valor_total",
+        "calculado_em",
+    )
+    list_filter = ("entidade", "status", "metodo_pagamento")
+    date_hierarchy = "mes"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ("id", "nome", "status", "tentativas", "executar_em", "duracao_ms", "worker")
+    list_filter = ("status", "nome")
+    search_fields = ("nome", "ultimo_erro")
+    readonly_fields = ("iniciada_em", "concluida_em", "duracao_ms", "worker", "ultimo_erro")
+    actions = ["repetir"]
+
+    def repetir(self, request, queryset):
+        """Devolve tarefas falhadas (dead letter) a fila."""
+        total = queryset.filter(status="FALHADA").update(status="PENDENTE", tentativas=0, executar_em=timezone.now())
+        self.message_user(request, f"{total} tarefas devolvidas a fila")
+    repetir.short_description = "Repetir tarefas falhadas"
+
+
+@admin.register(ChaveIdempotencia)
+class ChaveIdempotenciaAdmin(admin.ModelAdmin):
+    list_display = ("id", "escopo", "chave", "utilizador", "status_code", "criado_em", "expira_em")
+    list_filter = ("escopo", "status_code")
+    search_fields = ("chave",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Lancamento)
+class LancamentoAdmin(admin.ModelAdmin):
+    list_display = ("id", "data", "conta", "valor", "origem_tipo", "origem_id", "estorno", "movimento")
+    list_filter = ("conta", "origem_tipo", "estorno")
+    search_fields = ("movimento",)
+    date_hierarchy = "data"
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SaldoDiario)
+class SaldoDiarioAdmin(admin.ModelAdmin):
+    """Snapshots derivados do razao (criar_snapshots): editar um corrompe os saldos dos dias seguintes."""
+    list_display = ("data", "conta", "saldo", "calculado_em")
+    list_filter = ("conta",)
+    date_hierarchy = "data"
+    readonly_fields = ("conta", "data", "saldo", "calculado_em")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
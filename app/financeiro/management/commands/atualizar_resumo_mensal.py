@@ -0,0 +1,19 @@
+"""Comando django para atualizar o rollup mensal dos relatorios financeiros"""
+from django.core.management.base import BaseCommand
+from financeiro.services.resumo_mensal import atualizar_resumo_mensal
+
+
+class Command(BaseCommand):
+    """Django comando para o rollup ResumoMensal"""
+    help = "Recalcula os meses alterados desde a ultima execucao (ou tudo com --completo)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--completo", action="store_true", help="Reconstroi todo o rollup")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write("Atualizando resumo mensal....")
+        resultado = atualizar_resumo_mensal(completo=options["completo"])
+        for entidade, meses in resultado.items():
+            self.stdout.write(f"{entidade}: {meses} meses recalculados")
+        self.stdout.write(self.style.SUCCESS("Resumo mensal atualizado!"))
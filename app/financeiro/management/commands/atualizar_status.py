@@ -0,0 +1,19 @@
+"""Comando django para atualizar em lote o status de mensalidades e faturas"""
+from django.core.management.base import BaseCommand
+from financeiro.services.status import atualizar_status_em_lote, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para o motor de status (agendar para correr a noite)"""
+    help = "Marca mensalidades/faturas vencidas como ATRASADO e corrige PAGO/PAGO PARCIAL"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write("Atualizando status....")
+        resultado = atualizar_status_em_lote(chunk_size=options["chunk_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Mensalidades alteradas: {resultado['mensalidades']} | Faturas alteradas: {resultado['faturas']}"
+        ))
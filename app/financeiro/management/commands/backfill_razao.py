@@ -0,0 +1,34 @@
+"""Comando django para preencher o razao a partir dos pagamentos, salarios e faturas existentes"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from financeiro.services.razao import ORIGENS, criar_snapshots, saldos, sincronizar
+from financeiro.services.utils import em_blocos
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    """Django comando para o backfill do razao e dos saldos diarios"""
+    help = "Lanca no razao os movimentos que ainda nao estao la (idempotente) e cria os saldos diarios"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--so-snapshots", action="store_true", help="Apenas cria os saldos diarios em falta")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not options["so_snapshots"]:
+            self.stdout.write("Preenchendo o razao....")
+            for tipo, manager in ORIGENS.items():
+                lancados = 0
+                objetos = manager.order_by("pk").iterator(chunk_size=options["batch_size"])
+                for bloco in em_blocos(objetos, options["batch_size"]):
+                    with transaction.atomic():
+                        lancados += sincronizar(tipo, bloco)
+                self.stdout.write(f"{tipo}: {lancados} movimentos lancados")
+
+        criados = criar_snapshots()
+        self.stdout.write(f"Saldos diarios criados: {criados}")
+        for conta, valor in saldos().items():
+            self.stdout.write(f"{conta:>22} {valor:>14}")
+        self.stdout.write(self.style.SUCCESS("Razao atualizado!"))
@@ -0,0 +1,54 @@
+"""Comando django para medir edicoes em massa de faturas pela API"""
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.models import User
+from financeiro.models import Fatura
+from financeiro.views import FaturaViewSet
+
+
+class Command(BaseCommand):
+    """Django comando de benchmark (os dados criados sao revertidos no fim)"""
+    help = "Mede latencia e queries por PATCH em faturas (edicao simples e mudanca de status)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quantidade", type=int, default=500)
+
+    def _editar(self, user, faturas, dados):
+        fabrica = APIRequestFactory()
+        view = FaturaViewSet.as_view({"patch": "partial_update"})
+        inicio = time.perf_counter()
+        with CaptureQueriesContext(connection) as ctx:
+            for fatura in faturas:
+                request = fabrica.patch(f"/financeiro/faturas/{fatura.pk}/", dados, format="json")
+                force_authenticate(request, user=user)
+                response = view(request, pk=fatura.pk)
+                assert response.status_code == 200, response.data
+        total = time.perf_counter() - inicio
+        return total / len(faturas) * 1000, len(ctx) / len(faturas)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with transaction.atomic():
+            user = User.objects.create(email="benchmark@edicoes.local", nome="Benchmark", role="ADMIN")
+            hoje = date.today()
+            Fatura.objects.bulk_create([
+                Fatura(
+                    descricao=f"Fatura {n}", valor=Decimal("100.00"), data_emissao=hoje,
+                    data_vencimento=hoje + timedelta(days=30), email_destinatario="benchmark@edicoes.local",
+                )
+                for n in range(options["quantidade"])
+            ])
+            faturas = list(Fatura.objects.filter(email_destinatario="benchmark@edicoes.local"))
+
+            self.stdout.write(f"{'edicao':>12} {'ms/pedido':>12} {'queries/pedido':>16}")
+            for nome, dados in (("obs", {"obs": "revisto"}), ("status", {"status": "PAGO"})):
+                ms, queries = self._editar(user, faturas, dados)
+                self.stdout.write(f"{nome:>12} {ms:>12.2f} {queries:>16.1f}")
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark concluido (dados revertidos)."))
@@ -0,0 +1,98 @@
+"""Comando django para medir lancamentos concorrentes de pagamentos (PostgreSQL)"""
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from core.models import Aluno, Encarregado, User
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.services.pagamentos import registar_pagamento
+
+EMAIL = "benchmark@pagamentos.local"
+VALOR = Decimal("10.00")
+
+
+class Command(BaseCommand):
+    """Django comando de benchmark (os dados criados sao apagados no fim)"""
+    help = "Lanca pagamentos em paralelo nas mesmas mensalidades e verifica valor_pago e status no fim"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escritores", type=int, default=50, help="Threads em paralelo")
+        parser.add_argument("--pagamentos", type=int, default=20, help="Pagamentos por thread")
+        parser.add_argument("--mensalidades", type=int, default=5, help="Mensalidades disputadas")
+
+    def _criar_dados(self, quantidade, valor):
+        user = User.objects.create(email=EMAIL, nome="Benchmark", role="ENCARREGADO")
+        encarregado = Encarregado.objects.create(user=user, telefone="+258840000000", nrBI="BENCHMARK000")
+        aluno_user = User.objects.create(email=f"aluno.{EMAIL}", nome="Benchmark Aluno", role="ALUNO")
+        aluno = Aluno.objects.create(
+            user=aluno_user, encarregado=encarregado, data_nascimento=date(2015, 1, 1), nrBI="BENCHMARK00A",
+            escola_dest="Benchmark", classe="1", mensalidade=valor,
+        )
+        hoje = date.today()
+        return [
+            Mensalidade.objects.create(
+                aluno=aluno, valor=valor, mes_referente=date(2000 + n, 1, 1),
+                data_vencimento=hoje + timedelta(days=30), data_limite=hoje + timedelta(days=35),
+            ).pk
+            for n in range(quantidade)
+        ]
+
+    def _apagar_dados(self):
+        User.objects.filter(email__endswith=EMAIL).delete()
+
+    def _escrever(self, indice, mensalidades, quantidade, inicio, barreira, erros):
+        try:
+            barreira.wait()
+            for n in range(quantidade):
+                # data unica por pagamento (unique_pagamento_mensalidade)
+                data = inicio + timedelta(microseconds=indice * quantidade + n)
+                registar_pagamento(mensalidades[(indice + n) % len(mensalidades)], VALOR, data_pagamento=data)
+        except Exception as erro:
+            erros.append(erro)
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if connection.vendor != "postgresql":
+            raise CommandError("O benchmark precisa do PostgreSQL (select_for_update e escritas em paralelo)")
+        escritores, por_escritor = options["escritores"], options["pagamentos"]
+        total = escritores * por_escritor
+        if total % options["mensalidades"]:
+            raise CommandError("escritores * pagamentos tem de ser multiplo de --mensalidades")
+
+        self._apagar_dados()
+        # cada mensalidade recebe exatamente o seu valor: no fim todas tem de estar PAGO
+        mensalidades = self._criar_dados(options["mensalidades"], VALOR * total / options["mensalidades"])
+        try:
+            barreira = threading.Barrier(escritores + 1)
+            erros = []
+            inicio = timezone.now()
+            threads = [
+                threading.Thread(target=self._escrever, args=(i, mensalidades, por_escritor, inicio, barreira, erros))
+                for i in range(escritores)
+            ]
+            for thread in threads:
+                thread.start()
+            barreira.wait()
+            cronometro = time.perf_counter()
+            for thread in threads:
+                thread.join()
+            segundos = time.perf_counter() - cronometro
+            if erros:
+                raise CommandError(f"{len(erros)} escritores falharam: {erros[0]!r}")
+
+            self.stdout.write(f"{total} pagamentos em {segundos:.2f}s ({total / segundos:.0f} pagamentos/s)")
+            qs = Mensalidade.objects.filter(pk__in=mensalidades)
+            divergentes = qs.com_divergencia().count()
+            nao_pagas = qs.exclude(status="PAGO").count()
+            lancados = Pagamento.objects.filter(mensalidade__in=mensalidades).count()
+            self.stdout.write(f"Lancados: {lancados} | Divergencias: {divergentes} | Nao pagas: {nao_pagas}")
+            if divergentes or nao_pagas or lancados != total:
+                raise CommandError("Totais inconsistentes apos os lancamentos concorrentes")
+        finally:
+            self._apagar_dados()
+        self.stdout.write(self.style.SUCCESS("Totais consistentes!"))
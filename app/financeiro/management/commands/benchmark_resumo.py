@@ -0,0 +1,69 @@
+"""Comando django para medir a latencia do resumo financeiro com volumes crescentes"""
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from core.models import User, Encarregado, Aluno
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.services.resumo import calcular_resumo, obter_resumo
+
+
+class Command(BaseCommand):
+    """Django comando de benchmark (os dados criados sao revertidos no fim)"""
+    help = "Mede o resumo financeiro (sem cache e com cache) para 1k..1M pagamentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000, 1000000])
+        parser.add_argument("--repeticoes", type=int, default=5)
+
+    def _medir(self, funcao, repeticoes):
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            funcao()
+        return (time.perf_counter() - inicio) / repeticoes * 1000
+
+    def _criar_pagamentos(self, mensalidades, quantidade, offset):
+        agora = timezone.now()
+        for inicio in range(0, quantidade, 10000):
+            Pagamento.objects.bulk_create([
+                Pagamento(
+                    mensalidade=mensalidades[n % len(mensalidades)],
+                    valor=Decimal("10.00"),
+                    data_pagamento=agora - timedelta(seconds=offset + n),
+                )
+                for n in range(inicio, min(inicio + 10000, quantidade))
+            ])
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        with transaction.atomic():
+            user = User.objects.create(email="benchmark@resumo.local", nome="Benchmark", role="ENCARREGADO")
+            encarregado = Encarregado.objects.create(user=user, telefone="+258840000000", nrBI="999999999999B")
+            mensalidades = []
+            for n in range(100):
+                aluno_user = User.objects.create(email=f"benchmark{n}@resumo.local", nome="Benchmark", role="ALUNO")
+                aluno = Aluno.objects.create(
+                    user=aluno_user, encarregado=encarregado, data_nascimento=date(2015, 1, 1),
+                    nrBI=f"{n:012d}B", escola_dest="Benchmark", classe="1a",
+                )
+                mensalidades.append(Mensalidade.objects.create(
+                    aluno=aluno, valor=Decimal("1000.00"), mes_referente=date.today().replace(day=1),
+                    data_vencimento=date.today(), data_limite=date.today(),
+                ))
+
+            criados = 0
+            self.stdout.write(f"{'pagamentos':>12} {'sem cache (ms)':>16} {'com cache (ms)':>16}")
+            for tamanho in sorted(options["tamanhos"]):
+                self._criar_pagamentos(mensalidades, tamanho - criados, criados)
+                criados = tamanho
+                frio = self._medir(calcular_resumo, options["repeticoes"])
+                cache.delete("financeiro:resumo::")
+                obter_resumo()
+                quente = self._medir(obter_resumo, options["repeticoes"])
+                self.stdout.write(f"{tamanho:>12} {frio:>16.2f} {quente:>16.3f}")
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS("Benchmark concluido (dados revertidos)."))
@@ -0,0 +1,46 @@
+"""Comando django para conciliar um extrato bancario com as mensalidades em aberto"""
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services.importacao import ler_linhas
+from financeiro.services.conciliacao import propor_conciliacao, aplicar_conciliacao, CONFIANCA_MINIMA
+
+
+class Command(BaseCommand):
+    """Django comando para conciliacao bancaria (transferencias -> mensalidades)"""
+    help = "Propoe correspondencias entre as linhas do extrato e as mensalidades; --aplicar cria os pagamentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="CSV (valor,data,referencia) ou JSON lines")
+        parser.add_argument("--formato", choices=["csv", "jsonl"])
+        parser.add_argument("--confianca-minima", type=Decimal, default=CONFIANCA_MINIMA)
+        parser.add_argument("--aplicar", action="store_true", help="Cria os pagamentos das correspondencias")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        caminho = options["arquivo"]
+        formato = options["formato"] or ("jsonl" if caminho.endswith((".jsonl", ".json")) else "csv")
+        try:
+            arquivo = open(caminho, encoding="utf-8-sig", newline="")
+        except OSError as erro:
+            raise CommandError(f"Nao foi possivel abrir {caminho}: {erro}")
+
+        self.stdout.write(f"Conciliando {caminho}....")
+        with arquivo:
+            propostas, sem_correspondencia = propor_conciliacao(
+                ler_linhas(arquivo, formato), confianca_minima=options["confianca_minima"]
+            )
+
+        for proposta in propostas:
+            self.stdout.write(
+                f"Linha {proposta['linha']}: mensalidade {proposta['mensalidade']} "
+                f"({proposta['confianca']}: {', '.join(proposta['motivos'])})"
+            )
+        for linha in sem_correspondencia:
+            self.stdout.write(self.style.WARNING(f"Linha {linha['linha']}: {linha['motivo']}"))
+        self.stdout.write(f"Correspondencias: {len(propostas)} | Sem correspondencia: {len(sem_correspondencia)}")
+
+        if options["aplicar"] and propostas:
+            resultado = aplicar_conciliacao(propostas)
+            self.stdout.write(self.style.SUCCESS(
+                f"Pagamentos criados: {resultado['importados']} | Duplicados: {resultado['duplicados']}"
+            ))
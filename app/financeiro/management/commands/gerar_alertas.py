@@ -0,0 +1,36 @@
+"""Comando django para gerar e enviar os alertas de mensalidades em atraso"""
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services.alertas import gerar_alertas_atraso, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para alertas de atraso agrupados por encarregado"""
+    help = "Cria um alerta de atraso por encarregado no periodo (AAAA-MM) e envia os emails em lote"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--periodo", help="Mes no formato AAAA-MM (padrao: mes atual)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument("--sem-envio", action="store_true", help="Apenas cria os alertas (RETIDO, fora do reenvio)")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        periodo = None
+        if options["periodo"]:
+            try:
+                ano, mes = (int(parte) for parte in options["periodo"].split("-"))
+                periodo = date(ano, mes, 1)
+            except ValueError:
+                raise CommandError("Periodo invalido, use o formato AAAA-MM")
+
+        self.stdout.write("Gerando alertas de atraso....")
+        inicio = time.perf_counter()
+        resultado = gerar_alertas_atraso(
+            periodo, batch_size=options["batch_size"], enviar=not options["sem_envio"]
+        )
+        self.stdout.write(
+            f"Alertas: {resultado['alertas']} | Enviados: {resultado['enviados']} | "
+            f"Falhas: {resultado['falhas']} | Tempo: {time.perf_counter() - inicio:.2f}s"
+        )
+        self.stdout.write(self.style.SUCCESS("Alertas gerados!"))
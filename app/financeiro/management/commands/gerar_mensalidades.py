@@ -0,0 +1,33 @@
+"""Comando django para gerar as mensalidades do mes para todos os alunos ativos"""
+from django.core.management.base import BaseCommand
+from financeiro.services.faturacao import gerar_mensalidades, DIA_VENCIMENTO, DIAS_LIMITE, CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para faturacao mensal"""
+    help = "Gera uma mensalidade por aluno ativo para o mes/ano indicado"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ano", type=int, required=True)
+        parser.add_argument("--mes", type=int, required=True, choices=range(1, 13))
+        parser.add_argument("--dia-vencimento", type=int, default=DIA_VENCIMENTO)
+        parser.add_argument("--dias-limite", type=int, default=DIAS_LIMITE)
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write(f"Gerando mensalidades de {options['mes']:02d}/{options['ano']}....")
+        resultado = gerar_mensalidades(
+            options["ano"],
+            options["mes"],
+            dia_vencimento=options["dia_vencimento"],
+            dias_limite=options["dias_limite"],
+            chunk_size=options["chunk_size"],
+        )
+        self.stdout.write(
+            f"Criadas: {resultado['criadas']} | Ignoradas: {resultado['ignoradas']} | Falhas: {resultado['falhas']}"
+        )
+        if resultado["falhas"]:
+            self.stdout.write(self.style.WARNING("Existem falhas, execute de novo para continuar."))
+        else:
+            self.stdout.write(self.style.SUCCESS("Mensalidades geradas!"))
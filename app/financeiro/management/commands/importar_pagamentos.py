@@ -0,0 +1,34 @@
+"""Comando django para importar pagamentos de um extrato (CSV ou JSON lines)"""
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services.importacao import importar_pagamentos, ler_linhas, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para importacao em massa de pagamentos"""
+    help = "Importa pagamentos de um ficheiro CSV (com cabecalho) ou JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo")
+        parser.add_argument("--formato", choices=["csv", "jsonl"])
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        caminho = options["arquivo"]
+        formato = options["formato"] or ("jsonl" if caminho.endswith((".jsonl", ".json")) else "csv")
+        try:
+            arquivo = open(caminho, encoding="utf-8-sig", newline="")
+        except OSError as erro:
+            raise CommandError(f"Nao foi possivel abrir {caminho}: {erro}")
+
+        self.stdout.write(f"Importando pagamentos de {caminho}....")
+        with arquivo:
+            resultado = importar_pagamentos(ler_linhas(arquivo, formato), batch_size=options["batch_size"])
+
+        for erro in resultado["erros"]:
+            self.stdout.write(self.style.WARNING(f"Linha {erro['linha']}: {erro['erros']}"))
+        self.stdout.write(
+            f"Importados: {resultado['importados']} | Duplicados: {resultado['duplicados']} | "
+            f"Erros: {len(resultado['erros'])} | Mensalidades atualizadas: {resultado['mensalidades_atualizadas']}"
+        )
+        self.stdout.write(self.style.SUCCESS("Importacao concluida!"))
@@ -0,0 +1,14 @@
+"""Comando django para apagar as chaves de idempotencia expiradas"""
+from django.core.management.base import BaseCommand
+from financeiro.services.idempotencia import limpar_expiradas
+
+
+class Command(BaseCommand):
+    """Django comando para limpar a tabela de Idempotency-Key"""
+    help = "Apaga as chaves de idempotencia cujo TTL ja expirou"
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write("Apagando chaves de idempotencia expiradas....")
+        apagadas = limpar_expiradas()
+        self.stdout.write(self.style.SUCCESS(f"{apagadas} chaves apagadas"))
@@ -0,0 +1,30 @@
+"""Comando django para processar a folha salarial do mes"""
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.services.folha import processar_folha, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para a folha salarial mensal"""
+    help = "Cria os salarios do mes (AAAA-MM) para todos os funcionarios com salario e marca-os como pagos"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mes", required=True, help="Mes no formato AAAA-MM")
+        parser.add_argument("--sem-pagamento", action="store_true", help="Apenas cria os salarios (PENDENTE)")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        try:
+            ano, mes = (int(parte) for parte in options["mes"].split("-"))
+            if not 1 <= mes <= 12:
+                raise ValueError
+        except ValueError:
+            raise CommandError("Mes invalido, use o formato AAAA-MM")
+
+        self.stdout.write(f"Processando folha salarial de {options['mes']}....")
+        resultado = processar_folha(ano, mes, pagar=not options["sem_pagamento"], batch_size=options["batch_size"])
+        self.stdout.write(
+            f"Criados: {resultado['criados']} | Ja existentes: {resultado['existentes']} | "
+            f"Pagos: {resultado['pagos']} | Total pago: {resultado['total_pago']:.2f}"
+        )
+        self.stdout.write(self.style.SUCCESS("Folha processada!"))
@@ -0,0 +1,45 @@
+"""Comando django para reconstruir Mensalidade.valor_pago a partir dos pagamentos"""
+from django.core.management.base import BaseCommand
+from financeiro.models import Mensalidade
+from financeiro.services.cache import invalidar
+from financeiro.services.saldos import invalidar_saldos
+from financeiro.services.status import recalcular_status
+from financeiro.services.utils import intervalos_pk
+
+CHUNK_SIZE = 5000
+
+
+class Command(BaseCommand):
+    """Django comando para verificar/corrigir o valor pago guardado nas mensalidades"""
+    help = "Compara valor_pago com a soma dos pagamentos ativos e corrige as divergencias"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Apenas reporta as divergencias")
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write("Verificando valor pago das mensalidades....")
+        total = 0
+        for inicio, fim in intervalos_pk(Mensalidade.objects.all(), options["chunk_size"]):
+            divergentes = Mensalidade.objects.filter(pk__gte=inicio, pk__lt=fim).com_divergencia()
+            ids = []
+            for pk, guardado, ledger in divergentes.values_list("pk", "valor_pago", "valor_pago_ledger"):
+                self.stdout.write(f"Mensalidade {pk}: valor_pago={guardado} pagamentos={ledger}")
+                ids.append(pk)
+            total += len(ids)
+            if ids and not options["dry_run"]:
+                # so as linhas divergentes: corrige valor_pago e o status calculado a partir dele
+                corrigidas = Mensalidade.objects.filter(pk__in=ids)
+                corrigidas.recalcular_valor_pago()
+                recalcular_status(corrigidas)
+
+        if total and not options["dry_run"]:
+            invalidar("mensalidade")
+            invalidar_saldos()
+        if total and options["dry_run"]:
+            self.stdout.write(self.style.WARNING(f"{total} mensalidades com divergencia"))
+        elif total:
+            self.stdout.write(self.style.SUCCESS(f"{total} mensalidades corrigidas"))
+        else:
+            self.stdout.write(self.style.SUCCESS("Sem divergencias!"))
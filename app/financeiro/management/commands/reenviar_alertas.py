@@ -0,0 +1,31 @@
+"""Comando django para reenviar os alertas com falha no envio"""
+from django.core.management.base import BaseCommand, CommandError
+from financeiro.models import ReenvioAlertas
+from financeiro.services.reenvio import criar_reenvio, executar_reenvio, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """Django comando para o reenvio de alertas falhados"""
+    help = "Reenvia os alertas falhados com limite de envios por segundo; --job retoma um job interrompido"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--job", type=int, help="Id do job a retomar")
+        parser.add_argument("--taxa", type=float, default=10, help="Maximo de emails por segundo")
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options["job"]:
+            try:
+                reenvio = ReenvioAlertas.objects.get(pk=options["job"])
+            except ReenvioAlertas.DoesNotExist:
+                raise CommandError(f"Job {options['job']} nao existe")
+        else:
+            reenvio = criar_reenvio(options["taxa"])
+
+        self.stdout.write(f"Reenviando alertas (job {reenvio.pk}, {reenvio.total} alertas)....")
+        reenvio = executar_reenvio(reenvio, batch_size=options["batch_size"])
+        self.stdout.write(
+            f"Processados: {reenvio.processados} | Enviados: {reenvio.enviados} | Falhas: {reenvio.falhas}"
+        )
+        self.stdout.write(self.style.SUCCESS("Reenvio concluido!"))
@@ -0,0 +1,39 @@
+"""Comando django para o relatorio de antiguidade de saldos em aberto"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from financeiro.services.antiguidade import relatorio_antiguidade, AGRUPAMENTOS
+
+
+class Command(BaseCommand):
+    """Django comando para o aging das mensalidades em aberto"""
+    help = "Mostra os saldos em aberto por faixa de atraso (0-30/31-60/61-90/90+) agrupados"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--agrupar-por", choices=list(AGRUPAMENTOS), default="encarregado")
+        parser.add_argument("--data", help="Data de referencia AAAA-MM-DD (padrao: hoje)")
+        parser.add_argument("--limite", type=int, default=20)
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        as_of = None
+        if options["data"]:
+            try:
+                as_of = parse_date(options["data"])
+            except ValueError:
+                as_of = None
+            if as_of is None:
+                raise CommandError("Data invalida, use o formato AAAA-MM-DD")
+
+        inicio = time.perf_counter()
+        relatorio = relatorio_antiguidade(options["agrupar_por"], as_of, limite=options["limite"])
+        duracao = (time.perf_counter() - inicio) * 1000
+
+        faixas = relatorio["faixas"]
+        self.stdout.write(f"{'grupo':<30}" + "".join(f"{faixa:>14}" for faixa in faixas) + f"{'total':>14}")
+        for linha in relatorio["grupos"] + [dict(relatorio["totais"], grupo="TOTAL")]:
+            self.stdout.write(
+                f"{str(linha['grupo'] or '-')[:30]:<30}"
+                + "".join(f"{linha[faixa]:>14.2f}" for faixa in faixas) + f"{linha['total']:>14.2f}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Relatorio gerado em {duracao:.0f} ms"))
@@ -0,0 +1,69 @@
+"""Comando django para executar os workers da fila de tarefas"""
+import os
+import time
+import socket
+import threading
+from django.core.management.base import BaseCommand
+from django.db import connection
+from financeiro import tasks  # noqa: F401 (regista as tarefas)
+from financeiro.services.fila import processar_fila, recuperar_presas, metricas
+
+
+class Command(BaseCommand):
+    """Django comando para os workers da fila de tarefas"""
+    help = "Executa as tarefas em background da base de dados com N threads (SKIP LOCKED)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--lote", type=int, default=10, help="Tarefas reservadas por query")
+        parser.add_argument("--intervalo", type=float, default=1.0, help="Espera (s) quando a fila esta vazia")
+        parser.add_argument("--uma-vez", action="store_true", help="Esvazia a fila e termina")
+
+    def _worker(self, nome, options, parar):
+        try:
+            while not parar.is_set():
+                executadas = processar_fila(worker=nome, lote=options["lote"])
+                self.executadas[nome] = self.executadas.get(nome, 0) + executadas
+                if options["uma_vez"]:
+                    break
+                if not executadas:
+                    # fila vazia: devolve as tarefas de workers que morreram (reserva expirada)
+                    recuperar_presas()
+                    parar.wait(options["intervalo"])
+        finally:
+            connection.close()
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        base = f"{socket.gethostname()}:{os.getpid()}"
+        recuperadas = recuperar_presas()
+        if recuperadas:
+            self.stdout.write(self.style.WARNING(f"{recuperadas} tarefas presas devolvidas a fila"))
+
+        self.stdout.write(f"Iniciando {options['workers']} workers....")
+        self.executadas, parar = {}, threading.Event()
+        inicio = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._worker, args=(f"{base}:{n}", options, parar), daemon=True)
+            for n in range(options["workers"])
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            parar.set()
+            for thread in threads:
+                thread.join()
+
+        total = sum(self.executadas.values())
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(f"Executadas: {total} | Tempo: {segundos:.2f}s | {total / segundos if segundos else 0:.1f} tarefas/s")
+        for linha in metricas():
+            self.stdout.write(
+                f"{linha['nome']}: concluidas={linha['concluidas']} falhadas={linha['falhadas']} "
+                f"pendentes={linha['pendentes']} media={linha['duracao_media_ms'] or 0:.0f}ms "
+                f"max={linha['duracao_maxima_ms'] or 0}ms"
+            )
+        self.stdout.write(self.style.SUCCESS("Workers terminados!"))
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:32
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def preencher_valor_pago(apps, schema_editor):
+    Mensalidade = apps.get_model('financeiro', 'Mensalidade')
+    Pagamento = apps.get_model('financeiro', 'Pagamento')
+    pagos = Pagamento.objects.filter(mensalidade=OuterRef('pk'), ativo=True).order_by().values('mensalidade').annotate(
+        total=Sum('valor')
+    ).values('total')
+    Mensalidade.objects.update(valor_pago=Coalesce(Subquery(pagos), Value(Decimal('0.00'))))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mensalidade',
+            name='valor_pago',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='Soma dos pagamentos ativos (mantido por Pagamento)', max_digits=10),
+        ),
+        migrations.RunPython(preencher_valor_pago, migrations.RunPython.noop),
+    ]
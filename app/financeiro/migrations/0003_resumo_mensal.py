@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:34
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0002_mensalidade_valor_pago'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='data_atualizacao',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='fatura',
+            name='data_criacao',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.CreateModel(
+            name='ResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField(help_text='Primeiro dia do mes')),
+                ('entidade', models.CharField(choices=[('MENSALIDADE', 'Mensalidade'), ('PAGAMENTO', 'Pagamento'), ('SALARIO', 'Salario'), ('FATURA', 'Fatura')], max_length=20)),
+                ('status', models.CharField(blank=True, default='', max_length=20)),
+                ('metodo_pagamento', models.CharField(blank=True, default='', max_length=20)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('valor_total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('calculado_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Resumo mensal',
+                'verbose_name_plural': 'Resumos mensais',
+                'ordering': ['mes', 'entidade'],
+                'unique_together': {('mes', 'entidade', 'status', 'metodo_pagamento')},
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0004_tarefa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertaenviado',
+            name='periodo',
+            field=models.DateField(blank=True, help_text='Primeiro dia do mes a que o alerta se refere', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='alertaenviado',
+            constraint=models.UniqueConstraint(condition=models.Q(('periodo__isnull', False)), fields=('encarregado', 'tipo', 'periodo'), name='unique_alerta_encarregado_tipo_periodo'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0005_alerta_periodo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReenvioAlertas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('EXECUTANDO', 'Executando'), ('CONCLUIDO', 'Concluido')], default='PENDENTE', max_length=20)),
+                ('taxa_por_segundo', models.FloatField(default=10, help_text='Maximo de emails enviados por segundo')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('processados', models.PositiveIntegerField(default=0)),
+                ('enviados', models.PositiveIntegerField(default=0)),
+                ('falhas', models.PositiveIntegerField(default=0)),
+                ('ultimo_alerta', models.BigIntegerField(default=0, help_text='Ultimo alerta processado (pk)')),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Reenvio de alertas',
+                'verbose_name_plural': 'Reenvios de alertas',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='alertaenviado',
+            name='proxima_tentativa',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='alertaenviado',
+            name='tentativas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='alertaenviado',
+            name='ultimo_erro',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='alertaenviado',
+            name='status',
+            field=models.CharField(choices=[('ENVIADO', 'Enviado'), ('FALHA NO ENVIO', 'Falha no envio'), ('PENDENTE', 'Pendente'), ('ESGOTADO', 'Tentativas de envio esgotadas')], default='ENVIADO', max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name='alertaenviado',
+            index=models.Index(fields=['status', 'proxima_tentativa'], name='alerta_status_prox_idx'),
+        ),
+    ]
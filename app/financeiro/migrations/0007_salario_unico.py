@@ -0,0 +1,51 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:45
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def verificar_duplicados(apps, schema_editor):
+    """Aborta se houver salarios repetidos (funcionario, mes_referente).
+
+    Nao apaga nada: sao registos financeiros (podem estar pagos) e tem de ser resolvidos a mao.
+    """
+    Salario = apps.get_model('financeiro', 'Salario')
+    duplicados = (
+        Salario.objects.order_by('funcionario_id', 'mes_referente').values('funcionario_id', 'mes_referente')
+        .annotate(total=Count('pk')).filter(total__gt=1)
+    )
+    linhas = [
+        'funcionario={} mes={} salarios={}'.format(
+            grupo['funcionario_id'], grupo['mes_referente'],
+            list(Salario.objects.filter(
+                funcionario_id=grupo['funcionario_id'], mes_referente=grupo['mes_referente'],
+            ).order_by('pk').values_list('pk', flat=True)),
+        )
+        for grupo in duplicados
+    ]
+    if linhas:
+        raise RuntimeError(
+            'Salarios repetidos por funcionario e mes; resolva-os antes de aplicar a migracao:\n' + '\n'.join(linhas)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0006_reenvio_alertas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salario',
+            name='gerado_pela_folha',
+            field=models.BooleanField(default=False, editable=False, help_text='Criado pela folha salarial (processar_folha)'),
+        ),
+        migrations.RunPython(verificar_duplicados, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='salario',
+            unique_together={('funcionario', 'mes_referente')},
+        ),
+    ]
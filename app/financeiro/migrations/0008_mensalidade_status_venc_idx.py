@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0007_salario_unico'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['status', 'data_vencimento'], include=('aluno', 'valor', 'valor_pago', 'taxa_atraso'), name='mensalidade_status_venc_idx'),
+        ),
+    ]
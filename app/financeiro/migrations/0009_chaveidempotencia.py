@@ -0,0 +1,40 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:55
+
+from django.conf import settings
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('financeiro', '0008_mensalidade_status_venc_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chave', models.CharField(max_length=255)),
+                ('escopo', models.CharField(help_text='Endpoint, ex: pagamentos:create', max_length=100)),
+                ('hash_pedido', models.CharField(max_length=64)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, help_text='Vazio enquanto o pedido esta em curso', null=True)),
+                ('resposta', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('utilizador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chaves_idempotencia', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chave de idempotencia',
+                'verbose_name_plural': 'Chaves de idempotencia',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='chaveidempotencia',
+            constraint=models.UniqueConstraint(fields=('utilizador', 'escopo', 'chave'), name='unique_idempotencia_chave'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-18 06:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0009_chaveidempotencia'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='alertaenviado',
+            index=models.Index(condition=models.Q(('status', 'FALHA NO ENVIO')), fields=['-enviado_em'], name='alerta_falhos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_vencimento'], name='fatura_status_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(condition=models.Q(('status', 'PAGO'), _negated=True), fields=['data_vencimento'], name='fatura_venc_aberta_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['data_emissao'], name='fatura_emissao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mensalidade',
+            index=models.Index(fields=['-mes_referente'], name='mensalidade_mes_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['data_pagamento'], name='pagamento_ativo_data_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:00
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0010_indices_managers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Lancamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movimento', models.UUIDField(default=uuid.uuid4, editable=False, help_text='Identifica o par debito/credito')),
+                ('conta', models.CharField(choices=[('CAIXA', 'Caixa'), ('RECEITA_MENSALIDADES', 'Receita de mensalidades'), ('RECEITA_FATURAS', 'Receita de faturas'), ('DESPESA_SALARIOS', 'Despesa com salarios')], max_length=30)),
+                ('valor', models.DecimalField(decimal_places=2, help_text='Positivo = debito, negativo = credito', max_digits=14)),
+                ('data', models.DateField(help_text='Data do movimento (estornos e acertos: data do registo)')),
+                ('origem_tipo', models.CharField(choices=[('PAGAMENTO', 'Pagamento'), ('SALARIO', 'Salario'), ('FATURA', 'Fatura')], max_length=20)),
+                ('origem_id', models.BigIntegerField()),
+                ('estorno', models.BooleanField(default=False)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lancamento',
+                'verbose_name_plural': 'Lancamentos',
+                'ordering': ['data', 'id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conta', models.CharField(choices=[('CAIXA', 'Caixa'), ('RECEITA_MENSALIDADES', 'Receita de mensalidades'), ('RECEITA_FATURAS', 'Receita de faturas'), ('DESPESA_SALARIOS', 'Despesa com salarios')], max_length=30)),
+                ('data', models.DateField()),
+                ('saldo', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('calculado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Saldo diario',
+                'verbose_name_plural': 'Saldos diarios',
+                'ordering': ['conta', 'data'],
+                'unique_together': {('conta', 'data')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['conta', 'data'], name='lancamento_conta_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lancamento',
+            index=models.Index(fields=['origem_tipo', 'origem_id'], name='lancamento_origem_idx'),
+        ),
+    ]
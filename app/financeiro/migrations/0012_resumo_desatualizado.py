@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0011_razao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumomensal',
+            name='desatualizado',
+            field=models.BooleanField(default=False, help_text='Um registo saiu deste mes; recalculado na proxima atualizacao incremental'),
+        ),
+    ]
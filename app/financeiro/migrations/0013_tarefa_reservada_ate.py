@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0012_resumo_desatualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='reservada_ate',
+            field=models.DateTimeField(blank=True, help_text='Fim da reserva do worker; renovada enquanto a tarefa executa', null=True),
+        ),
+    ]
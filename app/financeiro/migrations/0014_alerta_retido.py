@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financeiro', '0013_tarefa_reservada_ate'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='alertaenviado',
+            name='status',
+            field=models.CharField(choices=[('ENVIADO', 'Enviado'), ('FALHA NO ENVIO', 'Falha no envio'), ('PENDENTE', 'Pendente'), ('ESGOTADO', 'Tentativas de envio esgotadas'), ('RETIDO', 'Criado sem envio')], default='ENVIADO', max_length=50),
+        ),
+    ]
@@ -1,18 +1,22 @@
 """Models para base de dados de Financeiro"""
 
 from datetime import date
+import uuid
 from decimal import Decimal
-from django.db import models
-from django.db.models import Sum
+from django.db import models, transaction
+from django.db.models import Sum, F, Case, When, Value, Func, Subquery, OuterRef, ExpressionWrapper
 from django.conf import settings
 from django.utils import timezone
 from transporte.models import Rota, Veiculo
 from core.models import Aluno, Encarregado
+from core.model_mixins.mixins import RastreioAlteracoesMixin
+from financeiro.services.cache import em_cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
 # from financeiro.tasks import enviar_recibos_individual
 # from financeiro.tasks import enviar_alerta_email
-from django.db.models.functions import Coalesce
+from django.db.models.functions import Coalesce, Greatest
 
 CHOICES = [("PAGO", "Pago"), ("PENDENTE", "Pendente"), ("ATRASADO", "Atrasado"), ("PAGO PARCIAL", "Pago Parcial")]
 M_PAGAMENTO = [ ("DINHEIRO", "Dinheiro"), ("TRANSFERENCIA", "Transferência"), ("CARTAO", "Cartão"),]
@@ -39,8 +43,69 @@ class StatusMixin(models.Model):
         elif hasattr(self, "data_limite") and hoje > self.data_limite:
             self.status = "ATRASADO"
 
+
+class DiferencaDias(Func):
+    """Numero de dias entre duas datas (primeira - segunda) calculado na base de dados."""
+    arity = 2
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # sqlite (testes locais) nao subtrai datas diretamente
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context
+        )
+
+
+# QuerySets
+class MensalidadeQuerySet(models.QuerySet):
+    def with_financials(self, as_of=None):
+        """Anota total_pago, valor_atualizado, valor_devido e dias_atraso numa unica query.
+
+        Reproduz em SQL as properties do model (incluindo a multa a cada 5 dias),
+        usando `as_of` como data de referencia (por defeito, hoje).
+        """
+        as_of = as_of or date.today()
+        dinheiro = models.DecimalField(max_digits=12, decimal_places=2)
+        dias = Greatest(DiferencaDias(Value(as_of, output_field=models.DateField()), F("data_vencimento")), Value(0))
+        return self.annotate(
+            total_pago_sql=F("valor_pago"),
+            dias_atraso_sql=Case(When(status="PAGO", then=Value(0)), default=dias, output_field=models.IntegerField()),
+        ).annotate(
+            valor_atualizado_sql=Case(
+                When(status="ATRASADO", then=ExpressionWrapper(
+                    F("valor") + F("valor") * F("taxa_atraso") * (F("dias_atraso_sql") / Value(5)),
+                    output_field=dinheiro,
+                )),
+                default=F("valor"),
+                output_field=dinheiro,
+            ),
+        ).annotate(
+            valor_devido_sql=ExpressionWrapper(F("valor_atualizado_sql") - F("total_pago_sql"), output_field=dinheiro),
+        )
+
+    def total_pago_ledger(self):
+        """Soma dos pagamentos ativos de cada mensalidade, lida diretamente de Pagamento."""
+        pagos = Pagamento.objects.filter(mensalidade=OuterRef("pk")).order_by().values("mensalidade").annotate(
+            total=Sum("valor")
+        ).values("total")
+        return Coalesce(Subquery(pagos), Value(Decimal("0.00")), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+
+    def com_divergencia(self):
+        """Mensalidades cujo valor_pago guardado difere da soma dos pagamentos."""
+        return self.annotate(valor_pago_ledger=self.total_pago_ledger()).exclude(valor_pago=F("valor_pago_ledger"))
+
+    def recalcular_valor_pago(self):
+        """Reconstroi valor_pago a partir dos pagamentos ativos, num unico UPDATE."""
+        return self.update(valor_pago=self.total_pago_ledger())
+
+
 # Manager
-class MensalidadeManager(models.Manager):
+class MensalidadeManager(models.Manager.from_queryset(MensalidadeQuerySet)):
     def atrasadas(self):
         """Mensalidade vencidas ou com status atrasado"""
         hoje = date.today()
@@ -62,13 +127,17 @@ class MensalidadeManager(models.Manager):
 
     def de_mes(self, ano, mes):
         """Mensalidade do um determinado mes/ano"""
-        return self.filter(mes_referente__year=ano, mes_referente__month=mes)
+        # intervalo em vez de __month (EXTRACT), para usar o indice de mes_referente
+        inicio = date(ano, mes, 1)
+        return self.filter(mes_referente__gte=inicio, mes_referente__lt=date(ano + mes // 12, mes % 12 + 1, 1))
 
     def total_recebido(self):
         # return self.model.objects.filter(pagamento__isnull=False).aggregate(total=Sum("pagamento__valor")["total"]or Decimal("0.00"))
-        return self.model.objects.filter(pagamentos__isnull=False).aggregate(
-            total=Coalesce(Sum("pagamentos__valor"), Decimal("0.00"))
-        )["total"]
+        # em cache ate a proxima alteracao de mensalidades (financeiro.signals)
+        return em_cache(
+            "mensalidades_total_recebido", ["mensalidade"],
+            lambda: self.aggregate(total=Coalesce(Sum("valor_pago"), Decimal("0.00")))["total"],
+        )
 
 
 
@@ -88,7 +157,10 @@ class PagamentoManager(models.Manager):
 
     def total_pago(self):
         # return self.aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
-        return self.aggregate(total=Coalesce(Sum("valor"), Decimal("0.00")))["total"]
+        return em_cache(
+            "pagamentos_total_pago", ["pagamento"],
+            lambda: self.aggregate(total=Coalesce(Sum("valor"), Decimal("0.00")))["total"],
+        )
 
 
 class FaturaManager(models.Manager):
@@ -107,13 +179,42 @@ class FaturaManager(models.Manager):
         return self.filter(data_emissao__range=(inicio, fim))
 
     def total_faturado(self):
-        return self.aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
+        return em_cache(
+            "faturas_total_faturado", ["fatura"],
+            lambda: self.aggregate(total=Sum("valor"))["total"] or Decimal("0.00"),
+        )
 
     def total_recebido(self):
-        return self.filter(status="PAGO").aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
+        return em_cache(
+            "faturas_total_recebido", ["fatura"],
+            lambda: self.filter(status="PAGO").aggregate(total=Sum("valor"))["total"] or Decimal("0.00"),
+        )
 
 
-class SalarioManager(models.Manager):
+class SalarioQuerySet(models.QuerySet):
+    def do_mes(self, mes_referente):
+        # intervalo do mes: salarios lancados a mao podem ter qualquer dia em mes_referente
+        inicio = mes_referente.replace(day=1)
+        fim = inicio.replace(year=inicio.year + inicio.month // 12, month=inicio.month % 12 + 1)
+        return self.filter(mes_referente__gte=inicio, mes_referente__lt=fim)
+
+    def total_pago(self, funcionario=None):
+        filtrado = self.query.has_filters()
+        qs = self.filter(status="PAGO")
+        if funcionario:
+            qs = qs.filter(funcionario=funcionario)
+
+        def calcular():
+            return qs.aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
+
+        if filtrado:
+            # so os totais da tabela inteira (por funcionario) ficam em cache
+            return calcular()
+        funcionario_id = getattr(funcionario, "pk", funcionario)
+        return em_cache("salarios_total_pago", ["salario"], calcular, parametros=[funcionario_id])
+
+
+class SalarioManager(models.Manager.from_queryset(SalarioQuerySet)):
     def pagos(self):
         return self.filter(status="PAGO")
 
@@ -123,12 +224,6 @@ class SalarioManager(models.Manager):
     def do_funcionario(self, funcionanrio):
         return self.filter(funcionario=funcionanrio)
 
-    def total_pago(self, funcionario=None):
-        qs = self.filter(status="PAGO")
-        if funcionario:
-            qs = qs.filter(funcionario=funcionario)
-        return qs.aggregate(total=Sum("valor"))["total"] or Decimal("0.00")
-
 
 class AlertaManager(models.Manager):
     def enviados(self):
@@ -143,8 +238,21 @@ class AlertaManager(models.Manager):
     def por_tipo(self, tipo):
         return self.filter(tipo=tipo)
 
+
+class LancamentoQuerySet(models.QuerySet):
+    """O razao e append-only: correcoes sao feitas com novos lancamentos (estornos)."""
+
+    def update(self, **kwargs):
+        raise ValidationError("Lancamentos sao imutaveis; registe um estorno.")
+
+    def delete(self):
+        raise ValidationError("Lancamentos sao imutaveis; registe um estorno.")
+
+    def saldo(self):
+        return self.aggregate(total=Coalesce(Sum("valor"), Decimal("0.00")))["total"]
+
 # Models
-class Mensalidade(TimestampMixin, StatusMixin):
+class Mensalidade(RastreioAlteracoesMixin, TimestampMixin, StatusMixin):
     aluno = models.ForeignKey('core.Aluno',on_delete=models.CASCADE,related_name='mensalidades')
     valor = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))], blank=True, default=0,)
     mes_referente = models.DateField(help_text="Mes de referencia")
@@ -153,28 +261,49 @@ class Mensalidade(TimestampMixin, StatusMixin):
     taxa_atraso = models.DecimalField(max_digits=5, decimal_places=2, default=0.10, help_text="A taxa de juros incrementa a cada 5 dias(ex:0.10 = 10%)")
     obs = models.TextField(blank=True, null=True)
     recibo_gerado = models.BooleanField(default=False)
+    valor_pago = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal("0.00"), editable=False, help_text="Soma dos pagamentos ativos (mantido por Pagamento)")
 
     objects = MensalidadeManager()
 
     class Meta:
         unique_together = ("aluno", "mes_referente")
         ordering = ["-mes_referente"]
+        indexes = [
+            # relatorios de saldos em aberto (antiguidade): no PostgreSQL permite index-only scan
+            models.Index(
+                fields=["status", "data_vencimento"],
+                include=["aluno", "valor", "valor_pago", "taxa_atraso"],
+                name="mensalidade_status_venc_idx",
+            ),
+            # de_mes (intervalo do mes) e a ordenacao padrao
+            models.Index(fields=["-mes_referente"], name="mensalidade_mes_idx"),
+        ]
+
+    CAMPOS_FINANCEIROS = ("total_pago_sql", "valor_devido_sql", "valor_atualizado_sql", "dias_atraso_sql")
+
+    def _limpar_financeiros(self):
+        """Descarta os valores anotados por with_financials (ficam obsoletos apos alteracoes)."""
+        for campo in self.CAMPOS_FINANCEIROS:
+            self.__dict__.pop(campo, None)
 
     @property
     def total_pago(self):
-        """Soma todos os pagamentos parciais feitos para esta mensalidade."""
-        total = self.pagamentos.aggregate(total=Sum('valor'))['total']
-        return total or Decimal('0.00')
+        """Soma todos os pagamentos parciais feitos para esta mensalidade (coluna valor_pago)."""
+        return self.valor_pago
 
     @property
     def valor_devido(self):
         """Retorna o valor restante a ser pago."""
+        if hasattr(self, "valor_devido_sql"):
+            return self.valor_devido_sql
         return self.valor_atualizado - self.total_pago
 
     def atualizar_status(self):
         """ Calcula e atualiza o status da mensalidade com base nos pagamentos e datas."""
         if not self.pk:
             return
+        self._limpar_financeiros()
+        self.refresh_from_db(fields=["valor_pago"])
         new_status = "PENDENTE"
         total_pago = self.total_pago
         if total_pago >= self.valor_atualizado:
@@ -192,10 +321,14 @@ class Mensalidade(TimestampMixin, StatusMixin):
             self.save(update_fields=fields_to_update)
 
     def preencher_datas(self, ano: int, mes: int):
-       """chama services gerar_calendario_anual pata preencher datas"""
+        """chama services calcular_datas pata preencher datas"""
+        from financeiro.services.faturacao import calcular_datas
+        self.mes_referente, self.data_vencimento, self.data_limite = calcular_datas(ano, mes)
 
     @property
     def dias_atraso(self):
+        if hasattr(self, "dias_atraso_sql"):
+            return self.dias_atraso_sql
         if self.status == "PAGO":
             return 0
         return max((date.today() - self.data_vencimento).days, 0)
@@ -203,6 +336,8 @@ class Mensalidade(TimestampMixin, StatusMixin):
     @property
     def valor_atualizado(self):
         """valor atualizado com a multa (pucha do service)"""
+        if hasattr(self, "valor_atualizado_sql"):
+            return self.valor_atualizado_sql
         if self.status == "ATRASADO":
             dias = self.dias_atraso
             periodos = dias // 5
@@ -220,7 +355,7 @@ class Mensalidade(TimestampMixin, StatusMixin):
         return f"{aluno_nome} - {self.valor:.2f} ({self.status})"
 
 
-class Pagamento(TimestampMixin):
+class Pagamento(RastreioAlteracoesMixin, TimestampMixin):
     """Registra um pagamento (parcial ou total) de uma mensalidade."""
     mensalidade = models.ForeignKey(Mensalidade, on_delete=models.CASCADE, related_name='pagamentos')
     valor = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
@@ -240,30 +375,54 @@ class Pagamento(TimestampMixin):
                 name='unique_pagamento_mensalidade'
             )
         ]
+        # o PagamentoManager filtra sempre ativo=True: indice parcial so com os pagamentos ativos
+        # (mensalidade_id ja tem o indice da FK e o do unique_pagamento_mensalidade)
+        indexes = [
+            models.Index(fields=["data_pagamento"], condition=models.Q(ativo=True), name="pagamento_ativo_data_idx"),
+        ]
 
     def clean(self):
         super().clean()
         # if self.valor > self.mensalidade.valor_devido:
         #     raise ValidationError("Valor do pagamento excede o valor devido")
 
-        if Pagamento.object.filter(
-            mensalidade=self.mensalidade,
+        # so para formularios (admin); a API confia no unique_pagamento_mensalidade da DB
+        if Pagamento.all_objects.filter(
+            mensalidade_id=self.mensalidade_id,
             valor=self.valor,
             data_pagamento=self.data_pagamento
-            ).exists():
+            ).exclude(pk=self.pk).exists():
                 raise ValidationError("Pagamento duplicado para esta mensalidade")
 
+    def save(self, *args, **kwargs):
+        """Mantem Mensalidade.valor_pago na mesma transacao do pagamento."""
+        novo = self._state.adding
+        alterou_valor = not novo and any(self.has_changed(campo) for campo in ("valor", "ativo", "mensalidade"))
+        afetadas = {self.mensalidade_id, self.valor_original("mensalidade")} - {None}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if novo:
+                if self.ativo:
+                    Mensalidade.objects.filter(pk=self.mensalidade_id).update(valor_pago=F("valor_pago") + self.valor)
+            elif alterou_valor:
+                # edicao de valor/ativo/mensalidade: recalcula so as mensalidades envolvidas
+                Mensalidade.objects.filter(pk__in=afetadas).recalcular_valor_pago()
+
     def delete(self, *args, **kwargs):
         """soft delete: apenas marca como inativos"""
-        self.ativo = False
-        self.save()
+        if not self.ativo:
+            return
+        with transaction.atomic():
+            self.ativo = False
+            super().save()
+            Mensalidade.objects.filter(pk=self.mensalidade_id).update(valor_pago=F("valor_pago") - self.valor)
 
     def __str__(self):
         # return f"Pagamento de {self.valor} para {self.mensalidade.aluno.nome} em {self.data_pagamento.strftime('%d/%m/%Y')}"
         return f"Pagamento {self.id} - {self.valor} {self.metodo_pagamento}"
 
 
-class Salario(TimestampMixin, StatusMixin):
+class Salario(RastreioAlteracoesMixin, TimestampMixin, StatusMixin):
     """Pagamento de salario para o funcionarios"""
     funcionario = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -275,11 +434,15 @@ class Salario(TimestampMixin, StatusMixin):
     mes_referente = models.DateField("Mes de referencia", max_length=20)
     obs = models.TextField(blank=True, null=True)
     recibo_gerado = models.BooleanField(default=False)
+    gerado_pela_folha = models.BooleanField(
+        default=False, editable=False, help_text="Criado pela folha salarial (processar_folha)"
+    )
 
     objects = SalarioManager()
 
     class Meta:
         ordering = ["-mes_referente"]
+        unique_together = ("funcionario", "mes_referente")
         verbose_name = "Salario"
         verbose_name_plural = "Salarios"
 
@@ -298,11 +461,10 @@ class Salario(TimestampMixin, StatusMixin):
         return quant
 
     def gerar_recibo_automatico(self):
-        """Gera recibo e envia email para o funcionario."""
+        """Enfileira o recibo do funcionario (a tarefa marca recibo_gerado)."""
         if not self.recibo_gerado and self.status == "PAGO":
-            self.recibo_gerado = True
-            self.save(update_fields=["recibo_gerado"]) # Fixed field name 'recibo_gereado' to 'recibo_gerado'
-            # enviar_alerta_email.delay("salario", self.pk)
+            from financeiro.tasks import gerar_recibo
+            gerar_recibo.delay("salario", self.pk)
 
     def clean(self):
         """Validacoes antes de salvar"""
@@ -312,14 +474,9 @@ class Salario(TimestampMixin, StatusMixin):
             raise ValidationError("O valor do salario nao pode ser negativo")
 
 
-    def save(self, *args, **kwargs):
-        status_ant = None
-        if self.pk:
-            status_ant = Salario.objects.get(pk=self.pk).status
-
-        super().save(*args, **kwargs)
-
-        if self.status == "PAGO" and not self.recibo_gerado and self.recibo_gerado != "PAGO":
+    def ao_mudar_status(self, anterior, novo):
+        """Chamado apos gravar uma mudanca de status (RastreioAlteracoesMixin), sem novo SELECT."""
+        if novo == "PAGO":
             self.gerar_recibo_automatico()
 
     def __str__(self):
@@ -327,7 +484,7 @@ class Salario(TimestampMixin, StatusMixin):
         return f'{nome_func} - {self.valor:.2f} ({self.mes_referente:%m/%Y}) - {self.status}'
 
 
-class Fatura(StatusMixin):
+class Fatura(RastreioAlteracoesMixin, TimestampMixin, StatusMixin):
     descricao = models.CharField(max_length=255)
     valor = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal(0.0))])
     data_emissao = models.DateField(default=timezone.now)
@@ -341,14 +498,19 @@ class Fatura(StatusMixin):
     class Meta:
         ordering = ["-data_emissao"]
         verbose_name_plural = "Faturas"
+        indexes = [
+            models.Index(fields=["status", "data_vencimento"], name="fatura_status_venc_idx"),
+            # vencidas: data_vencimento < hoje e status <> PAGO
+            models.Index(fields=["data_vencimento"], condition=~models.Q(status="PAGO"), name="fatura_venc_aberta_idx"),
+            models.Index(fields=["data_emissao"], name="fatura_emissao_idx"),
+        ]
 
 
     def gerar_recibo_automatico(self):
         """Dispara task para gerar recibos(service q fara o envio real)"""
         if not self.recibo_gerado and self.status =="PAGO" and self.email_destinatario:
-            self.recibo_gerado = True
-            self.save(update_fields=["recibo_gerado"])
-            # enviar_alerta_email.delay("fatura", self.pk)
+            from financeiro.tasks import gerar_recibo
+            gerar_recibo.delay("fatura", self.pk)
 
     def clean(self):
         if self.data_emissao > date.today():
@@ -358,14 +520,8 @@ class Fatura(StatusMixin):
         if self.valor < 0:
             raise ValidationError("O valor da fatura nao pode ser negativo")
 
-    def save(self, *args, **kwargs):
-        status_ant = None
-        if self.pk:
-            status_ant = Fatura.objects.get(pk=self.pk).status
-
-        super().save(*args, **kwargs)
-
-        if self.status == "PAGO" and not self.recibo_gerado and status_ant != "PAGO":
+    def ao_mudar_status(self, anterior, novo):
+        if novo == "PAGO":
             self.gerar_recibo_automatico()
 
     def __str__(self):
@@ -384,7 +540,9 @@ class AlertaEnviado(TimestampMixin, models.Model):
     STATUS_CHOICES = [
         ("ENVIADO", "Enviado"),
         ("FALHA NO ENVIO", "Falha no envio"),
-        ("PENDENTE", "Pendente")
+        ("PENDENTE", "Pendente"),
+        ("ESGOTADO", "Tentativas de envio esgotadas"),
+        ("RETIDO", "Criado sem envio"),
     ]
 
     encarregado = models.ForeignKey('core.Encarregado',on_delete=models.CASCADE, related_name='alerta_enviados')
@@ -394,11 +552,28 @@ class AlertaEnviado(TimestampMixin, models.Model):
     mensagem = models.TextField()
     enviado_em = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=50, choices=STATUS_CHOICES, default="ENVIADO")
+    periodo = models.DateField(null=True, blank=True, help_text="Primeiro dia do mes a que o alerta se refere")
+    tentativas = models.PositiveIntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(null=True, blank=True)
+    ultimo_erro = models.TextField(blank=True, default="")
 
     objects = AlertaManager()
 
     class Meta:
         ordering = ["-enviado_em"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["encarregado", "tipo", "periodo"],
+                condition=models.Q(periodo__isnull=False),
+                name="unique_alerta_encarregado_tipo_periodo",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["status", "proxima_tentativa"], name="alerta_status_prox_idx"),
+            models.Index(
+                fields=["-enviado_em"], condition=models.Q(status="FALHA NO ENVIO"), name="alerta_falhos_idx"
+            ),
+        ]
 
     def clean(self):
         if not self.email:
@@ -411,3 +586,175 @@ class AlertaEnviado(TimestampMixin, models.Model):
     def __str__(self):
         # return f"{self.eviado_em.strftime('%d/%m/%Y %H:%M')}"
         return f"Alerta {self.status} - {self.encarregado.user.email} ({self.alunos.count()} alunos)"
+
+
+class ReenvioAlertas(TimestampMixin):
+    """Job de reenvio dos alertas falhados; guarda o progresso para retomar apos uma falha"""
+    STATUS_CHOICES = [
+        ("PENDENTE", "Pendente"),
+        ("EXECUTANDO", "Executando"),
+        ("CONCLUIDO", "Concluido"),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDENTE")
+    taxa_por_segundo = models.FloatField(default=10, help_text="Maximo de emails enviados por segundo")
+    total = models.PositiveIntegerField(default=0)
+    processados = models.PositiveIntegerField(default=0)
+    enviados = models.PositiveIntegerField(default=0)
+    falhas = models.PositiveIntegerField(default=0)
+    ultimo_alerta = models.BigIntegerField(default=0, help_text="Ultimo alerta processado (pk)")
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        verbose_name = "Reenvio de alertas"
+        verbose_name_plural = "Reenvios de alertas"
+
+    def __str__(self):
+        return f"Reenvio {self.pk} ({self.status}) {self.processados}/{self.total}"
+
+
+class ResumoMensal(models.Model):
+    """Agregados mensais (rollup) por entidade/status/metodo, usados nos relatorios"""
+    ENTIDADE_CHOICES = [
+        ("MENSALIDADE", "Mensalidade"),
+        ("PAGAMENTO", "Pagamento"),
+        ("SALARIO", "Salario"),
+        ("FATURA", "Fatura"),
+    ]
+
+    mes = models.DateField(help_text="Primeiro dia do mes")
+    entidade = models.CharField(max_length=20, choices=ENTIDADE_CHOICES)
+    status = models.CharField(max_length=20, blank=True, default="")
+    metodo_pagamento = models.CharField(max_length=20, blank=True, default="")
+    quantidade = models.PositiveIntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    calculado_em = models.DateTimeField(db_index=True)
+    desatualizado = models.BooleanField(
+        default=False, help_text="Um registo saiu deste mes; recalculado na proxima atualizacao incremental"
+    )
+
+    class Meta:
+        unique_together = ("mes", "entidade", "status", "metodo_pagamento")
+        ordering = ["mes", "entidade"]
+        verbose_name = "Resumo mensal"
+        verbose_name_plural = "Resumos mensais"
+
+    def __str__(self):
+        return f"{self.entidade} {self.mes:%m/%Y} {self.status}{self.metodo_pagamento} - {self.quantidade}"
+
+
+class Tarefa(TimestampMixin):
+    """Tarefa em background guardada na base de dados (ver financeiro.tasks e run_workers)"""
+    STATUS_CHOICES = [
+        ("PENDENTE", "Pendente"),
+        ("EXECUTANDO", "Executando"),
+        ("CONCLUIDA", "Concluida"),
+        ("FALHADA", "Falhada"),
+    ]
+
+    nome = models.CharField(max_length=100)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDENTE")
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=5)
+    executar_em = models.DateTimeField(default=timezone.now)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    reservada_ate = models.DateTimeField(
+        null=True, blank=True, help_text="Fim da reserva do worker; renovada enquanto a tarefa executa"
+    )
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    duracao_ms = models.PositiveIntegerField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True, default="")
+    ultimo_erro = models.TextField(blank=True, default="")
+
+    class Meta:
+        ordering = ["executar_em", "id"]
+        indexes = [models.Index(fields=["status", "executar_em"], name="tarefa_status_exec_idx")]
+
+    def __str__(self):
+        return f"{self.nome} #{self.pk} ({self.status})"
+
+
+class ChaveIdempotencia(models.Model):
+    """Resposta de um POST com o header Idempotency-Key; repeticoes do pedido recebem-na de volta"""
+    chave = models.CharField(max_length=255)
+    escopo = models.CharField(max_length=100, help_text="Endpoint, ex: pagamentos:create")
+    utilizador = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="chaves_idempotencia"
+    )
+    hash_pedido = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Vazio enquanto o pedido esta em curso")
+    resposta = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    criado_em = models.DateTimeField(default=timezone.now)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["utilizador", "escopo", "chave"], name="unique_idempotencia_chave")
+        ]
+        verbose_name = "Chave de idempotencia"
+        verbose_name_plural = "Chaves de idempotencia"
+
+    def __str__(self):
+        return f"{self.escopo} {self.chave} ({self.status_code or 'em curso'})"
+
+
+class Lancamento(models.Model):
+    """Linha do razao em partidas dobradas: cada movimento grava um par debito/credito que soma zero"""
+    CONTA_CHOICES = [
+        ("CAIXA", "Caixa"),
+        ("RECEITA_MENSALIDADES", "Receita de mensalidades"),
+        ("RECEITA_FATURAS", "Receita de faturas"),
+        ("DESPESA_SALARIOS", "Despesa com salarios"),
+    ]
+    ORIGEM_CHOICES = [("PAGAMENTO", "Pagamento"), ("SALARIO", "Salario"), ("FATURA", "Fatura")]
+
+    movimento = models.UUIDField(default=uuid.uuid4, editable=False, help_text="Identifica o par debito/credito")
+    conta = models.CharField(max_length=30, choices=CONTA_CHOICES)
+    valor = models.DecimalField(max_digits=14, decimal_places=2, help_text="Positivo = debito, negativo = credito")
+    data = models.DateField(help_text="Data do movimento (estornos e acertos: data do registo)")
+    origem_tipo = models.CharField(max_length=20, choices=ORIGEM_CHOICES)
+    origem_id = models.BigIntegerField()
+    estorno = models.BooleanField(default=False)
+    criado_em = models.DateTimeField(auto_now_add=True)
+
+    objects = LancamentoQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["data", "id"]
+        indexes = [
+            models.Index(fields=["conta", "data"], name="lancamento_conta_data_idx"),
+            models.Index(fields=["origem_tipo", "origem_id"], name="lancamento_origem_idx"),
+        ]
+        verbose_name = "Lancamento"
+        verbose_name_plural = "Lancamentos"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Lancamentos sao imutaveis; registe um estorno.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Lancamentos sao imutaveis; registe um estorno.")
+
+    def __str__(self):
+        return f"{self.data} {self.conta} {self.valor} ({self.origem_tipo} {self.origem_id})"
+
+
+class SaldoDiario(models.Model):
+    """Saldo de uma conta do razao no fim do dia; derivado dos lancamentos e recalculavel"""
+    conta = models.CharField(max_length=30, choices=Lancamento.CONTA_CHOICES)
+    data = models.DateField()
+    saldo = models.DecimalField(max_digits=14, decimal_places=2)
+    calculado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ("conta", "data")
+        ordering = ["conta", "data"]
+        verbose_name = "Saldo diario"
+        verbose_name_plural = "Saldos diarios"
+
+    def __str__(self):
+        return f"{self.conta} {self.data}: {self.saldo}"
@@ -0,0 +1,123 @@
+"""Paginacao keyset (cursor) para as listagens financeiras"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Pagina pela posicao do ultimo registo (ex: mes_referente, id) em vez de OFFSET.
+
+    O cursor guarda os valores de `ordering` da ultima linha devolvida; a pagina seguinte
+    filtra "depois desse registo", por isso a pagina N custa o mesmo que a pagina 1.
+    Todos os campos de `ordering` sao descendentes e o ultimo deve ser unico (id).
+    """
+    ordering = ("-id",)
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Cursor invalido"
+
+    def _campos(self):
+        return [campo.lstrip("-") for campo in self.ordering]
+
+    def get_page_size(self, request):
+        try:
+            tamanho = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(tamanho, self.max_page_size))
+
+    def encode_cursor(self, valores):
+        # isoformat completo: o DjangoJSONEncoder corta os microsegundos e o cursor perderia linhas
+        valores = [
+            valor.isoformat() if isinstance(valor, date) else str(valor) if isinstance(valor, Decimal) else valor
+            for valor in valores
+        ]
+        return urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+    def decode_cursor(self, queryset, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            valores = json.loads(urlsafe_b64decode(cursor.encode()).decode())
+            campos = [queryset.model._meta.get_field(campo) for campo in self._campos()]
+            if len(valores) != len(campos):
+                raise ValueError
+            return [campo.to_python(valor) for campo, valor in zip(campos, valores)]
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def _depois_de(self, valores):
+        """(a < va) OR (a = va AND b < vb) OR ... para ordem descendente."""
+        campos = self._campos()
+        filtro = Q()
+        for i, campo in enumerate(campos):
+            condicao = Q(**{f"{campo}__lt": valores[i]})
+            for anterior, valor in zip(campos[:i], valores[:i]):
+                condicao &= Q(**{anterior: valor})
+            filtro |= condicao
+        return filtro
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_atual = self.get_page_size(request)
+        valores = self.decode_cursor(queryset, request)
+        queryset = queryset.order_by(*self.ordering)
+        if valores is not None:
+            queryset = queryset.filter(self._depois_de(valores))
+        pagina = list(queryset[:self.page_size_atual + 1])
+        self.has_next = len(pagina) > self.page_size_atual
+        self.page = pagina[:self.page_size_atual]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        ultimo = self.page[-1]
+        cursor = self.encode_cursor([getattr(ultimo, campo) for campo in self._campos()])
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
+
+
+class MensalidadePagination(KeysetPagination):
+    ordering = ("-mes_referente", "-id")
+
+
+class PagamentoPagination(KeysetPagination):
+    ordering = ("-id",)
+
+
+class SalarioPagination(KeysetPagination):
+    ordering = ("-mes_referente", "-id")
+
+
+class FaturaPagination(KeysetPagination):
+    ordering = ("-data_emissao", "-id")
+
+
+class AlertaEnviadoPagination(KeysetPagination):
+    ordering = ("-enviado_em", "-id")
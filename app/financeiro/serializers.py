@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, ResumoMensal, ReenvioAlertas
 
 
 class PagamentoSerializer(serializers.ModelSerializer):
@@ -58,4 +58,19 @@ class AlertaEnviadoSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = AlertaEnviado
-        fields = ['id', 'encarregado', 'alunos', 'tipo', 'email', 'mensagem', 'enviado_em', 'status']
+        fields = ['id', 'encarregado', 'alunos', 'tipo', 'email', 'mensagem', 'enviado_em', 'status', 'periodo']
+
+
+class ReenvioAlertasSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ReenvioAlertas
+        fields = [
+            'id', 'status', 'taxa_por_segundo', 'total', 'processados', 'enviados', 'falhas',
+            'data_criacao', 'concluido_em',
+        ]
+
+
+class ResumoMensalSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ResumoMensal
+        fields = ['mes', 'entidade', 'status', 'metodo_pagamento', 'quantidade', 'valor_total']
@@ -0,0 +1,124 @@
+"""Service de alertas de atraso: um alerta por encarregado e periodo, com envio em lote"""
+import logging
+from datetime import date
+from itertools import groupby
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from financeiro.models import AlertaEnviado, Mensalidade
+from financeiro.services.utils import em_blocos
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+ASSUNTO_ATRASO = "Mensalidades em atraso"
+
+
+def assunto(alerta):
+    return ASSUNTO_ATRASO if alerta.tipo == "ATRASO" else f"Alerta: {alerta.get_tipo_display()}"
+
+
+def mensagem_atraso(nome, mensalidades):
+    linhas = [f"Caro(a) {nome},", "", "As seguintes mensalidades estao em atraso:", ""]
+    linhas += [
+        f"- {item['aluno_nome']} ({item['mes_referente']:%m/%Y}): {item['valor_devido']:.2f} MZN"
+        for item in mensalidades
+    ]
+    total = sum(item["valor_devido"] for item in mensalidades)
+    linhas += ["", f"Total em divida: {total:.2f} MZN"]
+    return "\n".join(linhas)
+
+
+def _atrasadas_por_encarregado(periodo):
+    """Mensalidades em atraso ordenadas por encarregado, sem quem ja foi alertado no periodo."""
+    ja_alertados = AlertaEnviado.objects.filter(tipo="ATRASO", periodo=periodo).values("encarregado_id")
+    qs = (
+        Mensalidade.objects.atrasadas()
+        .exclude(aluno__encarregado_id__in=ja_alertados)
+        .with_financials()
+        .values(
+            "aluno_id", "mes_referente",
+            encarregado_id=F("aluno__encarregado_id"),
+            encarregado_nome=F("aluno__encarregado__user__nome"),
+            encarregado_email=F("aluno__encarregado__user__email"),
+            aluno_nome=F("aluno__user__nome"),
+            valor_devido=F("valor_devido_sql"),
+        )
+        .order_by("aluno__encarregado_id", "aluno_id", "mes_referente")
+    )
+    return groupby(qs.iterator(chunk_size=2000), key=lambda item: item["encarregado_id"])
+
+
+def _criar_lote(grupos, periodo, status="PENDENTE"):
+    """Insere os alertas do lote e as linhas M2M com 2 bulk_create; retorna os alertas criados."""
+    alertas = [
+        AlertaEnviado(
+            encarregado_id=encarregado_id,
+            tipo="ATRASO",
+            periodo=periodo,
+            email=itens[0]["encarregado_email"],
+            mensagem=mensagem_atraso(itens[0]["encarregado_nome"], itens),
+            status=status,
+        )
+        for encarregado_id, itens in grupos
+    ]
+    # a constraint unique_alerta_encarregado_tipo_periodo descarta alertas de execucoes concorrentes
+    AlertaEnviado.objects.bulk_create(alertas, ignore_conflicts=True)
+    criados = {
+        alerta.encarregado_id: alerta
+        for alerta in AlertaEnviado.objects.filter(
+            tipo="ATRASO", periodo=periodo, status=status, encarregado_id__in=[e for e, _ in grupos],
+        )
+    }
+    Ligacao = AlertaEnviado.alunos.through
+    Ligacao.objects.bulk_create(
+        [
+            Ligacao(alertaenviado_id=criados[encarregado_id].pk, aluno_id=aluno_id)
+            for encarregado_id, itens in grupos if encarregado_id in criados
+            for aluno_id in {item["aluno_id"] for item in itens}
+        ],
+        ignore_conflicts=True,
+    )
+    return list(criados.values())
+
+
+def enviar_alertas(alertas):
+    """Envia os emails numa unica ligacao ao servidor e grava o status com 2 UPDATEs."""
+    enviados, falhas = [], []
+    with get_connection() as conexao:
+        for alerta in alertas:
+            mensagem = EmailMessage(
+                assunto(alerta), alerta.mensagem, settings.DEFAULT_FROM_EMAIL, [alerta.email], connection=conexao
+            )
+            try:
+                mensagem.send()
+                enviados.append(alerta.pk)
+            except Exception:
+                logger.exception("Falha no envio do alerta %s", alerta.pk)
+                falhas.append(alerta.pk)
+    AlertaEnviado.objects.filter(pk__in=enviados).update(status="ENVIADO")
+    AlertaEnviado.objects.filter(pk__in=falhas).update(status="FALHA NO ENVIO")
+    return len(enviados), len(falhas)
+
+
+def gerar_alertas_atraso(periodo=None, batch_size=BATCH_SIZE, enviar=True):
+    """Cria (e envia) um alerta ATRASO por encarregado com mensalidades em atraso no periodo.
+
+    Encarregados ja alertados no mesmo periodo sao ignorados, por isso a execucao pode ser
+    repetida sem duplicar alertas. Alertas que ficam PENDENTE (execucao interrompida antes do
+    envio) sao enviados pelo reenvio (services.reenvio.para_reenvio). Com enviar=False ficam
+    RETIDO, que o reenvio ignora. Retorna {"alertas", "enviados", "falhas"}.
+    """
+    periodo = (periodo or date.today()).replace(day=1)
+    resultado = {"alertas": 0, "enviados": 0, "falhas": 0}
+    grupos = ((encarregado_id, list(itens)) for encarregado_id, itens in _atrasadas_por_encarregado(periodo))
+    for lote in em_blocos(grupos, batch_size):
+        with transaction.atomic():
+            alertas = _criar_lote(lote, periodo, "PENDENTE" if enviar else "RETIDO")
+        resultado["alertas"] += len(alertas)
+        if enviar and alertas:
+            enviados, falhas = enviar_alertas(alertas)
+            resultado["enviados"] += enviados
+            resultado["falhas"] += falhas
+    return resultado
@@ -0,0 +1,61 @@
+"""Service do relatorio de antiguidade de saldos (aging 0-30/31-60/61-90/90+) calculado em SQL"""
+from datetime import date
+from decimal import Decimal
+from django.db.models import Count, DecimalField, F, Q, Sum
+from django.db.models.functions import Coalesce
+from financeiro.models import Mensalidade
+
+FAIXAS = [
+    ("0_30", Q(dias_atraso_sql__lte=30)),
+    ("31_60", Q(dias_atraso_sql__gt=30, dias_atraso_sql__lte=60)),
+    ("61_90", Q(dias_atraso_sql__gt=60, dias_atraso_sql__lte=90)),
+    ("90_mais", Q(dias_atraso_sql__gt=90)),
+]
+
+AGRUPAMENTOS = {
+    "encarregado": {"grupo_id": F("aluno__encarregado_id"), "grupo": F("aluno__encarregado__user__nome")},
+    "escola": {"grupo": F("aluno__escola_dest")},
+    "rota": {"grupo_id": F("aluno__rotas_transporte__id"), "grupo": F("aluno__rotas_transporte__nome")},
+}
+TOP_DEVEDORES = 10
+
+
+def _somas():
+    """SUM(CASE ...) por faixa de dias de atraso sobre valor_devido (with_financials)."""
+    dinheiro = DecimalField(max_digits=14, decimal_places=2)
+    zero = Decimal("0.00")
+    somas = {
+        faixa: Coalesce(Sum("valor_devido_sql", filter=filtro), zero, output_field=dinheiro)
+        for faixa, filtro in FAIXAS
+    }
+    somas["total"] = Coalesce(Sum("valor_devido_sql"), zero, output_field=dinheiro)
+    somas["mensalidades"] = Count("id")
+    return somas
+
+
+def em_aberto(as_of=None):
+    return Mensalidade.objects.exclude(status="PAGO").with_financials(as_of)
+
+
+def relatorio_antiguidade(agrupar_por="encarregado", as_of=None, limite=None, top=TOP_DEVEDORES):
+    """Saldos em aberto por faixa de atraso, agrupados por encarregado, escola ou rota.
+
+    Todas as contas sao feitas na base de dados (3 queries: grupos, totais e maiores
+    devedores). Alunos em varias rotas contam em cada rota.
+    """
+    as_of = as_of or date.today()
+    qs = em_aberto(as_of)
+    grupos = qs.values(**AGRUPAMENTOS[agrupar_por]).annotate(**_somas()).order_by("-total")
+    if limite:
+        grupos = grupos[:limite]
+    devedores = (
+        qs.values(**AGRUPAMENTOS["encarregado"]).annotate(**_somas()).order_by("-total")[:top]
+    )
+    return {
+        "data": as_of,
+        "agrupar_por": agrupar_por,
+        "faixas": [faixa for faixa, _ in FAIXAS],
+        "grupos": list(grupos),
+        "totais": qs.aggregate(**_somas()),
+        "maiores_devedores": list(devedores),
+    }
@@ -0,0 +1,139 @@
+"""Helpers de cache partilhados pelos services financeiros"""
+import time
+from django.core.cache import cache
+from django.db import transaction
+
+LOCK_TIMEOUT = 30
+ESPERA = 0.05
+
+
+def obter_ou_calcular(chave, calcular, timeout, lock_timeout=LOCK_TIMEOUT):
+    """Le `chave` do cache ou calcula o valor com protecao contra stampede.
+
+    Apenas o pedido que obtem o lock (cache.add) recalcula; os restantes esperam que o
+    valor apareca no cache. Se o lock expirar sem valor, o pedido calcula por si proprio.
+    """
+    valor = cache.get(chave)
+    if valor is not None:
+        return valor
+
+    lock = f"{chave}:lock"
+    limite = time.monotonic() + lock_timeout
+    bloqueado = cache.add(lock, 1, lock_timeout)
+    while not bloqueado:
+        time.sleep(ESPERA)
+        valor = cache.get(chave)
+        if valor is not None:
+            return valor
+        if time.monotonic() > limite:
+            break
+        bloqueado = cache.add(lock, 1, lock_timeout)
+
+    try:
+        valor = calcular()
+        cache.set(chave, valor, timeout)
+    finally:
+        # sem o lock (desistiu de esperar) nao apaga o de quem o tem
+        if bloqueado:
+            cache.delete(lock)
+    return valor
+
+
+# Cache versionado: cada entidade (ex: "pagamento", "aluno:12") tem um numero de versao que
+# faz parte das chaves que dependem dela. Invalidar = mudar a versao; as chaves antigas expiram.
+PREFIXO_VERSAO = "financeiro:versao"
+PREFIXO_CONTADOR = "financeiro:cache"
+TIMEOUT_AGREGADOS = 60 * 60
+
+
+def versao(entidade):
+    chave = f"{PREFIXO_VERSAO}:{entidade}"
+    valor = cache.get(chave)
+    if valor is None:
+        # comeca num valor unico: se a versao for descartada do cache nao reaproveita chaves antigas
+        cache.add(chave, time.time_ns(), None)
+        valor = cache.get(chave)
+    return valor
+
+
+def _incrementar(entidades):
+    for entidade in entidades:
+        chave = f"{PREFIXO_VERSAO}:{entidade}"
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, time.time_ns(), None)
+
+
+class _Invalidacao:
+    """Callback de on_commit; enquanto esta pendente a transacao tem escritas destas entidades."""
+
+    def __init__(self, entidades):
+        self.entidades = set(entidades)
+        self.executada = False
+
+    def __call__(self):
+        _incrementar(self.entidades)
+        self.executada = True
+
+
+def _pendentes():
+    """Entidades alteradas na transacao atual e ainda nao confirmadas (um rollback limpa a lista)."""
+    return {
+        entidade
+        for _, funcao in transaction.get_connection().run_on_commit
+        if isinstance(funcao, _Invalidacao) and not funcao.executada
+        for entidade in funcao.entidades
+    }
+
+
+def invalidar(*entidades):
+    """Muda a versao das entidades ja e outra vez no commit.
+
+    O segundo incremento descarta valores calculados por outros processos durante a
+    transacao, que ainda viam os dados antigos.
+    """
+    _incrementar(entidades)
+    if transaction.get_connection().in_atomic_block:
+        novas = set(entidades) - _pendentes()
+        if novas:
+            transaction.on_commit(_Invalidacao(novas))
+
+
+def _contar(nome, resultado):
+    chave = f"{PREFIXO_CONTADOR}:{resultado}:{nome}"
+    if not cache.add(chave, 1, None):
+        try:
+            cache.incr(chave)
+        except ValueError:
+            cache.set(chave, 1, None)
+
+
+def em_cache(nome, dependencias, calcular, timeout=TIMEOUT_AGREGADOS, parametros=()):
+    """Valor de `calcular()` em cache numa chave que inclui a versao de cada dependencia.
+
+    Se a transacao atual alterou alguma dependencia o valor e calculado sem passar pelo
+    cache (pode ainda haver rollback). Conta hits e misses por `nome` (ver estatisticas).
+    """
+    if _pendentes() & set(dependencias):
+        return calcular()
+    versoes = ".".join(str(versao(entidade)) for entidade in dependencias)
+    chave = ":".join(["financeiro:valor", nome, *[str(p) for p in parametros], versoes])
+    valor = cache.get(chave)
+    if valor is not None:
+        _contar(nome, "hits")
+        return valor
+    _contar(nome, "misses")
+    valor = calcular()
+    cache.set(chave, valor, timeout)
+    return valor
+
+
+def estatisticas(nomes):
+    """{nome: {"hits", "misses"}} dos valores guardados com em_cache."""
+    return {
+        nome: {
+            resultado: cache.get(f"{PREFIXO_CONTADOR}:{resultado}:{nome}", 0) for resultado in ("hits", "misses")
+        }
+        for nome in nomes
+    }
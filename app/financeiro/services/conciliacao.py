@@ -0,0 +1,174 @@
+"""Service de conciliacao bancaria: associa transferencias do extrato a mensalidades em aberto"""
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.db.models import F
+from django.utils.dateparse import parse_date, parse_datetime
+from financeiro.models import Mensalidade
+from financeiro.services.importacao import importar_pagamentos
+
+CONFIANCA_MINIMA = Decimal("0.70")
+JANELA_ANTES = timedelta(days=15)
+JANELA_DEPOIS = timedelta(days=30)
+# tokens muito comuns (ex: "maria") geram demasiados candidatos e nao discriminam
+MAX_POR_TOKEN = 200
+MAX_POR_VALOR = 5
+
+PESO_BI = Decimal("0.45")
+PESO_VALOR_DEVIDO = Decimal("0.35")
+PESO_VALOR = Decimal("0.25")
+PESO_NOME = Decimal("0.30")
+PESO_DATA = Decimal("0.10")
+
+
+def normalizar_tokens(texto):
+    """Tokens em minusculas, sem acentos, com pelo menos 3 caracteres."""
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode().lower()
+    return {token for token in re.split(r"[^a-z0-9]+", texto) if len(token) >= 3}
+
+
+def _centavos(valor):
+    return int((valor * 100).to_integral_value())
+
+
+class IndiceMensalidades:
+    """Indices em memoria das mensalidades em aberto: por valor, por BI e por token do nome."""
+
+    def __init__(self, mensalidades):
+        self.mensalidades = {}
+        self.por_valor = defaultdict(set)
+        self.por_bi = defaultdict(set)
+        self.por_token = defaultdict(set)
+        for item in mensalidades:
+            pk = item["pk"]
+            item["nomes"] = [normalizar_tokens(item["aluno_nome"]), normalizar_tokens(item["encarregado_nome"])]
+            item["tokens"] = set().union(*item["nomes"])
+            self.mensalidades[pk] = item
+            self.por_valor[_centavos(item["valor_devido"])].add(pk)
+            self.por_valor[_centavos(item["valor"])].add(pk)
+            for bi in (item["aluno_bi"], item["encarregado_bi"]):
+                if bi:
+                    self.por_bi[bi.lower()].add(pk)
+            for token in item["tokens"]:
+                self.por_token[token].add(pk)
+
+    @classmethod
+    def das_mensalidades_em_aberto(cls, as_of=None):
+        qs = Mensalidade.objects.exclude(status="PAGO").with_financials(as_of).values(
+            "pk", "valor", "data_vencimento", "data_limite",
+            valor_devido=F("valor_devido_sql"),
+            aluno_nome=F("aluno__user__nome"),
+            aluno_bi=F("aluno__nrBI"),
+            encarregado_nome=F("aluno__encarregado__user__nome"),
+            encarregado_bi=F("aluno__encarregado__nrBI"),
+        )
+        return cls(qs.iterator(chunk_size=5000))
+
+    def candidatos(self, valor, tokens):
+        """Candidatos vindos de BI e nome; o valor so e usado sozinho quando e pouco ambiguo."""
+        encontrados = set()
+        for token in tokens:
+            encontrados |= self.por_bi.get(token, set())
+            ids = self.por_token.get(token, set())
+            if len(ids) <= MAX_POR_TOKEN:
+                encontrados |= ids
+        if not encontrados:
+            por_valor = self.por_valor.get(_centavos(valor), set())
+            if len(por_valor) <= MAX_POR_VALOR:
+                encontrados = set(por_valor)
+        return encontrados
+
+    def pontuar(self, pk, valor, data, tokens):
+        """Retorna (confianca 0..1, motivos) para a mensalidade `pk`."""
+        item = self.mensalidades[pk]
+        confianca, motivos = Decimal("0"), []
+        if {b.lower() for b in (item["aluno_bi"], item["encarregado_bi"]) if b} & tokens:
+            confianca += PESO_BI
+            motivos.append("bi")
+        if valor == item["valor_devido"]:
+            confianca += PESO_VALOR_DEVIDO
+            motivos.append("valor_devido")
+        elif valor == item["valor"]:
+            confianca += PESO_VALOR
+            motivos.append("valor")
+        # fracao do nome (aluno ou encarregado) presente na referencia
+        fracao = max((Decimal(len(nome & tokens)) / len(nome) for nome in item["nomes"] if nome), default=0)
+        if fracao:
+            confianca += PESO_NOME * fracao
+            motivos.append("nome")
+        if data and item["data_vencimento"] - JANELA_ANTES <= data <= item["data_limite"] + JANELA_DEPOIS:
+            confianca += PESO_DATA
+            motivos.append("data")
+        return min(confianca, Decimal("1")).quantize(Decimal("0.01")), motivos
+
+
+def _ler_transferencia(registo):
+    valor = Decimal(str(registo.get("valor") or "")).quantize(Decimal("0.01"))
+    texto_data = registo.get("data") or registo.get("data_pagamento") or ""
+    data = parse_date(texto_data) or (parse_datetime(texto_data) and parse_datetime(texto_data).date())
+    return valor, data, registo.get("referencia") or registo.get("observacao") or ""
+
+
+def propor_conciliacao(registos, indice=None, confianca_minima=CONFIANCA_MINIMA):
+    """Propoe uma mensalidade para cada linha (numero_linha, dict) do extrato.
+
+    Cada mensalidade e atribuida no maximo uma vez, pela ordem de maior confianca.
+    Retorna (propostas, sem_correspondencia).
+    """
+    indice = indice or IndiceMensalidades.das_mensalidades_em_aberto()
+    pontuadas, sem_correspondencia = [], []
+    for numero, registo in registos:
+        try:
+            valor, data, referencia = _ler_transferencia(registo)
+        except (InvalidOperation, ValueError):
+            sem_correspondencia.append({"linha": numero, "motivo": "Valor ou data invalidos"})
+            continue
+        tokens = normalizar_tokens(referencia)
+        resultados = sorted(
+            ((indice.pontuar(pk, valor, data, tokens), pk) for pk in indice.candidatos(valor, tokens)),
+            key=lambda r: (r[0][0], -r[1]),
+            reverse=True,
+        )
+        pontuadas.append((numero, valor, data, referencia, resultados))
+
+    propostas, usadas = [], set()
+    for numero, valor, data, referencia, resultados in sorted(
+        pontuadas, key=lambda p: p[4][0][0][0] if p[4] else Decimal("0"), reverse=True
+    ):
+        melhor = next(((pontos, pk) for pontos, pk in resultados if pk not in usadas), None)
+        if melhor is None or melhor[0][0] < confianca_minima:
+            sem_correspondencia.append({"linha": numero, "motivo": "Sem correspondencia com confianca suficiente"})
+            continue
+        (confianca, motivos), pk = melhor
+        usadas.add(pk)
+        propostas.append({
+            "linha": numero,
+            "mensalidade": pk,
+            "valor": valor,
+            "data": data,
+            "referencia": referencia,
+            "confianca": confianca,
+            "motivos": motivos,
+        })
+    propostas.sort(key=lambda p: p["linha"])
+    sem_correspondencia.sort(key=lambda s: s["linha"])
+    return propostas, sem_correspondencia
+
+
+def aplicar_conciliacao(propostas):
+    """Cria os pagamentos (TRANSFERENCIA) das propostas aceites, em lote."""
+    return importar_pagamentos(
+        (
+            proposta["linha"],
+            {
+                "mensalidade": proposta["mensalidade"],
+                "valor": proposta["valor"],
+                "data_pagamento": proposta["data"].isoformat() if proposta["data"] else None,
+                "metodo_pagamento": "TRANSFERENCIA",
+                "observacao": proposta["referencia"],
+            },
+        )
+        for proposta in propostas
+    )
@@ -0,0 +1,62 @@
+"""Service de exportacao CSV em streaming (memoria constante, qualquer numero de linhas)"""
+import csv
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+COLUNAS_MENSALIDADE = [
+    ("id", "id"),
+    ("aluno", "aluno__user__nome"),
+    ("aluno_bi", "aluno__nrBI"),
+    ("escola", "aluno__escola_dest"),
+    ("encarregado", "aluno__encarregado__user__nome"),
+    ("encarregado_bi", "aluno__encarregado__nrBI"),
+    ("mes_referente", "mes_referente"),
+    ("valor", "valor"),
+    ("valor_pago", "valor_pago"),
+    ("status", "status"),
+    ("data_vencimento", "data_vencimento"),
+    ("data_limite", "data_limite"),
+    ("data_pagamento", "data_pagamento"),
+]
+
+COLUNAS_PAGAMENTO = [
+    ("id", "id"),
+    ("mensalidade", "mensalidade_id"),
+    ("aluno", "mensalidade__aluno__user__nome"),
+    ("encarregado", "mensalidade__aluno__encarregado__user__nome"),
+    ("mes_referente", "mensalidade__mes_referente"),
+    ("valor", "valor"),
+    ("metodo_pagamento", "metodo_pagamento"),
+    ("data_pagamento", "data_pagamento"),
+    ("observacao", "observacao"),
+]
+
+
+class _Eco:
+    """Pseudo-buffer: o csv.writer escreve e recebemos a linha de volta para o stream."""
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(qs, colunas, chunk_size=CHUNK_SIZE):
+    """Gera o CSV linha a linha; no PostgreSQL o iterator usa um cursor do lado do servidor."""
+    writer = csv.writer(_Eco())
+    yield writer.writerow([nome for nome, _ in colunas])
+    for linha in qs.order_by("pk").values_list(*[campo for _, campo in colunas]).iterator(chunk_size=chunk_size):
+        yield writer.writerow(linha)
+
+
+def resposta_csv(nome_arquivo, qs, colunas):
+    response = StreamingHttpResponse(linhas_csv(qs, colunas), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="{nome_arquivo}"'
+    return response
+
+
+def exportar_mensalidades(qs):
+    return resposta_csv("mensalidades.csv", qs, COLUNAS_MENSALIDADE)
+
+
+def exportar_pagamentos(qs):
+    return resposta_csv("pagamentos.csv", qs, COLUNAS_PAGAMENTO)
@@ -0,0 +1,106 @@
+"""Service do extrato consolidado de um encarregado (todos os educandos) num numero fixo de queries"""
+import hashlib
+from datetime import date
+from decimal import Decimal
+from django.db.models import Count, Max, Prefetch
+from django.utils import timezone
+from core.models import Aluno
+from financeiro.models import Mensalidade, Pagamento
+
+
+def versao_extrato(encarregado, hoje=None):
+    """Uma query agregada que muda sempre que o extrato mudaria (usada como ETag).
+
+    A data entra na versao porque as multas de atraso mudam com o dia.
+    """
+    versao = Aluno.objects.filter(encarregado=encarregado).aggregate(
+        n_alunos=Count("id", distinct=True),
+        aluno_alterado=Max("atualizado_em"),
+        n_mensalidades=Count("mensalidades", distinct=True),
+        mensalidade_alterada=Max("mensalidades__data_atualizacao"),
+        n_pagamentos=Count("mensalidades__pagamentos", distinct=True),
+        pagamento_alterado=Max("mensalidades__pagamentos__data_atualizacao"),
+    )
+    chave = repr(sorted(versao.items())) + (hoje or date.today()).isoformat()
+    return hashlib.sha1(chave.encode()).hexdigest()
+
+
+def alunos_com_mensalidades(encarregado, hoje=None):
+    """3 queries: alunos (com user), mensalidades anotadas e pagamentos ativos."""
+    mensalidades = Mensalidade.objects.with_financials(hoje).order_by("mes_referente", "id")
+    pagamentos = Pagamento.objects.order_by("data_pagamento", "id")
+    return (
+        Aluno.objects.filter(encarregado=encarregado)
+        .select_related("user")
+        .prefetch_related(
+            Prefetch("mensalidades", queryset=mensalidades),
+            Prefetch("mensalidades__pagamentos", queryset=pagamentos),
+        )
+        .order_by("user__nome", "id")
+    )
+
+
+def _movimentos(mensalidades):
+    """Debitos (mensalidades, no vencimento) e creditos (pagamentos) com saldo acumulado."""
+    eventos = []
+    for mensalidade in mensalidades:
+        eventos.append((mensalidade.data_vencimento, 0, mensalidade.pk, "MENSALIDADE", mensalidade.valor_atualizado))
+        for pagamento in mensalidade.pagamentos.all():
+            eventos.append((timezone.localdate(pagamento.data_pagamento), 1, pagamento.pk, "PAGAMENTO", -pagamento.valor))
+    saldo = Decimal("0.00")
+    movimentos = []
+    for data, _, pk, tipo, valor in sorted(eventos):
+        saldo += valor
+        movimentos.append({"data": data, "tipo": tipo, "id": pk, "valor": valor, "saldo": saldo})
+    return movimentos
+
+
+def montar_extrato(encarregado, hoje=None):
+    hoje = hoje or date.today()
+    zero = Decimal("0.00")
+    alunos, todas = [], []
+    for aluno in alunos_com_mensalidades(encarregado, hoje):
+        mensalidades = list(aluno.mensalidades.all())
+        todas += mensalidades
+        alunos.append({
+            "id": aluno.pk,
+            "nome": aluno.user.nome,
+            "escola": aluno.escola_dest,
+            "valor_devido": sum((m.valor_devido for m in mensalidades), zero),
+            "em_atraso": sum((m.valor_devido for m in mensalidades if m.dias_atraso > 0), zero),
+            "mensalidades": [
+                {
+                    "id": m.pk,
+                    "mes_referente": m.mes_referente,
+                    "data_vencimento": m.data_vencimento,
+                    "status": m.status,
+                    "valor": m.valor,
+                    "valor_atualizado": m.valor_atualizado,
+                    "valor_pago": m.total_pago,
+                    "valor_devido": m.valor_devido,
+                    "dias_atraso": m.dias_atraso,
+                    "pagamentos": [
+                        {
+                            "id": p.pk,
+                            "valor": p.valor,
+                            "data_pagamento": p.data_pagamento,
+                            "metodo_pagamento": p.metodo_pagamento,
+                        }
+                        for p in m.pagamentos.all()
+                    ],
+                }
+                for m in mensalidades
+            ],
+        })
+    return {
+        "encarregado": {"id": encarregado.pk, "nome": encarregado.user.nome, "email": encarregado.user.email},
+        "data": hoje,
+        "alunos": alunos,
+        "movimentos": _movimentos(todas),
+        "totais": {
+            "valor": sum((m.valor_atualizado for m in todas), zero),
+            "pago": sum((m.total_pago for m in todas), zero),
+            "devido": sum((a["valor_devido"] for a in alunos), zero),
+            "em_atraso": sum((a["em_atraso"] for a in alunos), zero),
+        },
+    }
@@ -0,0 +1,66 @@
+"""Service de geracao em massa das mensalidades do mes"""
+import calendar
+from datetime import date, timedelta
+from django.db import transaction, DatabaseError
+from core.models import Aluno
+from financeiro.models import Mensalidade
+from financeiro.services.cache import invalidar
+from financeiro.services.saldos import invalidar_saldos
+from financeiro.services.utils import em_blocos
+
+DIA_VENCIMENTO = 10
+DIAS_LIMITE = 5
+CHUNK_SIZE = 1000
+
+
+def calcular_datas(ano, mes, dia_vencimento=DIA_VENCIMENTO, dias_limite=DIAS_LIMITE):
+    """Retorna (mes_referente, data_vencimento, data_limite) para o mes indicado.
+
+    O dia de vencimento e ajustado ao ultimo dia do mes quando nao existe (ex: 31 em fevereiro).
+    """
+    ultimo_dia = calendar.monthrange(ano, mes)[1]
+    mes_referente = date(ano, mes, 1)
+    data_vencimento = date(ano, mes, min(dia_vencimento, ultimo_dia))
+    return mes_referente, data_vencimento, data_vencimento + timedelta(days=dias_limite)
+
+
+def gerar_mensalidades(ano, mes, dia_vencimento=DIA_VENCIMENTO, dias_limite=DIAS_LIMITE, chunk_size=CHUNK_SIZE):
+    """Cria uma Mensalidade por aluno ativo para o mes, em blocos de bulk_create.
+
+    Alunos que ja tem mensalidade no mes sao ignorados (unique aluno/mes_referente), por isso
+    pode ser executado de novo apos uma falha para continuar de onde parou.
+    Retorna um dict com as contagens de criadas, ignoradas e falhas.
+    """
+    mes_referente, data_vencimento, data_limite = calcular_datas(ano, mes, dia_vencimento, dias_limite)
+    resultado = {"criadas": 0, "ignoradas": 0, "falhas": 0}
+
+    alunos = Aluno.objects.filter(ativo=True).order_by("pk").values_list("pk", "mensalidade")
+    for bloco in em_blocos(alunos.iterator(chunk_size=chunk_size), chunk_size):
+        ids = [pk for pk, _ in bloco]
+        do_mes = Mensalidade.objects.filter(mes_referente=mes_referente, aluno_id__in=ids)
+        try:
+            with transaction.atomic():
+                existentes = set(do_mes.values_list("aluno_id", flat=True))
+                Mensalidade.objects.bulk_create(
+                    [
+                        Mensalidade(
+                            aluno_id=pk,
+                            valor=valor,
+                            mes_referente=mes_referente,
+                            data_vencimento=data_vencimento,
+                            data_limite=data_limite,
+                        )
+                        for pk, valor in bloco if pk not in existentes
+                    ],
+                    ignore_conflicts=True,
+                )
+                criadas = do_mes.count() - len(existentes)
+        except DatabaseError:
+            resultado["falhas"] += len(bloco)
+            continue
+        resultado["criadas"] += criadas
+        resultado["ignoradas"] += len(bloco) - criadas
+    if resultado["criadas"]:
+        invalidar("mensalidade")
+        invalidar_saldos()
+    return resultado
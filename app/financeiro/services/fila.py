@@ -0,0 +1,186 @@
+"""Fila de tarefas em background sobre a base de dados (sem Redis/Celery)"""
+import time
+import logging
+import threading
+import traceback
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Max, Q
+from django.utils import timezone
+from financeiro.models import Tarefa
+
+logger = logging.getLogger(__name__)
+
+REGISTO = {}
+BACKOFF_BASE = 2
+BACKOFF_MAXIMO = 3600
+# o worker renova a reserva enquanto executa; reserva expirada = worker morreu
+DURACAO_RESERVA = timedelta(minutes=5)
+# tarefas EXECUTANDO sem reserva (anteriores a reservada_ate) ha mais tempo que isto
+TEMPO_MAXIMO_EXECUCAO = timedelta(minutes=30)
+
+
+class TarefaRegistada:
+    """Funcao registada na fila; `delay` grava a tarefa, a chamada direta executa-a ja."""
+
+    def __init__(self, funcao, nome, max_tentativas):
+        self.funcao = funcao
+        self.nome = nome
+        self.max_tentativas = max_tentativas
+        self.__doc__ = funcao.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.funcao(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Enfileira; dentro de uma transacao a tarefa so fica visivel no commit."""
+        return Tarefa.objects.create(
+            nome=self.nome, args=list(args), kwargs=kwargs, max_tentativas=self.max_tentativas
+        )
+
+
+def tarefa(nome=None, max_tentativas=5):
+    """Decorador que regista a funcao na fila com o nome `nome` (padrao: modulo.funcao)."""
+    def registar(funcao):
+        registada = TarefaRegistada(funcao, nome or f"{funcao.__module__}.{funcao.__name__}", max_tentativas)
+        REGISTO[registada.nome] = registada
+        return registada
+    return registar
+
+
+def atraso_backoff(tentativas):
+    """Espera exponencial antes da proxima tentativa: 2s, 4s, 8s, ... ate BACKOFF_MAXIMO."""
+    return timedelta(seconds=min(BACKOFF_BASE ** tentativas, BACKOFF_MAXIMO))
+
+
+def reservar(worker, limite=1):
+    """Reserva ate `limite` tarefas prontas com SELECT ... FOR UPDATE SKIP LOCKED.
+
+    Workers concorrentes nunca recebem a mesma tarefa e nao esperam uns pelos outros.
+    """
+    agora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Tarefa.objects.select_for_update(skip_locked=True)
+            .filter(status="PENDENTE", executar_em__lte=agora)
+            .order_by("executar_em", "id")
+            .values_list("id", flat=True)[:limite]
+        )
+        if ids:
+            Tarefa.objects.filter(pk__in=ids).update(
+                status="EXECUTANDO", iniciada_em=agora, reservada_ate=agora + DURACAO_RESERVA, worker=worker
+            )
+    return list(Tarefa.objects.filter(pk__in=ids).order_by("executar_em", "id"))
+
+
+def _reservada(tarefa_db):
+    """A tarefa enquanto continua reservada por esta execucao (iniciada_em muda se outro worker a reservar)."""
+    return Tarefa.objects.filter(
+        pk=tarefa_db.pk, status="EXECUTANDO", worker=tarefa_db.worker, iniciada_em=tarefa_db.iniciada_em
+    )
+
+
+def renovar_reserva(tarefa_db):
+    """Prolonga a reserva da tarefa enquanto o mesmo worker a executa. Retorna False se a perdeu."""
+    return bool(_reservada(tarefa_db).update(reservada_ate=timezone.now() + DURACAO_RESERVA))
+
+
+class RenovadorReserva(threading.Thread):
+    """Renova a reserva da tarefa a cada terco de DURACAO_RESERVA ate `parar`."""
+
+    def __init__(self, tarefa_db):
+        super().__init__(daemon=True)
+        self.tarefa_db = tarefa_db
+        self.terminar = threading.Event()
+
+    def run(self):
+        try:
+            while not self.terminar.wait(DURACAO_RESERVA.total_seconds() / 3):
+                if not renovar_reserva(self.tarefa_db):
+                    logger.warning("Tarefa %s perdeu a reserva", self.tarefa_db)
+                    return
+        finally:
+            connection.close()
+
+    def parar(self):
+        self.terminar.set()
+        self.join()
+
+
+def executar(tarefa_db):
+    """Executa uma tarefa reservada e grava o resultado, reagendando ou mandando para FALHADA.
+
+    O resultado so e gravado se a reserva ainda for desta execucao: se expirou e a tarefa foi
+    devolvida a fila (recuperar_presas), o estado de quem a tem agora nao e sobrescrito.
+    """
+    registada = REGISTO.get(tarefa_db.nome)
+    tarefa_db.tentativas += 1
+    inicio = time.perf_counter()
+    renovador = RenovadorReserva(tarefa_db)
+    renovador.start()
+    try:
+        if registada is None:
+            raise LookupError(f"Tarefa nao registada: {tarefa_db.nome}")
+        registada.funcao(*tarefa_db.args, **tarefa_db.kwargs)
+    except Exception:
+        erro = traceback.format_exc()
+        if registada is None or tarefa_db.tentativas >= tarefa_db.max_tentativas:
+            tarefa_db.status = "FALHADA"
+            logger.error("Tarefa %s falhou definitivamente: %s", tarefa_db, erro)
+        else:
+            tarefa_db.status = "PENDENTE"
+            tarefa_db.executar_em = timezone.now() + atraso_backoff(tarefa_db.tentativas)
+            logger.warning("Tarefa %s falhou (tentativa %s)", tarefa_db, tarefa_db.tentativas)
+        tarefa_db.ultimo_erro = erro
+    else:
+        tarefa_db.status = "CONCLUIDA"
+        tarefa_db.concluida_em = timezone.now()
+    finally:
+        renovador.parar()
+    tarefa_db.duracao_ms = int((time.perf_counter() - inicio) * 1000)
+    tarefa_db.reservada_ate = None
+    campos = ["status", "tentativas", "executar_em", "concluida_em", "duracao_ms", "ultimo_erro", "reservada_ate"]
+    if not _reservada(tarefa_db).update(
+        data_atualizacao=timezone.now(), **{campo: getattr(tarefa_db, campo) for campo in campos}
+    ):
+        logger.warning("Tarefa %s perdeu a reserva; resultado (%s) descartado", tarefa_db, tarefa_db.status)
+    return tarefa_db
+
+
+def recuperar_presas(limite=TEMPO_MAXIMO_EXECUCAO):
+    """Devolve a fila as tarefas EXECUTANDO com a reserva expirada (o worker morreu).
+
+    Tarefas longas de um worker vivo continuam reservadas, porque o worker renova a reserva (RenovadorReserva).
+    """
+    agora = timezone.now()
+    expiradas = Q(reservada_ate__lt=agora) | Q(reservada_ate__isnull=True, iniciada_em__lt=agora - limite)
+    return Tarefa.objects.filter(expiradas, status="EXECUTANDO").update(
+        status="PENDENTE", executar_em=agora, reservada_ate=None
+    )
+
+
+def processar_fila(worker="worker", lote=10, maximo=None):
+    """Executa tarefas ate a fila ficar vazia (ou ate `maximo`). Retorna o numero executado."""
+    executadas = 0
+    while maximo is None or executadas < maximo:
+        reservadas = reservar(worker, lote if maximo is None else min(lote, maximo - executadas))
+        if not reservadas:
+            break
+        for tarefa_db in reservadas:
+            executar(tarefa_db)
+            executadas += 1
+    return executadas
+
+
+def metricas():
+    """Contagens e tempos de execucao por tarefa."""
+    return list(
+        Tarefa.objects.values("nome").annotate(
+            total=Count("id"),
+            pendentes=Count("id", filter=Q(status="PENDENTE")),
+            concluidas=Count("id", filter=Q(status="CONCLUIDA")),
+            falhadas=Count("id", filter=Q(status="FALHADA")),
+            duracao_media_ms=Avg("duracao_ms", filter=Q(status="CONCLUIDA")),
+            duracao_maxima_ms=Max("duracao_ms", filter=Q(status="CONCLUIDA")),
+        ).order_by("nome")
+    )
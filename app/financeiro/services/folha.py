@@ -0,0 +1,80 @@
+"""Service da folha salarial mensal: cria e paga os salarios de todos os funcionarios em lote"""
+from datetime import date
+from django.db import transaction
+from django.utils import timezone
+from core.models import User
+from financeiro.models import Salario
+from financeiro.services.cache import invalidar
+from financeiro.services.razao import lancar
+from financeiro.services.utils import em_blocos
+from financeiro.tasks import gerar_recibos_lote
+
+BATCH_SIZE = 1000
+# utilizadores que nao sao funcionarios (nao recebem salario)
+ROLES_SEM_SALARIO = ["ALUNO", "ENCARREGADO"]
+
+
+def funcionarios_com_salario():
+    return User.objects.filter(is_active=True, salario__gt=0).exclude(role__in=ROLES_SEM_SALARIO)
+
+
+def criar_salarios(mes_referente, batch_size=BATCH_SIZE):
+    """Cria com bulk_create os salarios do mes que ainda nao existem. Retorna (criados, existentes)."""
+    antes = Salario.objects.do_mes(mes_referente).count()
+    existentes = Salario.objects.do_mes(mes_referente).values("funcionario_id")
+    funcionarios = (
+        funcionarios_com_salario().exclude(pk__in=existentes).order_by("pk").values_list("pk", "salario")
+    )
+    for bloco in em_blocos(funcionarios.iterator(chunk_size=batch_size), batch_size):
+        # unique (funcionario, mes_referente): execucoes concorrentes nao duplicam
+        Salario.objects.bulk_create(
+            [
+                Salario(
+                    funcionario_id=pk, valor=salario, mes_referente=mes_referente, status="PENDENTE",
+                    gerado_pela_folha=True,
+                )
+                for pk, salario in bloco
+            ],
+            ignore_conflicts=True,
+        )
+    criados = Salario.objects.do_mes(mes_referente).count() - antes
+    if criados:
+        invalidar("salario")
+    return criados, antes
+
+
+def pagar_salarios(mes_referente):
+    """Marca como PAGO os salarios do mes criados pela folha e enfileira os recibos numa tarefa.
+
+    Salarios lancados manualmente (ex: pelo admin) sao pagos a parte.
+    """
+    with transaction.atomic():
+        qs = Salario.objects.do_mes(mes_referente).filter(gerado_pela_folha=True).exclude(status="PAGO")
+        valores = dict(qs.select_for_update().values_list("pk", "valor"))
+        ids = list(valores)
+        Salario.objects.filter(pk__in=ids).update(
+            status="PAGO", data_pagamento=timezone.now(), data_atualizacao=timezone.now()
+        )
+        if ids:
+            invalidar("salario")
+            # .update nao dispara os signals; salarios por pagar nao tem saldo no razao
+            lancar("SALARIO", [(pk, valor, timezone.localdate()) for pk, valor in valores.items()])
+            gerar_recibos_lote.delay("salario", ids)
+    return len(ids)
+
+
+def processar_folha(ano, mes, pagar=True, batch_size=BATCH_SIZE):
+    """Cria (e paga) a folha do mes; repetir a execucao nao duplica nem volta a pagar.
+
+    Retorna {"criados", "existentes", "pagos", "total_pago"} com o total do mes igual a
+    Salario.objects.do_mes(mes).total_pago().
+    """
+    mes_referente = date(ano, mes, 1)
+    criados, existentes = criar_salarios(mes_referente, batch_size)
+    pagos = pagar_salarios(mes_referente) if pagar else 0
+    return {
+        "criados": criados,
+        "existentes": existentes,
+        "pagos": pagos,
+        "total_pago": Salario.objects.do_mes(mes_referente).total_pago(),
+    }
@@ -0,0 +1,110 @@
+"""Service de idempotencia dos POST (header Idempotency-Key): a resposta fica guardada durante o TTL"""
+import hashlib
+import json
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from financeiro.models import ChaveIdempotencia
+
+HEADER = "Idempotency-Key"
+TTL = timedelta(hours=24)
+# pedido em curso ha mais tempo que isto: o processo morreu antes de gravar a resposta
+EM_CURSO_MAXIMO = timedelta(minutes=5)
+TAMANHO_MAXIMO = 255
+TENTATIVAS_RESERVA = 3
+
+
+def hash_pedido(request):
+    """sha256 do metodo, caminho, campos e conteudo dos ficheiros do pedido."""
+    digest = hashlib.sha256(f"{request.method} {request.path}".encode())
+    dados = request.data.dict() if hasattr(request.data, "dict") else request.data
+    digest.update(json.dumps(dados, sort_keys=True, default=str).encode())
+    for nome, ficheiro in sorted(request.FILES.items()):
+        digest.update(nome.encode())
+        for bloco in ficheiro.chunks():
+            digest.update(bloco)
+        ficheiro.seek(0)
+    return digest.hexdigest()
+
+
+def _reservar(utilizador, escopo, chave, hash_):
+    """Cria o registo em curso (status vazio) ou devolve o existente. Retorna (registo, novo).
+
+    Chaves expiradas e reservas em curso ha mais de EM_CURSO_MAXIMO sao reaproveitadas. O registo
+    que impediu o INSERT pode ser apagado antes de ser lido (o pedido que o tinha falhou): tenta-se
+    de novo e, se continuar a mudar, retorna (None, False).
+    """
+    for _ in range(TENTATIVAS_RESERVA):
+        agora = timezone.now()
+        try:
+            with transaction.atomic():
+                registo = ChaveIdempotencia.objects.create(
+                    utilizador=utilizador, escopo=escopo, chave=chave, hash_pedido=hash_, expira_em=agora + TTL,
+                )
+            return registo, True
+        except IntegrityError:
+            pass
+        try:
+            registo = ChaveIdempotencia.objects.get(utilizador=utilizador, escopo=escopo, chave=chave)
+            limite = agora - EM_CURSO_MAXIMO
+            abandonada = Q(expira_em__lte=agora) | Q(status_code__isnull=True, criado_em__lte=limite)
+            if registo.expira_em <= agora or (registo.status_code is None and registo.criado_em <= limite):
+                # o UPDATE condicional garante que so um pedido a reutiliza
+                reutilizada = ChaveIdempotencia.objects.filter(abandonada, pk=registo.pk).update(
+                    hash_pedido=hash_, status_code=None, resposta=None, criado_em=agora, expira_em=agora + TTL,
+                )
+                registo.refresh_from_db()
+                return registo, bool(reutilizada)
+            return registo, False
+        except ChaveIdempotencia.DoesNotExist:
+            continue
+    return None, False
+
+
+def idempotente(request, escopo, executar):
+    """Executa `executar()` uma unica vez por Idempotency-Key; as repeticoes recebem a resposta guardada.
+
+    Sem header o pedido segue normalmente. A mesma chave com outro corpo da 422 e um pedido
+    ainda em curso da 409 (ate EM_CURSO_MAXIMO). So respostas 2xx ficam guardadas; erros libertam a chave.
+    """
+    chave = request.headers.get(HEADER)
+    if not chave:
+        return executar()
+    if len(chave) > TAMANHO_MAXIMO:
+        raise ValidationError({HEADER: f"No maximo {TAMANHO_MAXIMO} caracteres."})
+
+    hash_ = hash_pedido(request)
+    registo, novo = _reservar(request.user, escopo, chave, hash_)
+    if not novo:
+        if registo is None:
+            return Response({"detail": f"Pedido com esta {HEADER} ainda em curso."}, status=status.HTTP_409_CONFLICT)
+        if registo.hash_pedido != hash_:
+            return Response(
+                {"detail": f"{HEADER} ja usada com outro pedido."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if registo.status_code is None:
+            return Response({"detail": f"Pedido com esta {HEADER} ainda em curso."}, status=status.HTTP_409_CONFLICT)
+        response = Response(registo.resposta, status=registo.status_code)
+        response["Idempotent-Replayed"] = "true"
+        return response
+
+    # criado_em identifica esta reserva: se foi reaproveitada entretanto, nao mexe na de outro pedido
+    reserva = ChaveIdempotencia.objects.filter(pk=registo.pk, criado_em=registo.criado_em, status_code__isnull=True)
+    try:
+        response = executar()
+    except Exception:
+        reserva.delete()
+        raise
+    if status.is_success(response.status_code):
+        reserva.update(status_code=response.status_code, resposta=response.data)
+    else:
+        reserva.delete()
+    return response
+
+
+def limpar_expiradas(agora=None):
+    return ChaveIdempotencia.objects.filter(expira_em__lte=agora or timezone.now()).delete()[0]
@@ -0,0 +1,168 @@
+"""Service de importacao em massa de pagamentos (extratos bancarios / M-Pesa)"""
+import csv
+import json
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from financeiro.models import Pagamento, M_PAGAMENTO
+from financeiro.services.pagamentos import bloquear_mensalidades, registar_pagamentos
+from financeiro.services.status import marcar_mensalidades, recalcular_marcadas
+from financeiro.services.utils import em_blocos
+
+BATCH_SIZE = 1000
+METODOS = {metodo for metodo, _ in M_PAGAMENTO}
+# limites das colunas: valores fora deles dariam DataError a meio da importacao
+_VALOR = Pagamento._meta.get_field("valor")
+CASAS_DECIMAIS = Decimal(1).scaleb(-_VALOR.decimal_places)
+VALOR_MAXIMO = Decimal(10) ** (_VALOR.max_digits - _VALOR.decimal_places)
+ID_MAXIMO = 2 ** 63 - 1
+CAMPOS = ["mensalidade", "valor", "data_pagamento", "metodo_pagamento", "observacao"]
+
+
+def ler_linhas(linhas, formato="csv"):
+    """Le as linhas de texto (iteravel, lido em streaming) e gera (numero_linha, dict).
+
+    CSV deve ter cabecalho com as colunas de CAMPOS; JSON lines tem um objeto por linha.
+    Linhas que nao sao possiveis de ler geram um dict com a chave "_erro".
+    """
+    if formato == "csv":
+        leitor = csv.DictReader(linhas)
+        for registo in leitor:
+            yield leitor.line_num, registo
+        return
+    for numero, linha in enumerate(linhas, start=1):
+        if not linha.strip():
+            continue
+        try:
+            registo = json.loads(linha)
+        except ValueError:
+            registo = {"_erro": "JSON invalido"}
+        if not isinstance(registo, dict):
+            registo = {"_erro": "Cada linha deve ser um objeto JSON"}
+        yield numero, registo
+
+
+def _data_pagamento(valor):
+    if not valor:
+        return timezone.now()
+    data_hora = parse_datetime(valor)
+    if data_hora is None:
+        data = parse_date(valor)
+        if data is None:
+            raise ValueError
+        data_hora = datetime.combine(data, time.min)
+    if timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    return data_hora
+
+
+def _id(valor):
+    # bool e float com casas decimais passariam por int() sem erro
+    if isinstance(valor, bool) or (isinstance(valor, float) and not valor.is_integer()):
+        raise ValueError
+    numero = int(valor)
+    if not 0 < numero <= ID_MAXIMO:
+        raise ValueError
+    return numero
+
+
+def _valor(valor):
+    if isinstance(valor, bool):
+        raise ValueError
+    valor = Decimal(str(valor or ""))
+    if not valor.is_finite() or valor != valor.quantize(CASAS_DECIMAIS):
+        raise ValueError
+    return valor.quantize(CASAS_DECIMAIS)
+
+
+def validar_registo(registo):
+    """Valida um registo e retorna (Pagamento por gravar, erros)."""
+    erros = {}
+    if "_erro" in registo:
+        return None, {"linha": registo["_erro"]}
+    try:
+        mensalidade_id = _id(registo.get("mensalidade") or "")
+    except (TypeError, ValueError):
+        erros["mensalidade"] = "Id de mensalidade invalido"
+    try:
+        valor = _valor(registo.get("valor"))
+        if valor < CASAS_DECIMAIS:
+            erros["valor"] = "O valor deve ser maior que zero"
+        elif valor >= VALOR_MAXIMO:
+            erros["valor"] = f"O valor deve ser menor que {VALOR_MAXIMO}"
+    except (InvalidOperation, ValueError):
+        erros["valor"] = f"Valor invalido (numero com ate {_VALOR.decimal_places} casas decimais)"
+    try:
+        data_pagamento = _data_pagamento(registo.get("data_pagamento"))
+    except (TypeError, ValueError):
+        erros["data_pagamento"] = "Data invalida"
+    metodo = registo.get("metodo_pagamento") or "DINHEIRO"
+    metodo = metodo.upper() if isinstance(metodo, str) else None
+    if metodo not in METODOS:
+        erros["metodo_pagamento"] = f"Metodo invalido, use {', '.join(sorted(METODOS))}"
+    observacao = registo.get("observacao") or None
+    if observacao is not None and not isinstance(observacao, str):
+        erros["observacao"] = "A observacao deve ser texto"
+    if erros:
+        return None, erros
+    return Pagamento(
+        mensalidade_id=mensalidade_id,
+        valor=valor,
+        data_pagamento=data_pagamento,
+        metodo_pagamento=metodo,
+        observacao=observacao,
+    ), {}
+
+
+def _gravar_lote(lote, resultado):
+    """Valida referencias/duplicados de um lote com 2 queries e insere com registar_pagamentos.
+
+    Corre dentro da transacao do lote: as mensalidades ficam bloqueadas desde a validacao.
+    """
+    ids = {pagamento.mensalidade_id for _, pagamento in lote}
+    existentes = set(bloquear_mensalidades(ids))
+    chaves = set(
+        Pagamento.all_objects.filter(mensalidade_id__in=existentes)
+        .values_list("mensalidade_id", "valor", "data_pagamento")
+    )
+    novos = []
+    for numero, pagamento in lote:
+        chave = (pagamento.mensalidade_id, pagamento.valor, pagamento.data_pagamento)
+        if pagamento.mensalidade_id not in existentes:
+            resultado["erros"].append({"linha": numero, "erros": {"mensalidade": "Mensalidade nao existe"}})
+        elif chave in chaves:
+            resultado["duplicados"] += 1
+            resultado["erros"].append({"linha": numero, "erros": {"linha": "Pagamento duplicado para esta mensalidade"}})
+        else:
+            chaves.add(chave)
+            novos.append(pagamento)
+    resultado["importados"] += len(novos)
+    return registar_pagamentos(novos, recalcular=False)
+
+
+def importar_pagamentos(registos, batch_size=BATCH_SIZE):
+    """Importa os registos (numero_linha, dict) em lotes; cada lote e uma transacao com valor_pago acertado.
+
+    O status das mensalidades afetadas e recalculado uma vez no fim (um UPDATE por bloco de
+    ids), nao a cada lote; se a importacao falhar a meio, atualizar_status_em_lote acerta-o.
+    Retorna {"importados", "duplicados", "erros": [{"linha", "erros"}], "mensalidades_atualizadas"}.
+    """
+    resultado = {"importados": 0, "duplicados": 0, "erros": [], "mensalidades_atualizadas": 0}
+    afetadas = set()
+    for bloco in em_blocos(registos, batch_size):
+        lote = []
+        for numero, registo in bloco:
+            pagamento, erros = validar_registo(registo)
+            if erros:
+                resultado["erros"].append({"linha": numero, "erros": erros})
+            else:
+                lote.append((numero, pagamento))
+        if lote:
+            with transaction.atomic():
+                afetadas |= _gravar_lote(lote, resultado)
+    marcar_mensalidades(afetadas)
+    recalcular_marcadas()
+    resultado["mensalidades_atualizadas"] = len(afetadas)
+    return resultado
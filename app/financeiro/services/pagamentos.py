@@ -0,0 +1,60 @@
+"""Service de lancamento de pagamentos com a mensalidade bloqueada (usado pela API e pelos lotes)"""
+from django.db import transaction
+from financeiro.models import Mensalidade, Pagamento
+from financeiro.services.cache import invalidar
+from financeiro.services.razao import sincronizar
+from financeiro.services.saldos import invalidar_saldos
+from financeiro.services.status import marcar_mensalidades, recalcular_marcadas
+
+
+def bloquear_mensalidades(ids):
+    """SELECT ... FOR UPDATE das mensalidades, sempre por ordem de pk para evitar deadlocks.
+
+    Retorna {pk: aluno_id} das que existem. Tem de ser chamado dentro de uma transacao.
+    """
+    return dict(
+        Mensalidade.objects.select_for_update().filter(pk__in=ids).order_by("pk").values_list("pk", "aluno_id")
+    )
+
+
+def registar_pagamento(mensalidade, valor, **campos):
+    """Insere o pagamento e acerta valor_pago e status da mensalidade numa transacao.
+
+    A linha da mensalidade fica bloqueada ate ao commit: pagamentos simultaneos da mesma
+    mensalidade esperam uns pelos outros e o status nunca e calculado sobre um total antigo.
+    """
+    mensalidade_id = getattr(mensalidade, "pk", mensalidade)
+    with transaction.atomic():
+        mensalidade = Mensalidade.objects.select_for_update().get(pk=mensalidade_id)
+        pagamento = Pagamento(mensalidade=mensalidade, valor=valor, **campos)
+        pagamento.save()
+        # o signal marcou a mensalidade; recalcula ainda com a linha bloqueada
+        recalcular_marcadas()
+        mensalidade.refresh_from_db(fields=["valor_pago", "status", "data_pagamento"])
+    return pagamento
+
+
+def registar_pagamentos(pagamentos, recalcular=True):
+    """Versao em lote: bloqueia as mensalidades, insere com bulk_create e recalcula o status de todas
+    com um unico UPDATE (junto com as outras mensalidades marcadas na transacao).
+
+    Com recalcular=False o status fica por acertar: quem chama em varios lotes (importacao)
+    recalcula as mensalidades devolvidas uma so vez no fim.
+
+    Pagamentos repetidos (unique_pagamento_mensalidade) sao ignorados. Retorna os ids das
+    mensalidades afetadas.
+    """
+    if not pagamentos:
+        return set()
+    with transaction.atomic():
+        alunos = bloquear_mensalidades({pagamento.mensalidade_id for pagamento in pagamentos})
+        Pagamento.objects.bulk_create(pagamentos, ignore_conflicts=True)
+        Mensalidade.objects.filter(pk__in=alunos).recalcular_valor_pago()
+        if recalcular:
+            marcar_mensalidades(alunos)
+            recalcular_marcadas()
+        # bulk_create nao dispara os signals (cache e razao)
+        invalidar("pagamento", "mensalidade")
+        invalidar_saldos(alunos.values())
+        sincronizar("PAGAMENTO", Pagamento.all_objects.filter(mensalidade_id__in=alunos))
+    return set(alunos)
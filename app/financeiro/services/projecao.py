@@ -0,0 +1,104 @@
+"""Service de projecao de recebimentos: divida, multas e receita esperada em datas futuras"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from django.db.models import Count, Q, Sum
+from financeiro.models import Mensalidade
+from financeiro.services.cache import obter_ou_calcular, versao
+
+CACHE_TIMEOUT = 60 * 60
+DIAS_PADRAO = (0, 30, 60, 90)
+MAX_DATAS = 36
+DIAS_POR_PERIODO = 5
+SEM_ROTA = "Sem rota"
+
+
+def versao_dados():
+    """Muda sempre que mensalidades, pagamentos, a escola de um aluno ou as rotas mudam (chave do cache da projecao).
+
+    Usa as versoes do cache versionado (signals e services em lote chamam invalidar), sem
+    consultar as tabelas em cada pedido.
+    """
+    return "-".join(str(versao(entidade)) for entidade in ("mensalidade", "pagamento", "aluno", "rota"))
+
+
+def _baldes(grupo):
+    """Agrega as mensalidades em aberto por grupo e por (vencimento, taxa).
+
+    Cada balde resume todas as mensalidades com as mesmas datas e taxa, por isso a
+    projecao percorre milhares de baldes em vez de centenas de milhares de linhas.
+    """
+    return (
+        Mensalidade.objects.exclude(status="PAGO")
+        .values(*grupo, "data_vencimento", "taxa_atraso")
+        .annotate(
+            total=Sum("valor"),
+            pago=Sum("valor_pago"),
+            # a multa so se aplica a mensalidades sem qualquer pagamento (ver novo_status_mensalidade)
+            total_sem_pagamento=Sum("valor", filter=Q(valor_pago=0)),
+            quantidade=Count("id"),
+        )
+        .order_by()
+    )
+
+
+def _projetar(baldes, datas):
+    """Totais por data para uma lista de baldes."""
+    zero = Decimal("0.00")
+    linhas = []
+    for data in datas:
+        divida = multas = esperado = zero
+        for balde in baldes:
+            aberto = balde["total"] - balde["pago"]
+            if balde["data_vencimento"] < data:
+                periodos = (data - balde["data_vencimento"]).days // DIAS_POR_PERIODO
+                multas += (balde["total_sem_pagamento"] or zero) * balde["taxa_atraso"] * periodos
+            if balde["data_vencimento"] <= data:
+                esperado += aberto
+            divida += aberto
+        multas = multas.quantize(Decimal("0.01"))
+        linhas.append({"data": data, "divida": divida + multas, "multas": multas, "receita_esperada": esperado})
+    return linhas
+
+
+def calcular_projecao(datas):
+    """Projecao geral, por escola (escola_dest) e por rota para cada data de `datas`.
+
+    - divida: valor em aberto mais multas acumuladas ate a data
+    - multas: multa de 5 em 5 dias (taxa_atraso) sobre mensalidades sem pagamento vencidas
+    - receita_esperada: valor em aberto ja vencido ate a data (sem multas)
+    Alunos em varias rotas contam em cada uma delas.
+    """
+    por_escola = defaultdict(list)
+    for balde in _baldes(["aluno__escola_dest"]):
+        por_escola[balde["aluno__escola_dest"]].append(balde)
+    por_rota = defaultdict(list)
+    for balde in _baldes(["aluno__rotas_transporte__id", "aluno__rotas_transporte__nome"]):
+        chave = (balde["aluno__rotas_transporte__id"], balde["aluno__rotas_transporte__nome"] or SEM_ROTA)
+        por_rota[chave].append(balde)
+
+    todos = [balde for baldes in por_escola.values() for balde in baldes]
+    return {
+        "datas": datas,
+        "geral": _projetar(todos, datas),
+        "por_escola": [
+            {"escola": escola, "projecao": _projetar(baldes, datas)}
+            for escola, baldes in sorted(por_escola.items())
+        ],
+        "por_rota": [
+            {"rota_id": rota_id, "rota": nome, "projecao": _projetar(baldes, datas)}
+            for (rota_id, nome), baldes in sorted(por_rota.items(), key=lambda item: item[0][1])
+        ],
+    }
+
+
+def datas_projecao(dias=DIAS_PADRAO, inicio=None):
+    inicio = inicio or date.today()
+    return [inicio + timedelta(days=n) for n in dias]
+
+
+def obter_projecao(datas):
+    """Projecao em cache; a chave inclui a versao dos dados, por isso nunca fica desatualizada."""
+    versao = versao_dados()
+    chave = f"financeiro:projecao:{versao}:{','.join(data.isoformat() for data in datas)}"
+    return dict(obter_ou_calcular(chave, lambda: calcular_projecao(datas), CACHE_TIMEOUT), versao=versao)
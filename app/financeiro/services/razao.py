@@ -0,0 +1,157 @@
+"""Service do razao (partidas dobradas): lancamentos dos movimentos de dinheiro e saldos diarios"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.utils import timezone
+from financeiro.models import Fatura, Lancamento, Pagamento, SaldoDiario, Salario
+
+ZERO = Decimal("0.00")
+# (conta a debito, conta a credito) de um movimento positivo
+PARES = {
+    "PAGAMENTO": ("CAIXA", "RECEITA_MENSALIDADES"),
+    "SALARIO": ("DESPESA_SALARIOS", "CAIXA"),
+    "FATURA": ("CAIXA", "RECEITA_FATURAS"),
+}
+ORIGENS = {
+    "PAGAMENTO": Pagamento.all_objects,
+    "SALARIO": Salario.objects,
+    "FATURA": Fatura.objects,
+}
+CONTAS = [conta for conta, _ in Lancamento.CONTA_CHOICES]
+
+
+def valor_esperado(tipo, objeto):
+    """Quanto o objeto deve ter lancado no razao no estado atual."""
+    if tipo == "PAGAMENTO":
+        return objeto.valor if objeto.ativo else ZERO
+    return objeto.valor if objeto.status == "PAGO" else ZERO
+
+
+def valor_anterior(tipo, objeto):
+    """valor_esperado com os valores carregados da DB (zero para registos novos)."""
+    if tipo == "PAGAMENTO":
+        return objeto.valor_original("valor") if objeto.valor_original("ativo") else ZERO
+    return objeto.valor_original("valor") if objeto.valor_original("status") == "PAGO" else ZERO
+
+
+def data_movimento(objeto):
+    data = objeto.data_pagamento
+    if not data:
+        return timezone.localdate()
+    return timezone.localdate(data) if timezone.is_aware(data) else data.date()
+
+
+def _par(tipo, origem_id, valor, data):
+    debito, credito = PARES[tipo]
+    movimento = uuid.uuid4()
+    return [
+        Lancamento(movimento=movimento, conta=conta, valor=sinal * valor, data=data, origem_tipo=tipo,
+                   origem_id=origem_id, estorno=valor < 0)
+        for conta, sinal in ((debito, 1), (credito, -1))
+    ]
+
+
+def _ajustar_snapshots(linhas):
+    """Soma as linhas novas aos snapshots do proprio dia e seguintes, com um unico UPDATE.
+
+    Cada snapshot recebe o total acumulado das linhas da sua conta com data ate a dele.
+    """
+    por_dia = defaultdict(lambda: ZERO)
+    for linha in linhas:
+        por_dia[linha.conta, linha.data] += linha.valor
+    filtro, casos = Q(), []
+    for conta in {conta for conta, _ in por_dia}:
+        dias = sorted(dia for c, dia in por_dia if c == conta)
+        acumulados, total = [], ZERO
+        for dia in dias:
+            total += por_dia[conta, dia]
+            acumulados.append((dia, total))
+        filtro |= Q(conta=conta, data__gte=dias[0])
+        # o When do dia mais recente primeiro: o Case usa o primeiro que se aplica
+        casos += [When(conta=conta, data__gte=dia, then=Value(total)) for dia, total in reversed(acumulados)]
+    SaldoDiario.objects.filter(filtro).update(
+        saldo=F("saldo") + Case(*casos, default=Value(ZERO), output_field=DecimalField(max_digits=14, decimal_places=2)),
+        calculado_em=timezone.now(),
+    )
+
+
+def lancar(tipo, movimentos):
+    """Grava um par de lancamentos por (origem_id, valor, data), sem consultar o razao.
+
+    Valores negativos sao estornos. Retorna o numero de movimentos lancados.
+    """
+    linhas = [linha for origem_id, valor, data in movimentos if valor for linha in _par(tipo, origem_id, valor, data)]
+    if linhas:
+        Lancamento.objects.bulk_create(linhas)
+        _ajustar_snapshots(linhas)
+    return len(linhas) // 2
+
+
+def lancar_alteracao(tipo, objeto, apagado=False):
+    """Lanca a diferenca entre o estado gravado e o carregado da DB (usado pelos signals).
+
+    O primeiro lancamento usa a data do movimento; estornos e edicoes a data de hoje.
+    """
+    anterior = valor_anterior(tipo, objeto)
+    diferenca = (ZERO if apagado else valor_esperado(tipo, objeto)) - anterior
+    data = timezone.localdate() if anterior else data_movimento(objeto)
+    return lancar(tipo, [(objeto.pk, diferenca, data)])
+
+
+def sincronizar(tipo, objetos):
+    """Acerta o razao com o estado atual dos objetos, consultando o que ja foi lancado (idempotente).
+
+    Usado pelo backfill e pelas operacoes em lote, que nao passam pelos signals.
+    """
+    objetos = list(objetos)
+    ids = [objeto.pk for objeto in objetos]
+    lancado = dict(
+        Lancamento.objects.filter(origem_tipo=tipo, origem_id__in=ids, conta=PARES[tipo][0])
+        .order_by().values("origem_id").annotate(total=Sum("valor")).values_list("origem_id", "total")
+    )
+    hoje = timezone.localdate()
+    return lancar(tipo, [
+        (objeto.pk, valor_esperado(tipo, objeto) - lancado.get(objeto.pk, ZERO),
+         hoje if objeto.pk in lancado else data_movimento(objeto))
+        for objeto in objetos
+    ])
+
+
+def saldo(conta, data=None):
+    """Saldo da conta no fim de `data`: ultimo snapshot ate essa data mais os lancamentos seguintes."""
+    data = data or timezone.localdate()
+    snapshot = SaldoDiario.objects.filter(conta=conta, data__lte=data).order_by("-data").first()
+    cauda = Lancamento.objects.filter(conta=conta, data__lte=data)
+    if snapshot is None:
+        return cauda.saldo()
+    return snapshot.saldo + cauda.filter(data__gt=snapshot.data).saldo()
+
+
+def saldos(data=None):
+    return {conta: saldo(conta, data) for conta in CONTAS}
+
+
+def criar_snapshots(ate=None):
+    """Grava o saldo de cada conta no fim de cada dia com lancamentos, ate `ate` (padrao: ontem).
+
+    Continua a partir do ultimo snapshot de cada conta e grava sempre o dia `ate`, para que
+    um saldo recente so precise dos lancamentos seguintes. Retorna o numero de linhas criadas.
+    """
+    ate = ate or timezone.localdate() - timedelta(days=1)
+    novos = []
+    for conta in CONTAS:
+        ultimo = SaldoDiario.objects.filter(conta=conta, data__lte=ate).order_by("-data").first()
+        atual = ultimo.saldo if ultimo else ZERO
+        dias = Lancamento.objects.filter(conta=conta, data__lte=ate)
+        if ultimo:
+            dias = dias.filter(data__gt=ultimo.data)
+        for dia, total in dias.order_by("data").values("data").annotate(total=Sum("valor")).values_list("data", "total"):
+            atual += total
+            novos.append(SaldoDiario(conta=conta, data=dia, saldo=atual))
+        if not ultimo or ultimo.data < ate:
+            if not novos or (novos[-1].conta, novos[-1].data) != (conta, ate):
+                novos.append(SaldoDiario(conta=conta, data=ate, saldo=atual))
+    SaldoDiario.objects.bulk_create(novos, ignore_conflicts=True)
+    return len(novos)
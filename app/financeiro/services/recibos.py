@@ -0,0 +1,170 @@
+"""Service de geracao de recibos em PDF (mensalidades, salarios e faturas pagas)"""
+import os
+import json
+import time
+import hashlib
+import calendar
+from datetime import date
+from functools import lru_cache
+from string import Template
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db.models import F
+from financeiro.models import Mensalidade, Salario, Fatura
+from financeiro.services.utils import em_blocos
+
+# mudar a versao invalida todos os recibos ja gerados (os caminhos dependem dela)
+VERSAO_TEMPLATE = "1"
+CHUNKSIZE = 50
+
+TEMPLATES = {
+    "mensalidade": [
+        "RECIBO DE MENSALIDADE",
+        "Recibo nr: M-$id",
+        "",
+        "Aluno: $aluno_nome",
+        "Encarregado: $encarregado_nome",
+        "Mes de referencia: $mes_referente",
+        "Valor: $valor MZN",
+        "Valor pago: $valor_pago MZN",
+        "Data de pagamento: $data_pagamento",
+    ],
+    "salario": [
+        "RECIBO DE SALARIO",
+        "Recibo nr: S-$id",
+        "",
+        "Funcionario: $funcionario_nome",
+        "Mes de referencia: $mes_referente",
+        "Valor: $valor MZN",
+        "Data de pagamento: $data_pagamento",
+    ],
+    "fatura": [
+        "RECIBO DE FATURA",
+        "Recibo nr: F-$id",
+        "",
+        "Descricao: $descricao",
+        "Destinatario: $email_destinatario",
+        "Data de emissao: $data_emissao",
+        "Valor: $valor MZN",
+        "Data de pagamento: $data_pagamento",
+    ],
+}
+
+CONSULTAS = {
+    "mensalidade": (Mensalidade, dict(
+        aluno_nome=F("aluno__user__nome"), encarregado_nome=F("aluno__encarregado__user__nome"),
+    ), ("id", "mes_referente", "valor", "valor_pago", "data_pagamento")),
+    "salario": (Salario, dict(funcionario_nome=F("funcionario__nome")), ("id", "mes_referente", "valor", "data_pagamento")),
+    "fatura": (Fatura, {}, ("id", "descricao", "email_destinatario", "data_emissao", "valor", "data_pagamento")),
+}
+
+
+def pasta_recibos():
+    return os.path.join(settings.MEDIA_ROOT, "recibos")
+
+
+@lru_cache(maxsize=None)
+def _template(tipo):
+    """Template compilado uma vez por processo."""
+    return Template("\n".join(TEMPLATES[tipo]))
+
+
+def _escapar(texto):
+    return texto.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def renderizar_pdf(linhas):
+    """PDF de uma pagina A4 com texto simples (Helvetica), sem dependencias externas."""
+    conteudo = ["BT", "/F1 12 Tf", "16 TL", "60 780 Td"]
+    conteudo += [f"({_escapar(linha)}) Tj T*" for linha in linhas]
+    conteudo.append("ET")
+    stream = "\n".join(conteudo).encode("cp1252", "replace")
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+    ]
+    pdf = bytearray(b"%PDF-1.4\n")
+    posicoes = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posicoes.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (numero, objeto)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % posicao for posicao in posicoes)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, xref)
+    return bytes(pdf)
+
+
+def caminho_recibo(tipo, dados):
+    """Caminho enderecado pelo conteudo: os mesmos dados geram sempre o mesmo ficheiro."""
+    chave = json.dumps([VERSAO_TEMPLATE, tipo, dados], sort_keys=True)
+    resumo = hashlib.sha256(chave.encode()).hexdigest()
+    return os.path.join(pasta_recibos(), tipo, resumo[:2], f"{resumo}.pdf")
+
+
+def _gerar(tarefa):
+    """Executado nos processos do pool: nao acede a base de dados."""
+    tipo, dados, caminho = tarefa
+    linhas = _template(tipo).safe_substitute(dados).split("\n")
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, "wb") as arquivo:
+        arquivo.write(renderizar_pdf(linhas))
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def pagos_do_mes(ano, mes):
+    """Querysets dos registos pagos do mes por tipo de recibo."""
+    inicio = date(ano, mes, 1)
+    fim = date(ano, mes, calendar.monthrange(ano, mes)[1])
+    return {
+        "mensalidade": Mensalidade.objects.filter(status="PAGO", mes_referente__range=(inicio, fim)),
+        "salario": Salario.objects.filter(status="PAGO", mes_referente__range=(inicio, fim)),
+        "fatura": Fatura.objects.filter(status="PAGO", data_emissao__range=(inicio, fim)),
+    }
+
+
+def _tarefas(tipo, qs):
+    _, relacoes, campos = CONSULTAS[tipo]
+    for dados in qs.order_by("pk").values(*campos, **relacoes).iterator(chunk_size=2000):
+        dados = {chave: "" if valor is None else str(valor) for chave, valor in dados.items()}
+        yield tipo, dados, caminho_recibo(tipo, dados)
+
+
+def gerar_recibos(querysets, workers=None, chunksize=CHUNKSIZE):
+    """Gera os PDFs em falta num ProcessPoolExecutor e marca recibo_gerado.
+
+    Recibos cujo ficheiro ja existe (mesmo conteudo) sao ignorados. Com workers=1 gera no
+    proprio processo. Retorna contagens, duracao e documentos por segundo.
+    """
+    inicio = time.perf_counter()
+    resultado = {"gerados": 0, "existentes": 0}
+    pendentes, ids = [], {}
+    for tipo, qs in querysets.items():
+        ids[tipo] = []
+        for tarefa in _tarefas(tipo, qs):
+            ids[tipo].append(int(tarefa[1]["id"]))
+            if os.path.exists(tarefa[2]):
+                resultado["existentes"] += 1
+            else:
+                pendentes.append(tarefa)
+
+    if workers == 1 or len(pendentes) <= chunksize:
+        gerados = [_gerar(tarefa) for tarefa in pendentes]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            gerados = list(pool.map(_gerar, pendentes, chunksize=chunksize))
+    resultado["gerados"] = len(gerados)
+
+    for tipo, pks in ids.items():
+        for bloco in em_blocos(pks, 5000):
+            CONSULTAS[tipo][0].objects.filter(pk__in=bloco, recibo_gerado=False).update(recibo_gerado=True)
+
+    resultado["segundos"] = round(time.perf_counter() - inicio, 3)
+    resultado["por_segundo"] = round(resultado["gerados"] / resultado["segundos"], 1) if resultado["segundos"] else 0
+    return resultado
@@ -0,0 +1,99 @@
+"""Service de reenvio dos alertas falhados, em lotes, com limite de envios por segundo"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from financeiro.models import AlertaEnviado, ReenvioAlertas
+from financeiro.services.alertas import assunto
+from financeiro.services.fila import atraso_backoff
+
+BATCH_SIZE = 200
+MAX_TENTATIVAS = 5
+# alertas criados como PENDENTE e nunca enviados (ex: processo interrompido antes do envio)
+PENDENTE_ABANDONADO = timedelta(hours=1)
+
+
+def para_reenvio(agora=None):
+    """Alertas falhados cuja proxima tentativa ja chegou e PENDENTEs abandonados.
+
+    Alertas RETIDO (gerar_alertas --sem-envio) nunca entram. Usa o indice (status, proxima_tentativa).
+    """
+    agora = agora or timezone.now()
+    falhados = Q(status="FALHA NO ENVIO") & (Q(proxima_tentativa__isnull=True) | Q(proxima_tentativa__lte=agora))
+    abandonados = Q(status="PENDENTE", enviado_em__lt=agora - PENDENTE_ABANDONADO)
+    return AlertaEnviado.objects.filter(falhados | abandonados)
+
+
+def criar_reenvio(taxa_por_segundo=10):
+    return ReenvioAlertas.objects.create(taxa_por_segundo=taxa_por_segundo, total=para_reenvio().count())
+
+
+class Limitador:
+    """Espaca as chamadas para nao passar de `taxa` por segundo."""
+
+    def __init__(self, taxa):
+        self.intervalo = 1 / taxa if taxa else 0
+        self.proximo = time.monotonic()
+
+    def esperar(self):
+        agora = time.monotonic()
+        if self.proximo > agora:
+            time.sleep(self.proximo - agora)
+        self.proximo = max(self.proximo, agora) + self.intervalo
+
+
+def _enviar_lote(alertas, limitador):
+    """Envia o lote numa ligacao e atualiza o estado de cada alerta com um bulk_update."""
+    agora = timezone.now()
+    with get_connection() as conexao:
+        for alerta in alertas:
+            limitador.esperar()
+            alerta.tentativas += 1
+            try:
+                EmailMessage(
+                    assunto(alerta), alerta.mensagem, settings.DEFAULT_FROM_EMAIL, [alerta.email], connection=conexao,
+                ).send()
+            except Exception as erro:
+                alerta.ultimo_erro = f"{type(erro).__name__}: {erro}"
+                if alerta.tentativas >= MAX_TENTATIVAS:
+                    alerta.status, alerta.proxima_tentativa = "ESGOTADO", None
+                else:
+                    alerta.proxima_tentativa = agora + atraso_backoff(alerta.tentativas)
+            else:
+                alerta.status, alerta.proxima_tentativa, alerta.ultimo_erro = "ENVIADO", None, ""
+    AlertaEnviado.objects.bulk_update(alertas, ["status", "tentativas", "proxima_tentativa", "ultimo_erro"])
+    return sum(alerta.status == "ENVIADO" for alerta in alertas)
+
+
+def executar_reenvio(reenvio, batch_size=BATCH_SIZE):
+    """Processa os alertas por ordem de pk a partir de `ultimo_alerta`.
+
+    O progresso e gravado depois de cada lote, por isso um job interrompido retoma onde
+    parou. Alertas que voltam a falhar ficam reagendados e nao entram de novo no mesmo job.
+    Cada lote fica bloqueado (FOR UPDATE SKIP LOCKED) ate ao fim do envio: jobs concorrentes
+    saltam esses alertas em vez de os enviarem outra vez.
+    """
+    reenvio.status = "EXECUTANDO"
+    reenvio.save(update_fields=["status", "data_atualizacao"])
+    limitador = Limitador(reenvio.taxa_por_segundo)
+    while True:
+        with transaction.atomic():
+            lote = list(
+                para_reenvio().select_for_update(skip_locked=True)
+                .filter(pk__gt=reenvio.ultimo_alerta).order_by("pk")[:batch_size]
+            )
+            if not lote:
+                break
+            enviados = _enviar_lote(lote, limitador)
+            reenvio.processados += len(lote)
+            reenvio.enviados += enviados
+            reenvio.falhas += len(lote) - enviados
+            reenvio.ultimo_alerta = lote[-1].pk
+            reenvio.save(update_fields=["processados", "enviados", "falhas", "ultimo_alerta", "data_atualizacao"])
+    reenvio.status = "CONCLUIDO"
+    reenvio.concluido_em = timezone.now()
+    reenvio.save(update_fields=["status", "concluido_em", "data_atualizacao"])
+    return reenvio
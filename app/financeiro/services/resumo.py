@@ -0,0 +1,70 @@
+"""Service do resumo financeiro (dashboard)"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from django.db.models import Count, Sum, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura
+from financeiro.services.cache import obter_ou_calcular
+
+CACHE_TIMEOUT = 60
+
+
+def _periodo(campo, inicio, fim):
+    filtro = Q()
+    if inicio:
+        filtro &= Q(**{f"{campo}__gte": inicio})
+    if fim:
+        filtro &= Q(**{f"{campo}__lte": fim})
+    return filtro
+
+
+def _periodo_datetime(campo, inicio, fim):
+    """_periodo para um DateTimeField com datas: [inicio 00:00, dia seguinte a fim 00:00) no fuso atual.
+
+    Ao contrario de `campo__date`, a comparacao direta com a coluna usa o indice.
+    """
+    filtro = Q()
+    if inicio:
+        filtro &= Q(**{f"{campo}__gte": timezone.make_aware(datetime.combine(inicio, time.min))})
+    if fim:
+        filtro &= Q(**{f"{campo}__lt": timezone.make_aware(datetime.combine(fim + timedelta(days=1), time.min))})
+    return filtro
+
+
+def calcular_resumo(inicio=None, fim=None):
+    """Calcula o resumo com uma query por tabela (agregacao condicional)."""
+    hoje = date.today()
+
+    mensalidade = Mensalidade.objects.filter(_periodo("mes_referente", inicio, fim)).aggregate(
+        total=Count("pk"),
+        pagas=Count("pk", filter=Q(status="PAGO")),
+        pendentes=Count("pk", filter=Q(status="PENDENTE", data_vencimento__gte=hoje)),
+        atrasadas=Count("pk", filter=Q(status="ATRASADO") | Q(status="PENDENTE", data_vencimento__lt=hoje)),
+    )
+    pagamento = Pagamento.objects.filter(_periodo_datetime("data_pagamento", inicio, fim)).aggregate(
+        total=Count("pk"),
+        valor_recebido=Coalesce(Sum("valor"), Value(Decimal("0.00"))),
+    )
+    salarios = Salario.objects.filter(_periodo("mes_referente", inicio, fim)).aggregate(
+        total=Count("pk"),
+        pagos=Count("pk", filter=Q(status="PAGO")),
+        pendentes=Count("pk", filter=Q(status="PENDENTE")),
+    )
+    fatura = Fatura.objects.filter(_periodo("data_emissao", inicio, fim)).aggregate(
+        total=Count("pk"),
+        pagas=Count("pk", filter=Q(status="PAGO")),
+        vencidas=Count("pk", filter=Q(data_vencimento__lt=hoje) & ~Q(status="PAGO")),
+    )
+    return {
+        "mensalidade": mensalidade,
+        "pagamento": pagamento,
+        "salarios": salarios,
+        "fatura": fatura,
+    }
+
+
+def obter_resumo(inicio=None, fim=None, timeout=CACHE_TIMEOUT):
+    """Resumo em cache por alguns segundos; apenas um pedido recalcula de cada vez."""
+    chave = f"financeiro:resumo:{inicio or ''}:{fim or ''}"
+    return obter_ou_calcular(chave, lambda: calcular_resumo(inicio, fim), timeout)
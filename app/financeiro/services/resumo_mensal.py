@@ -0,0 +1,114 @@
+"""Service do rollup mensal (ResumoMensal) com atualizacao incremental"""
+from datetime import datetime, time
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Sum, Max, F, Q, Value, CharField, DateField
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, ResumoMensal
+
+# entidade: (queryset agregado, queryset para detetar alteracoes, campo do mes, campo status, campo metodo)
+FONTES = {
+    "MENSALIDADE": (Mensalidade.objects, Mensalidade.objects, "mes_referente", "status", None),
+    "PAGAMENTO": (Pagamento.objects, Pagamento.all_objects, "data_pagamento", None, "metodo_pagamento"),
+    "SALARIO": (Salario.objects, Salario.objects, "mes_referente", "status", None),
+    "FATURA": (Fatura.objects, Fatura.objects, "data_emissao", "status", None),
+}
+
+
+def _mes_seguinte(mes):
+    return mes.replace(year=mes.year + mes.month // 12, month=mes.month % 12 + 1)
+
+
+def _filtro_meses(model, campo, meses):
+    """Q com um intervalo por mes (usa o indice/ordem do campo em vez de truncar cada linha)."""
+    com_hora = model._meta.get_field(campo).get_internal_type() == "DateTimeField"
+    filtro = Q()
+    for mes in meses:
+        inicio, fim = mes, _mes_seguinte(mes)
+        if com_hora:
+            inicio = timezone.make_aware(datetime.combine(inicio, time.min))
+            fim = timezone.make_aware(datetime.combine(fim, time.min))
+        filtro |= Q(**{f"{campo}__gte": inicio, f"{campo}__lt": fim})
+    return filtro
+
+
+def _mes(campo):
+    return TruncMonth(campo, output_field=DateField())
+
+
+def meses_alterados(entidade, desde):
+    """Meses com linhas alteradas (data_atualizacao) desde `desde` e meses marcados como desatualizados."""
+    _, alteracoes, campo, _, _ = FONTES[entidade]
+    return set(
+        alteracoes.filter(data_atualizacao__gte=desde)
+        .annotate(mes=_mes(campo)).order_by().values_list("mes", flat=True).distinct()
+    ) | set(
+        ResumoMensal.objects.filter(entidade=entidade, desatualizado=True).values_list("mes", flat=True).distinct()
+    )
+
+
+def marcar_mes_desatualizado(entidade, data):
+    """Marca o rollup do mes de `data` (ex: o mes antigo de um registo que mudou de mes ou foi apagado).
+
+    A linha alterada so aparece em meses_alterados com o mes novo; sem a marca o antigo ficava por recalcular.
+    """
+    if data is None:
+        return
+    if isinstance(data, datetime):
+        data = timezone.localtime(data).date() if timezone.is_aware(data) else data.date()
+    ResumoMensal.objects.filter(entidade=entidade, mes=data.replace(day=1)).update(desatualizado=True)
+
+
+def recalcular_meses(entidade, meses, calculado_em=None):
+    """Substitui as linhas de ResumoMensal da entidade nos meses indicados (None = todos)."""
+    fonte, _, campo, campo_status, campo_metodo = FONTES[entidade]
+    calculado_em = calculado_em or timezone.now()
+    qs = fonte.all()
+    existentes = ResumoMensal.objects.filter(entidade=entidade)
+    if meses is not None:
+        if not meses:
+            return
+        qs = qs.filter(_filtro_meses(fonte.model, campo, meses))
+        existentes = existentes.filter(mes__in=meses)
+
+    linhas = (
+        qs.annotate(
+            mes=_mes(campo),
+            status_r=F(campo_status) if campo_status else Value("", output_field=CharField()),
+            metodo_r=F(campo_metodo) if campo_metodo else Value("", output_field=CharField()),
+        )
+        .order_by()
+        .values("mes", "status_r", "metodo_r")
+        .annotate(quantidade=Count("pk"), valor_total=Coalesce(Sum("valor"), Value(Decimal("0.00"))))
+    )
+    with transaction.atomic():
+        existentes.delete()
+        ResumoMensal.objects.bulk_create([
+            ResumoMensal(
+                mes=linha["mes"],
+                entidade=entidade,
+                status=linha["status_r"],
+                metodo_pagamento=linha["metodo_r"],
+                quantidade=linha["quantidade"],
+                valor_total=linha["valor_total"],
+                calculado_em=calculado_em,
+            )
+            for linha in linhas
+        ])
+
+
+def atualizar_resumo_mensal(completo=False):
+    """Atualiza o rollup. Incremental por defeito: so os meses alterados desde a ultima execucao.
+
+    Registos que mudam de mes ou sao apagados marcam o mes antigo (signals); operacoes em lote
+    (update/delete de querysets) nao o fazem, por isso use `completo=True` periodicamente.
+    """
+    inicio = timezone.now()
+    desde = None if completo else ResumoMensal.objects.aggregate(ultimo=Max("calculado_em"))["ultimo"]
+    resultado = {}
+    for entidade in FONTES:
+        meses = None if desde is None else meses_alterados(entidade, desde)
+        recalcular_meses(entidade, meses, calculado_em=inicio)
+        resultado[entidade] = "todos" if meses is None else len(meses)
+    return resultado
@@ -0,0 +1,53 @@
+"""Service dos saldos em aberto por aluno e por encarregado, em cache versionado"""
+from datetime import date
+from core.models import Aluno
+from financeiro.services.antiguidade import _somas, em_aberto
+from financeiro.services.cache import em_cache, estatisticas, invalidar
+
+# versao global: muda nas operacoes em lote, que nao disparam signals
+SALDOS = "saldos"
+AGREGADOS = (
+    "mensalidades_total_recebido",
+    "pagamentos_total_pago",
+    "faturas_total_faturado",
+    "faturas_total_recebido",
+    "salarios_total_pago",
+    "saldo_aluno",
+    "saldo_encarregado",
+)
+
+
+def invalidar_saldos(alunos=None, encarregados=()):
+    """Invalida os saldos dos alunos indicados e dos seus encarregados (todos, sem argumentos)."""
+    if alunos is None and not encarregados:
+        invalidar(SALDOS)
+        return
+    alunos = set(alunos or ()) - {None}
+    encarregados = set(encarregados) | set(
+        Aluno.objects.filter(pk__in=alunos).values_list("encarregado_id", flat=True)
+    )
+    invalidar(*[f"aluno:{pk}" for pk in alunos], *[f"encarregado:{pk}" for pk in encarregados - {None}])
+
+
+def saldo_aluno(aluno_id, as_of=None):
+    """Valor em aberto do aluno por faixa de atraso (mesmas somas do relatorio de antiguidade)."""
+    as_of = as_of or date.today()
+    return em_cache(
+        "saldo_aluno", [f"aluno:{aluno_id}", SALDOS],
+        lambda: em_aberto(as_of).filter(aluno_id=aluno_id).aggregate(**_somas()),
+        parametros=[aluno_id, as_of.isoformat()],
+    )
+
+
+def saldo_encarregado(encarregado_id, as_of=None):
+    """Valor em aberto de todos os educandos do encarregado."""
+    as_of = as_of or date.today()
+    return em_cache(
+        "saldo_encarregado", [f"encarregado:{encarregado_id}", SALDOS],
+        lambda: em_aberto(as_of).filter(aluno__encarregado_id=encarregado_id).aggregate(**_somas()),
+        parametros=[encarregado_id, as_of.isoformat()],
+    )
+
+
+def estatisticas_cache():
+    return estatisticas(AGREGADOS)
@@ -0,0 +1,147 @@
+"""Service de atualizacao de status em lote (mensalidades e faturas)"""
+import logging
+from datetime import date
+from django.db import transaction
+from django.db.models import F, Q, Case, When, Value, CharField
+from django.utils import timezone
+from financeiro.models import Mensalidade, Fatura
+from financeiro.services.cache import invalidar
+from financeiro.services.saldos import invalidar_saldos
+from financeiro.services.utils import em_blocos, intervalos_pk
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+
+def novo_status_mensalidade(hoje):
+    """Expressao SQL equivalente a Mensalidade.atualizar_status (requer with_financials)."""
+    return Case(
+        When(total_pago_sql__gte=F("valor_atualizado_sql"), then=Value("PAGO")),
+        When(total_pago_sql__gt=0, then=Value("PAGO PARCIAL")),
+        When(data_vencimento__lt=hoje, then=Value("ATRASADO")),
+        default=Value("PENDENTE"),
+        output_field=CharField(),
+    )
+
+
+def recalcular_status(qs, hoje=None):
+    """UPDATE unico que acerta o status (e data_pagamento) das mensalidades de `qs`."""
+    hoje = hoje or date.today()
+    agora = timezone.now()
+    return (
+        qs.with_financials(as_of=hoje)
+        .annotate(novo_status=novo_status_mensalidade(hoje))
+        .exclude(status=F("novo_status"))
+        .update(
+            status=F("novo_status"),
+            data_pagamento=Case(
+                When(Q(novo_status="PAGO", data_pagamento__isnull=True), then=Value(agora)),
+                default=F("data_pagamento"),
+            ),
+            data_atualizacao=agora,
+        )
+    )
+
+
+def recalcular_mensalidades(ids, hoje=None):
+    """recalcular_status das mensalidades indicadas, em blocos de CHUNK_SIZE ids."""
+    total = 0
+    alunos = set()
+    for bloco in em_blocos(sorted(ids), CHUNK_SIZE):
+        qs = Mensalidade.objects.filter(pk__in=bloco)
+        alteradas = recalcular_status(qs, hoje)
+        if alteradas:
+            total += alteradas
+            alunos.update(qs.values_list("aluno_id", flat=True))
+    if alunos:
+        # o UPDATE nao dispara signals e pode correr depois do commit que ja invalidou o cache
+        invalidar("mensalidade")
+        invalidar_saldos(alunos)
+    return total
+
+
+class _Recalculo:
+    """Callback de on_commit com as mensalidades marcadas na transacao."""
+
+    def __init__(self):
+        self.ids = set()
+        self.executado = False
+
+    def __call__(self):
+        # ja executado por recalcular_marcadas: o commit nao repete o UPDATE
+        if self.executado:
+            return
+        self.executado = True
+        recalcular_mensalidades(self.ids)
+
+
+def _recalculo_pendente():
+    for _, funcao in transaction.get_connection().run_on_commit:
+        if isinstance(funcao, _Recalculo) and not funcao.executado:
+            return funcao
+    return None
+
+
+def marcar_mensalidades(ids):
+    """Adia o recalculo de status das mensalidades para o commit da transacao atual.
+
+    As marcacoes da mesma transacao juntam-se num unico recalculo (um UPDATE por bloco),
+    em vez de um atualizar_status por escrita. Fora de uma transacao recalcula ja.
+    Depois de um rollback parcial (savepoint) algumas podem ser recalculadas sem necessidade.
+    """
+    ids = set(ids) - {None}
+    if not ids:
+        return
+    if not transaction.get_connection().in_atomic_block:
+        recalcular_mensalidades(ids)
+        return
+    pendente = _recalculo_pendente()
+    if pendente is None:
+        pendente = _Recalculo()
+        transaction.on_commit(pendente)
+    pendente.ids |= ids
+
+
+def recalcular_marcadas():
+    """Executa ja o recalculo pendente da transacao, para quem precisa do status antes do commit."""
+    pendente = _recalculo_pendente()
+    if pendente is not None:
+        pendente()
+
+
+def atualizar_mensalidades(hoje=None, chunk_size=CHUNK_SIZE):
+    """Recalcula o status de todas as mensalidades com um UPDATE por intervalo de pk."""
+    total = 0
+    for inicio, fim in intervalos_pk(Mensalidade.objects.all(), chunk_size):
+        alteradas = recalcular_status(Mensalidade.objects.filter(pk__gte=inicio, pk__lt=fim), hoje)
+        logger.info("Mensalidades %s-%s: %s status alterados", inicio, fim - 1, alteradas)
+        total += alteradas
+    if total:
+        invalidar("mensalidade")
+        invalidar_saldos()
+    return total
+
+
+def atualizar_faturas(hoje=None, chunk_size=CHUNK_SIZE):
+    """Marca como ATRASADO as faturas pendentes com vencimento ultrapassado."""
+    hoje = hoje or date.today()
+    agora = timezone.now()
+    total = 0
+    for inicio, fim in intervalos_pk(Fatura.objects.all(), chunk_size):
+        alteradas = Fatura.objects.filter(
+            pk__gte=inicio, pk__lt=fim, status="PENDENTE", data_vencimento__lt=hoje
+        ).update(status="ATRASADO", data_atualizacao=agora)
+        logger.info("Faturas %s-%s: %s marcadas como atrasadas", inicio, fim - 1, alteradas)
+        total += alteradas
+    if total:
+        invalidar("fatura")
+    return total
+
+
+def atualizar_status_em_lote(hoje=None, chunk_size=CHUNK_SIZE):
+    """Executa o motor de status para mensalidades e faturas. Cada UPDATE e uma transacao curta."""
+    return {
+        "mensalidades": atualizar_mensalidades(hoje, chunk_size),
+        "faturas": atualizar_faturas(hoje, chunk_size),
+    }
@@ -0,0 +1,22 @@
+"""Utilitarios partilhados pelos services de processamento em lote"""
+from itertools import islice
+from django.db.models import Min, Max
+
+
+def em_blocos(iteravel, tamanho):
+    """Divide um iteravel em listas de no maximo `tamanho` elementos."""
+    iterador = iter(iteravel)
+    while True:
+        bloco = list(islice(iterador, tamanho))
+        if not bloco:
+            return
+        yield bloco
+
+
+def intervalos_pk(qs, chunk_size):
+    """Gera intervalos [inicio, fim) de pk cobrindo a tabela, para updates curtos."""
+    limites = qs.aggregate(inicio=Min("pk"), fim=Max("pk"))
+    if limites["inicio"] is None:
+        return
+    for inicio in range(limites["inicio"], limites["fim"] + 1, chunk_size):
+        yield inicio, inicio + chunk_size
@@ -1,24 +1,92 @@
-from django.db import models
-from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+"""Invalidacao do cache dos agregados financeiros, lancamentos no razao, recalculo de status e
+marcacao de meses do ResumoMensal
+
+O status das mensalidades afetadas e recalculado uma vez no commit (services.status.marcar_mensalidades).
+
+post_save cobre tambem o soft delete de Pagamento (delete marca ativo=False e grava).
+Operacoes em lote (update/bulk_create) nao disparam signals e tratam disto nos services.
+"""
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
-from financeiro.models import Pagamento
-
-
-@receiver(post_save, sender=Pagamento)
-def atualizar_status_mensalidade(sender, instance, **kwargs):
-    mensalidade = instance.mensalidade
-    total_pago = mensalidade.pagamento_set.filter.filter(ativo=True).aggregate(
-        models.Sum('valor')
-    )['valor__sum'] or 0
-
-    if total_pago >= mensalidade.valor:
-        mensalidade.status = 'PAGO'
-    elif total_pago > 0:
-        mensalidade.status = 'PAGO PARCIAL'
-    elif mensalidade.data_vencimento and mensalidade.data_vencimento < instance.data_pagamento.date():
-        mensalidade.status = "ATRASADO"
-    else:
-        mensalidade.status = "PENDENTE"
-
-    mensalidade.save(update_fields=["status"])
\ No newline at end of file
+from core.models import Aluno
+from financeiro.models import Fatura, Mensalidade, Pagamento, Salario
+from transporte.models import Rota
+from financeiro.services.cache import invalidar
+from financeiro.services.razao import lancar_alteracao
+from financeiro.services.resumo_mensal import FONTES, marcar_mes_desatualizado
+from financeiro.services.saldos import invalidar_saldos
+from financeiro.services.status import marcar_mensalidades
+
+# campos da propria mensalidade de que o status depende (valor_pago muda via Pagamento)
+CAMPOS_STATUS = ("valor", "data_vencimento", "taxa_atraso")
+
+
+def _anteriores(instance, campo):
+    """Valor atual e o carregado da DB (o registo pode ter mudado de aluno/mensalidade)."""
+    return {getattr(instance, f"{campo}_id"), instance.valor_original(campo)} - {None}
+
+
+def _lancar(tipo, instance, **kwargs):
+    """Lanca no razao a alteracao de dinheiro do registo (nada se valor/status/ativo nao mudaram)."""
+    lancar_alteracao(tipo, instance, apagado=kwargs.get("signal") is post_delete)
+
+
+def _resumo(entidade, instance, created=False, **kwargs):
+    """Marca o mes antigo do ResumoMensal quando o registo muda de mes ou e apagado."""
+    campo = FONTES[entidade][2]
+    if kwargs.get("signal") is post_delete or (not created and instance.has_changed(campo)):
+        marcar_mes_desatualizado(entidade, instance.valor_original(campo))
+
+
+@receiver([post_save, post_delete], sender=Pagamento)
+def pagamento_alterado(sender, instance, **kwargs):
+    # Pagamento.save tambem atualiza Mensalidade.valor_pago
+    invalidar("pagamento", "mensalidade")
+    _lancar("PAGAMENTO", instance, **kwargs)
+    _resumo("PAGAMENTO", instance, **kwargs)
+    mensalidades = _anteriores(instance, "mensalidade")
+    invalidar_saldos(Mensalidade.objects.filter(pk__in=mensalidades).values_list("aluno_id", flat=True))
+    marcar_mensalidades(mensalidades)
+
+
+@receiver([post_save, post_delete], sender=Mensalidade)
+def mensalidade_alterada(sender, instance, created=False, **kwargs):
+    invalidar("mensalidade")
+    invalidar_saldos(_anteriores(instance, "aluno"))
+    _resumo("MENSALIDADE", instance, created, **kwargs)
+    if kwargs.get("signal") is post_save and not created and any(map(instance.has_changed, CAMPOS_STATUS)):
+        marcar_mensalidades([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Aluno)
+def aluno_alterado(sender, instance, created=False, **kwargs):
+    if not created and instance.has_changed("encarregado"):
+        invalidar_saldos([instance.pk], _anteriores(instance, "encarregado"))
+    # a projecao agrupa por escola_dest
+    if kwargs.get("signal") is post_delete or (not created and instance.has_changed("escola_dest")):
+        invalidar("aluno")
+
+
+@receiver([post_save, post_delete], sender=Rota)
+def rota_alterada(sender, instance, **kwargs):
+    invalidar("rota")
+
+
+@receiver(m2m_changed, sender=Rota.alunos.through)
+def alunos_da_rota_alterados(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidar("rota")
+
+
+@receiver([post_save, post_delete], sender=Salario)
+def salario_alterado(sender, instance, **kwargs):
+    invalidar("salario")
+    _lancar("SALARIO", instance, **kwargs)
+    _resumo("SALARIO", instance, **kwargs)
+
+
+@receiver([post_save, post_delete], sender=Fatura)
+def fatura_alterada(sender, instance, **kwargs):
+    invalidar("fatura")
+    _lancar("FATURA", instance, **kwargs)
+    _resumo("FATURA", instance, **kwargs)
@@ -0,0 +1,59 @@
+"""Tarefas em background do financeiro (executadas pelo comando run_workers)"""
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db.models import F
+from django.utils.dateparse import parse_date
+from financeiro.models import AlertaEnviado, ReenvioAlertas
+from financeiro.services.alertas import assunto, gerar_alertas_atraso
+from financeiro.services.fila import tarefa
+from financeiro.services.recibos import CONSULTAS, gerar_recibos
+from financeiro.services.reenvio import executar_reenvio
+from financeiro.services.status import recalcular_mensalidades
+
+
+@tarefa(max_tentativas=5)
+def enviar_alerta_email(alerta_id):
+    """Envia o email de um alerta; falhas ficam registadas no alerta e a tarefa e repetida."""
+    alerta = AlertaEnviado.objects.get(pk=alerta_id)
+    try:
+        send_mail(
+            assunto(alerta), alerta.mensagem, settings.DEFAULT_FROM_EMAIL, [alerta.email],
+        )
+    except Exception as erro:
+        AlertaEnviado.objects.filter(pk=alerta_id).update(
+            status="FALHA NO ENVIO", tentativas=F("tentativas") + 1, ultimo_erro=f"{type(erro).__name__}: {erro}"
+        )
+        raise
+    AlertaEnviado.objects.filter(pk=alerta_id).update(status="ENVIADO")
+
+
+@tarefa(max_tentativas=3)
+def gerar_recibo(tipo, pk):
+    """Gera o PDF do recibo de uma mensalidade, salario ou fatura."""
+    modelo = CONSULTAS[tipo][0]
+    gerar_recibos({tipo: modelo.objects.filter(pk=pk)}, workers=1)
+
+
+@tarefa(max_tentativas=3)
+def gerar_recibos_lote(tipo, ids):
+    """Gera os recibos de varios registos do mesmo tipo (ex: folha salarial do mes)."""
+    modelo = CONSULTAS[tipo][0]
+    gerar_recibos({tipo: modelo.objects.filter(pk__in=ids)})
+
+
+@tarefa(max_tentativas=3)
+def recalcular_status_mensalidades(ids):
+    """Recalcula o status das mensalidades indicadas (um UPDATE por bloco)."""
+    recalcular_mensalidades(ids)
+
+
+@tarefa(max_tentativas=3)
+def alertas_atraso(periodo=None):
+    """Gera e envia os alertas de atraso do periodo (AAAA-MM-DD, padrao: mes atual)."""
+    gerar_alertas_atraso(parse_date(periodo) if periodo else None)
+
+
+@tarefa(max_tentativas=10)
+def reenviar_alertas(reenvio_id):
+    """Executa (ou retoma) um job de reenvio de alertas falhados."""
+    executar_reenvio(ReenvioAlertas.objects.get(pk=reenvio_id))
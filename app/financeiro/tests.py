@@ -1,8 +1,76 @@
-from django.test import TestCase
+import os
+import json
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core import mail
+from django.core.management import call_command
+from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from datetime import date, datetime, timedelta
 from decimal import Decimal
-from financeiro.models import Pagamento, Mensalidade, Aluno
+from rest_framework.test import APIClient
+from core.models import User, Encarregado
+from transporte.models import Rota, Veiculo
+from financeiro.models import (
+    Pagamento, Mensalidade, Aluno, Fatura, ResumoMensal, AlertaEnviado, Tarefa, Salario, ReenvioAlertas, ChaveIdempotencia,
+    Lancamento, SaldoDiario,
+)
+from financeiro.services.faturacao import gerar_mensalidades
+from financeiro.services.status import _Recalculo, atualizar_status_em_lote
+from financeiro.services.resumo_mensal import atualizar_resumo_mensal
+from financeiro.services.conciliacao import propor_conciliacao, aplicar_conciliacao
+from financeiro.services.recibos import gerar_recibos, pagos_do_mes
+from financeiro.services.fila import executar, processar_fila, recuperar_presas, renovar_reserva, reservar, tarefa
+from financeiro.tasks import enviar_alerta_email
+from financeiro.services.alertas import gerar_alertas_atraso
+from financeiro.services.reenvio import criar_reenvio, executar_reenvio, para_reenvio
+from financeiro.services.folha import processar_folha
+from financeiro.services.projecao import calcular_projecao, obter_projecao, versao_dados
+from financeiro.services.antiguidade import relatorio_antiguidade
+from financeiro.services.saldos import saldo_aluno, saldo_encarregado, estatisticas_cache
+from financeiro.services.importacao import importar_pagamentos
+from financeiro.services.pagamentos import registar_pagamento
+from financeiro.services.razao import saldo, saldos, criar_snapshots
+from financeiro.services.resumo import calcular_resumo
+from financeiro.services.cache import obter_ou_calcular
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.base import BaseEmailBackend
+
+
+def criar_encarregado(n=0):
+    user = User.objects.create(email=f"encarregado{n}@teste.com", nome=f"Encarregado {n}", role="ENCARREGADO")
+    return Encarregado.objects.create(user=user, telefone="+258840000000", nrBI=f"{n:012d}E")
+
+
+def criar_aluno(encarregado, n=0, mensalidade=Decimal("1000.00")):
+    user = User.objects.create(email=f"aluno{n}@teste.com", nome=f"Aluno {n}", role="ALUNO")
+    return Aluno.objects.create(
+        user=user,
+        encarregado=encarregado,
+        data_nascimento=date(2015, 1, 1),
+        nrBI=f"{n:012d}A",
+        escola_dest="Escola Central",
+        classe="5a",
+        mensalidade=mensalidade,
+    )
+
+
+def criar_mensalidade(aluno, valor=Decimal("1000.00"), vencimento=None, **kwargs):
+    vencimento = vencimento or date.today()
+    return Mensalidade.objects.create(
+        aluno=aluno,
+        valor=valor,
+        mes_referente=kwargs.pop("mes_referente", vencimento.replace(day=1)),
+        data_vencimento=vencimento,
+        data_limite=kwargs.pop("data_limite", vencimento + timedelta(days=5)),
+        **kwargs
+    )
 
 class PagamentoManagerTest(TestCase):
     def setUp(self):
@@ -106,4 +174,1231 @@ class AtualizarStatusMensalidadeSignalsTest(TestCase):
         )
         mensalidade2.atualizar_status()
         mensalidade2.refresh_from_db()
-        self.assertEqual(mensalidade2.status, "PENDENTE")
\ No newline at end of file
+        self.assertEqual(mensalidade2.status, "PENDENTE")
+
+class MensalidadeWithFinancialsTest(TestCase):
+    def setUp(self):
+        self.encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(self.encarregado.user)
+
+    def criar_mensalidades(self, inicio, quantidade):
+        for n in range(inicio, inicio + quantidade):
+            aluno = criar_aluno(self.encarregado, n)
+            mensalidade = criar_mensalidade(aluno, vencimento=date.today() - timedelta(days=12), status="ATRASADO")
+            Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("300.00"))
+
+    def test_anotacoes_iguais_as_properties(self):
+        self.criar_mensalidades(0, 1)
+        mensalidade = Mensalidade.objects.get()
+        anotada = Mensalidade.objects.with_financials().get()
+        self.assertEqual(anotada.total_pago, mensalidade.total_pago)
+        self.assertEqual(anotada.dias_atraso, mensalidade.dias_atraso)
+        self.assertEqual(anotada.valor_atualizado, mensalidade.valor_atualizado)
+        self.assertEqual(anotada.valor_devido, mensalidade.valor_devido)
+        self.assertEqual(anotada.valor_atualizado, Decimal("1200.00"))
+
+    def test_with_financials_as_of(self):
+        self.criar_mensalidades(0, 1)
+        futuro = Mensalidade.objects.with_financials(as_of=date.today() + timedelta(days=3)).get()
+        self.assertEqual(futuro.dias_atraso, 15)
+        self.assertEqual(futuro.valor_atualizado, Decimal("1300.00"))
+        self.assertEqual(futuro.valor_devido, Decimal("1000.00"))
+
+    def test_listagem_numero_de_queries_constante(self):
+        url = reverse("mensalidade-list")
+        self.criar_mensalidades(0, 2)
+        with CaptureQueriesContext(connection) as poucas:
+            self.client.get(url)
+        self.criar_mensalidades(2, 10)
+        with CaptureQueriesContext(connection) as muitas:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 12)
+        self.assertEqual(len(poucas), len(muitas))
+
+
+class GerarMensalidadesTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.alunos = [criar_aluno(encarregado, n, mensalidade=Decimal("1500.00")) for n in range(3)]
+        Aluno.objects.filter(pk=self.alunos[2].pk).update(ativo=False)
+
+    def test_gera_uma_mensalidade_por_aluno_ativo(self):
+        resultado = gerar_mensalidades(2026, 2, dia_vencimento=31, chunk_size=1)
+        self.assertEqual(resultado, {"criadas": 2, "ignoradas": 0, "falhas": 0})
+        mensalidade = Mensalidade.objects.get(aluno=self.alunos[0])
+        self.assertEqual(mensalidade.valor, Decimal("1500.00"))
+        self.assertEqual(mensalidade.data_vencimento, date(2026, 2, 28))
+        self.assertEqual(mensalidade.data_limite, date(2026, 3, 5))
+
+    def test_reexecucao_ignora_existentes(self):
+        criar_mensalidade(self.alunos[0], vencimento=date(2026, 2, 10))
+        out = StringIO()
+        call_command("gerar_mensalidades", ano=2026, mes=2, stdout=out)
+        self.assertIn("Criadas: 1 | Ignoradas: 1 | Falhas: 0", out.getvalue())
+        self.assertEqual(Mensalidade.objects.de_mes(2026, 2).count(), 2)
+
+
+class AtualizarStatusEmLoteTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        hoje = date.today()
+        self.atrasada = criar_mensalidade(criar_aluno(encarregado, 0), vencimento=hoje - timedelta(days=3))
+        self.em_dia = criar_mensalidade(criar_aluno(encarregado, 1), vencimento=hoje + timedelta(days=3))
+        self.parcial = criar_mensalidade(criar_aluno(encarregado, 2), vencimento=hoje - timedelta(days=3))
+        self.paga = criar_mensalidade(criar_aluno(encarregado, 3), vencimento=hoje + timedelta(days=3))
+        Pagamento.objects.create(mensalidade=self.parcial, valor=Decimal("400.00"))
+        Pagamento.objects.create(mensalidade=self.paga, valor=Decimal("1000.00"))
+        self.fatura = Fatura.objects.create(
+            descricao="Combustivel", valor=Decimal("500.00"), data_emissao=hoje - timedelta(days=10),
+            data_vencimento=hoje - timedelta(days=1), email_destinatario="fornecedor@teste.com",
+        )
+
+    def test_atualiza_status_por_intervalos(self):
+        resultado = atualizar_status_em_lote(chunk_size=2)
+        self.assertEqual(resultado, {"mensalidades": 3, "faturas": 1})
+        status = dict(Mensalidade.objects.values_list("pk", "status"))
+        self.assertEqual(status[self.atrasada.pk], "ATRASADO")
+        self.assertEqual(status[self.em_dia.pk], "PENDENTE")
+        self.assertEqual(status[self.parcial.pk], "PAGO PARCIAL")
+        self.assertEqual(status[self.paga.pk], "PAGO")
+        self.assertIsNotNone(Mensalidade.objects.get(pk=self.paga.pk).data_pagamento)
+        self.fatura.refresh_from_db()
+        self.assertEqual(self.fatura.status, "ATRASADO")
+
+    def test_segunda_execucao_nao_altera_nada(self):
+        atualizar_status_em_lote()
+        self.assertEqual(atualizar_status_em_lote(), {"mensalidades": 0, "faturas": 0})
+
+
+class ValorPagoTest(TestCase):
+    def setUp(self):
+        self.mensalidade = criar_mensalidade(criar_aluno(criar_encarregado()))
+
+    def test_pagamentos_atualizam_valor_pago(self):
+        pagamento = Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("300.00"))
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("200.00"), metodo_pagamento="CARTAO")
+        Pagamento.all_objects.create(mensalidade=self.mensalidade, valor=Decimal("50.00"), ativo=False)
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.valor_pago, Decimal("500.00"))
+
+        pagamento.delete()
+        pagamento.delete()
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.valor_pago, Decimal("200.00"))
+        self.assertEqual(Mensalidade.objects.total_recebido(), Decimal("200.00"))
+
+    def test_recalcular_valor_pago_corrige_divergencias(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("300.00"))
+        Mensalidade.objects.update(valor_pago=Decimal("999.00"))
+        out = StringIO()
+        call_command("recalcular_valor_pago", stdout=out)
+        self.assertIn("1 mensalidades corrigidas", out.getvalue())
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.valor_pago, Decimal("300.00"))
+        self.assertFalse(Mensalidade.objects.com_divergencia().exists())
+
+    def test_recalcular_valor_pago_acerta_status(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=self.mensalidade.valor)
+        Mensalidade.objects.update(valor_pago=Decimal("0.00"), status="PENDENTE")
+        criar_mensalidade(self.mensalidade.aluno, mes_referente=date(2020, 1, 1))
+        with CaptureQueriesContext(connection) as ctx:
+            call_command("recalcular_valor_pago", stdout=StringIO())
+        self.mensalidade.refresh_from_db()
+        self.assertEqual((self.mensalidade.valor_pago, self.mensalidade.status), (self.mensalidade.valor, "PAGO"))
+        # so a mensalidade divergente e reescrita
+        atualizacoes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(atualizacoes), 2)
+        self.assertTrue(all(f"IN ({self.mensalidade.pk})" in sql for sql in atualizacoes))
+
+
+class FinanceiroResumoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+        hoje = date.today()
+        paga = criar_mensalidade(criar_aluno(encarregado, 0), vencimento=hoje - timedelta(days=40))
+        criar_mensalidade(criar_aluno(encarregado, 1), vencimento=hoje - timedelta(days=2))
+        criar_mensalidade(criar_aluno(encarregado, 2), vencimento=hoje + timedelta(days=2))
+        Pagamento.objects.create(mensalidade=paga, valor=Decimal("1000.00"))
+        paga.atualizar_status()
+
+    def test_resumo_com_uma_query_por_tabela(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse("resumo-resumo"))
+        self.assertEqual(response.data["mensalidade"], {"total": 3, "pagas": 1, "pendentes": 1, "atrasadas": 1})
+        self.assertEqual(response.data["pagamento"], {"total": 1, "valor_recebido": Decimal("1000.00")})
+        with self.assertNumQueries(0):
+            self.client.get(reverse("resumo-resumo"))
+
+    def test_resumo_filtra_periodo(self):
+        inicio = date.today().replace(day=1)
+        response = self.client.get(reverse("resumo-resumo"), {"inicio": inicio.isoformat()})
+        self.assertEqual(response.data["mensalidade"]["total"], 3 - Mensalidade.objects.filter(mes_referente__lt=inicio).count())
+        response = self.client.get(reverse("resumo-resumo"), {"fim": "2026-02-30"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pagamentos_por_dia_inteiro(self):
+        mensalidade = Mensalidade.objects.exclude(status="PAGO").first()
+        for data_hora in (datetime(2025, 3, 1, 0, 0), datetime(2025, 3, 31, 23, 59), datetime(2025, 4, 1, 0, 0)):
+            Pagamento.objects.create(
+                mensalidade=mensalidade, valor=Decimal("1.00"), data_pagamento=timezone.make_aware(data_hora)
+            )
+        self.assertEqual(calcular_resumo(date(2025, 3, 1), date(2025, 3, 31))["pagamento"]["total"], 2)
+
+    def test_so_quem_tem_o_lock_o_apaga(self):
+        cache.set("resumo-teste:lock", 1)
+        self.assertEqual(obter_ou_calcular("resumo-teste", lambda: 1, 60, lock_timeout=0), 1)
+        self.assertEqual(cache.get("resumo-teste:lock"), 1)
+
+
+class ResumoMensalTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+        self.janeiro = criar_mensalidade(criar_aluno(encarregado, 0), vencimento=date(2025, 1, 10))
+        self.fevereiro = criar_mensalidade(criar_aluno(encarregado, 1), vencimento=date(2026, 2, 10))
+        Pagamento.objects.create(mensalidade=self.janeiro, valor=Decimal("400.00"))
+
+    def test_atualizacao_completa_e_incremental(self):
+        atualizar_resumo_mensal(completo=True)
+        linha = ResumoMensal.objects.get(entidade="MENSALIDADE", mes=date(2026, 2, 1))
+        self.assertEqual((linha.status, linha.quantidade, linha.valor_total), ("PENDENTE", 1, Decimal("1000.00")))
+
+        Mensalidade.objects.filter(pk=self.fevereiro.pk).update(status="PAGO", data_atualizacao=timezone.now())
+        resultado = atualizar_resumo_mensal()
+        self.assertEqual(resultado["MENSALIDADE"], 1)
+        self.assertEqual(resultado["FATURA"], 0)
+        self.assertEqual(ResumoMensal.objects.get(entidade="MENSALIDADE", mes=date(2026, 2, 1)).status, "PAGO")
+        self.assertTrue(ResumoMensal.objects.filter(entidade="MENSALIDADE", mes=date(2025, 1, 1)).exists())
+
+    def test_registo_que_muda_de_mes(self):
+        atualizar_resumo_mensal(completo=True)
+        mes_atual = timezone.localdate().replace(day=1)
+        self.assertTrue(ResumoMensal.objects.filter(entidade="PAGAMENTO", mes=mes_atual).exists())
+        pagamento = Pagamento.objects.get()
+        pagamento.data_pagamento = timezone.make_aware(datetime(2025, 1, 20, 12))
+        pagamento.save()
+        atualizar_resumo_mensal()
+        self.assertFalse(ResumoMensal.objects.filter(entidade="PAGAMENTO", mes=mes_atual).exists())
+        self.assertEqual(ResumoMensal.objects.get(entidade="PAGAMENTO", mes=date(2025, 1, 1)).quantidade, 1)
+
+    def test_endpoint_relatorio_mensal(self):
+        call_command("atualizar_resumo_mensal", "--completo", stdout=StringIO())
+        response = self.client.get(reverse("relatorio-mensal"), {"entidade": "mensalidade", "anos": "2025,2026"})
+        self.assertEqual(len(response.data["resultados"]), 2)
+        self.assertEqual(
+            [(t["ano"], t["quantidade"]) for t in response.data["totais"]],
+            [(2025, 1), (2026, 1)],
+        )
+        response = self.client.get(reverse("relatorio-mensal"), {"entidade": "pagamento"})
+        self.assertEqual(response.data["resultados"][0]["metodo_pagamento"], "DINHEIRO")
+
+
+class ImportarPagamentosTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+        self.mensalidade = criar_mensalidade(criar_aluno(encarregado, 0), vencimento=date.today() + timedelta(days=5))
+        self.outra = criar_mensalidade(criar_aluno(encarregado, 1), vencimento=date.today() + timedelta(days=5))
+
+    def test_importa_csv_com_relatorio_de_erros(self):
+        m, o = self.mensalidade.pk, self.outra.pk
+        conteudo = (
+            "mensalidade,valor,data_pagamento,metodo_pagamento,observacao\n"
+            f"{m},600.00,2026-03-01T10:00:00,TRANSFERENCIA,ref 1\n"
+            f"{m},400.00,2026-03-02,mpesa,\n"
+            f"{o},abc,2026-03-02,DINHEIRO,\n"
+            f"{m},600.00,2026-03-01T10:00:00,TRANSFERENCIA,repetido\n"
+            f"99999,10.00,,DINHEIRO,\n"
+            f"{o},250.00,,CARTAO,\n"
+        ).encode()
+        response = self.client.post(
+            reverse("pagamento-importar"),
+            {"arquivo": SimpleUploadedFile("extrato.csv", conteudo)},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["importados"], 2)
+        self.assertEqual(response.data["duplicados"], 1)
+        self.assertEqual(response.data["mensalidades_atualizadas"], 2)
+        self.assertEqual([erro["linha"] for erro in response.data["erros"]], [3, 4, 5, 6])
+        self.mensalidade.refresh_from_db()
+        self.outra.refresh_from_db()
+        self.assertEqual((self.mensalidade.valor_pago, self.mensalidade.status), (Decimal("600.00"), "PAGO PARCIAL"))
+        self.assertEqual((self.outra.valor_pago, self.outra.status), (Decimal("250.00"), "PAGO PARCIAL"))
+
+    def test_rejeita_tipos_e_valores_fora_das_colunas(self):
+        m = self.mensalidade.pk
+        registos = [
+            {"mensalidade": m, "valor": "10.00", "metodo_pagamento": 5},
+            {"mensalidade": m, "valor": "100000000.00"},
+            {"mensalidade": m, "valor": "10.005"},
+            {"mensalidade": 2 ** 63, "valor": "10.00"},
+            {"mensalidade": True, "valor": "10.00"},
+            {"mensalidade": m, "valor": "10.00", "data_pagamento": 20260301},
+            {"mensalidade": m, "valor": "10.00", "observacao": {"ref": 1}},
+        ]
+        resultado = importar_pagamentos(enumerate(registos, start=1))
+        self.assertEqual(resultado["importados"], 0)
+        self.assertEqual(
+            [list(erro["erros"]) for erro in resultado["erros"]],
+            [
+                ["metodo_pagamento"], ["valor"], ["valor"], ["mensalidade"], ["mensalidade"],
+                ["data_pagamento"], ["observacao"],
+            ],
+        )
+
+    def test_status_recalculado_uma_vez_no_fim(self):
+        registos = [(self.mensalidade.pk, "600.00"), (self.outra.pk, "1000.00"), (self.mensalidade.pk, "400.00")]
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = importar_pagamentos(
+                ((numero, {"mensalidade": pk, "valor": valor}) for numero, (pk, valor) in enumerate(registos, start=1)),
+                batch_size=1,
+            )
+        self.assertEqual((resultado["importados"], resultado["erros"]), (3, []))
+        self.assertEqual(len([q for q in ctx.captured_queries if 'SET "status" = CASE' in q["sql"]]), 1)
+        self.mensalidade.refresh_from_db()
+        self.outra.refresh_from_db()
+        self.assertEqual((self.mensalidade.status, self.outra.status), ("PAGO", "PAGO"))
+
+    def test_csv_com_bom(self):
+        conteudo = f"mensalidade,valor\n{self.mensalidade.pk},1000.00\n".encode("utf-8-sig")
+        response = self.client.post(
+            reverse("pagamento-importar"),
+            {"arquivo": SimpleUploadedFile("extrato.csv", conteudo)},
+            format="multipart",
+        )
+        self.assertEqual((response.data["importados"], response.data["erros"]), (1, []))
+
+    def test_comando_jsonl(self):
+        linhas = [
+            {"mensalidade": self.mensalidade.pk, "valor": "1000.00", "metodo_pagamento": "DINHEIRO"},
+            "nao e json",
+        ]
+        out = StringIO()
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, "pagamentos.jsonl")
+            with open(caminho, "w") as arquivo:
+                arquivo.write("\n".join(json.dumps(linha) if isinstance(linha, dict) else linha for linha in linhas))
+            call_command("importar_pagamentos", caminho, stdout=out)
+        self.assertIn("Importados: 1 | Duplicados: 0 | Erros: 1", out.getvalue())
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.status, "PAGO")
+
+
+class ConciliacaoBancariaTest(TestCase):
+    def setUp(self):
+        vencimento = date.today() + timedelta(days=5)
+        self.encarregado = criar_encarregado(1)
+        self.ana = criar_mensalidade(criar_aluno(self.encarregado, 1), vencimento=vencimento)
+        User.objects.filter(pk=self.ana.aluno.user_id).update(nome="Ana Mabunda")
+        outro = criar_encarregado(2)
+        self.rui = criar_mensalidade(criar_aluno(outro, 2), valor=Decimal("1500.00"), vencimento=vencimento)
+        User.objects.filter(pk=self.rui.aluno.user_id).update(nome="Rui Tembe")
+
+    def test_propoe_e_aplica_correspondencias(self):
+        hoje = date.today().isoformat()
+        extrato = [
+            (2, {"valor": "1000.00", "data": hoje, "referencia": f"TRF BI {self.encarregado.nrBI}"}),
+            (3, {"valor": "1500.00", "data": hoje, "referencia": "Mensalidade Rui Tembe"}),
+            (4, {"valor": "77.00", "data": hoje, "referencia": "desconhecido"}),
+        ]
+        propostas, sem_correspondencia = propor_conciliacao(extrato)
+        self.assertEqual([(p["linha"], p["mensalidade"]) for p in propostas], [(2, self.ana.pk), (3, self.rui.pk)])
+        self.assertEqual([s["linha"] for s in sem_correspondencia], [4])
+
+        resultado = aplicar_conciliacao(propostas)
+        self.assertEqual(resultado["importados"], 2)
+        self.rui.refresh_from_db()
+        self.assertEqual(self.rui.status, "PAGO")
+        self.assertEqual(Pagamento.objects.get(mensalidade=self.rui).metodo_pagamento, "TRANSFERENCIA")
+
+
+class ExportacaoCsvTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+        for n in range(3):
+            mensalidade = criar_mensalidade(criar_aluno(encarregado, n))
+            Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("100.00"))
+
+    def test_exporta_mensalidades_em_streaming(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("mensalidade-exportar"))
+            conteudo = b"".join(response.streaming_content).decode()
+        linhas = conteudo.strip().splitlines()
+        self.assertTrue(response.streaming)
+        self.assertEqual(len(linhas), 4)
+        self.assertTrue(linhas[0].startswith("id,aluno,aluno_bi,escola,encarregado"))
+        self.assertIn("Aluno 0", linhas[1])
+
+    def test_exporta_pagamentos(self):
+        response = self.client.get(reverse("pagamento-exportar"), {"metodo_pagamento": "dinheiro"})
+        linhas = b"".join(response.streaming_content).decode().strip().splitlines()
+        self.assertEqual(len(linhas), 4)
+        self.assertIn("100.00,DINHEIRO", linhas[1])
+
+
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+        for n in range(5):
+            aluno = criar_aluno(encarregado, n)
+            for mes in (1, 2):
+                criar_mensalidade(aluno, vencimento=date(2026, mes, 10), status="ATRASADO")
+
+    def percorrer(self, url, **params):
+        ids, consultas = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url, params)
+            params = {}
+            consultas.append(len(ctx))
+            ids += [item["id"] for item in response.data["results"]]
+            url = response.data["next"]
+        return ids, consultas
+
+    def test_paginas_seguem_ordem_sem_repetir(self):
+        ids, consultas = self.percorrer(reverse("mensalidade-list"), page_size=3)
+        esperado = list(Mensalidade.objects.order_by("-mes_referente", "-id").values_list("id", flat=True))
+        self.assertEqual(ids, esperado)
+        self.assertEqual(len(set(consultas)), 1)
+
+    def test_actions_sao_paginadas(self):
+        ids, _ = self.percorrer(reverse("mensalidade-atrasadas"), page_size=4)
+        self.assertEqual(len(ids), 10)
+        response = self.client.get(reverse("mensalidade-list"), {"cursor": "invalido"})
+        self.assertEqual(response.status_code, 404)
+
+
+class GerarRecibosTest(TestCase):
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(self.pasta.cleanup)
+        encarregado = criar_encarregado()
+        for n in range(3):
+            criar_mensalidade(criar_aluno(encarregado, n), vencimento=date(2026, 3, 10))
+        Mensalidade.objects.update(status="PAGO", data_pagamento=timezone.now())
+
+    def test_gera_pdfs_e_ignora_existentes(self):
+        with override_settings(MEDIA_ROOT=self.pasta.name):
+            resultado = gerar_recibos(pagos_do_mes(2026, 3), workers=2, chunksize=1)
+            self.assertEqual((resultado["gerados"], resultado["existentes"]), (3, 0))
+            self.assertFalse(Mensalidade.objects.filter(recibo_gerado=False).exists())
+            pdfs = [os.path.join(raiz, nome) for raiz, _, nomes in os.walk(self.pasta.name) for nome in nomes]
+            self.assertEqual(len(pdfs), 3)
+            with open(pdfs[0], "rb") as arquivo:
+                self.assertTrue(arquivo.read().startswith(b"%PDF-1.4"))
+
+            saida = StringIO()
+            call_command("gerar_recibos", "--mes", "2026-03", "--workers", "1", stdout=saida)
+            self.assertIn("Gerados: 0 | Ja existentes: 3", saida.getvalue())
+
+
+@tarefa(nome="testes.falha_sempre", max_tentativas=2)
+def falha_sempre():
+    raise RuntimeError("falhou")
+
+
+class FilaTarefasTest(TestCase):
+    def test_delay_grava_e_worker_executa(self):
+        encarregado = criar_encarregado()
+        alerta = AlertaEnviado.objects.create(
+            encarregado=encarregado, tipo="ATRASO", email="enc@teste.com", mensagem="Mensalidade em atraso",
+            status="PENDENTE",
+        )
+        tarefa_db = enviar_alerta_email.delay(alerta.pk)
+        self.assertEqual((tarefa_db.status, tarefa_db.args), ("PENDENTE", [alerta.pk]))
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(processar_fila(), 1)
+        tarefa_db.refresh_from_db()
+        alerta.refresh_from_db()
+        self.assertEqual((tarefa_db.status, tarefa_db.tentativas), ("CONCLUIDA", 1))
+        self.assertIsNotNone(tarefa_db.duracao_ms)
+        self.assertEqual(alerta.status, "ENVIADO")
+        self.assertEqual(mail.outbox[0].to, ["enc@teste.com"])
+
+    def test_backoff_e_dead_letter(self):
+        tarefa_db = falha_sempre.delay()
+        processar_fila()
+        tarefa_db.refresh_from_db()
+        self.assertEqual((tarefa_db.status, tarefa_db.tentativas), ("PENDENTE", 1))
+        self.assertGreater(tarefa_db.executar_em, timezone.now())
+        self.assertIn("RuntimeError", tarefa_db.ultimo_erro)
+
+        # ainda em espera: o worker nao a reserva
+        self.assertEqual(processar_fila(), 0)
+        Tarefa.objects.filter(pk=tarefa_db.pk).update(executar_em=timezone.now())
+        processar_fila()
+        tarefa_db.refresh_from_db()
+        self.assertEqual((tarefa_db.status, tarefa_db.tentativas), ("FALHADA", 2))
+
+    def test_recupera_so_reservas_expiradas(self):
+        viva, morta = falha_sempre.delay(), falha_sempre.delay()
+        reservar("worker-1", limite=2)
+        # a tarefa viva corre ha mais de uma hora mas o worker continua a renovar a reserva
+        Tarefa.objects.update(iniciada_em=timezone.now() - timedelta(hours=1))
+        Tarefa.objects.filter(pk=morta.pk).update(reservada_ate=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(renovar_reserva(Tarefa.objects.get(pk=viva.pk)))
+        self.assertEqual(recuperar_presas(), 1)
+        self.assertEqual(
+            dict(Tarefa.objects.values_list("pk", "status")), {viva.pk: "EXECUTANDO", morta.pk: "PENDENTE"}
+        )
+
+    def test_reserva_perdida_nao_sobrescreve(self):
+        falha_sempre.delay()
+        [lenta] = reservar("worker-1")
+        Tarefa.objects.update(reservada_ate=timezone.now() - timedelta(seconds=1))
+        recuperar_presas()
+        [outra] = reservar("worker-2")
+        with self.assertLogs("financeiro.services.fila", "WARNING") as logs:
+            executar(lenta)
+        self.assertIn("perdeu a reserva", logs.output[-1])
+        outra.refresh_from_db()
+        self.assertEqual((outra.status, outra.worker, outra.tentativas), ("EXECUTANDO", "worker-2", 0))
+
+    def test_salario_pago_enfileira_recibo(self):
+        funcionario = User.objects.create(email="func@teste.com", nome="Funcionario", role="FUNCIONARIO")
+        Salario.objects.create(funcionario=funcionario, valor=Decimal("5000.00"), mes_referente=date(2026, 3, 1), status="PAGO")
+        self.assertEqual(Tarefa.objects.get().nome, "financeiro.tasks.gerar_recibo")
+
+
+class AlertasAtrasoTest(TestCase):
+    def setUp(self):
+        self.encarregados = [criar_encarregado(n) for n in range(3)]
+        vencimento = date.today() - timedelta(days=40)
+        for n, encarregado in enumerate(self.encarregados[:2]):
+            for i in range(2):
+                aluno = criar_aluno(encarregado, n * 10 + i)
+                criar_mensalidade(aluno, vencimento=vencimento, status="ATRASADO")
+                criar_mensalidade(aluno, vencimento=vencimento - timedelta(days=30), status="ATRASADO")
+        criar_mensalidade(criar_aluno(self.encarregados[2], 99), vencimento=date.today() + timedelta(days=5))
+
+    def test_um_alerta_por_encarregado_numa_ligacao(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = gerar_alertas_atraso(batch_size=10)
+        self.assertEqual(resultado, {"alertas": 2, "enviados": 2, "falhas": 0})
+        self.assertLessEqual(len(ctx), 12)
+        self.assertEqual(len(mail.outbox), 2)
+        alerta = AlertaEnviado.objects.get(encarregado=self.encarregados[0])
+        self.assertEqual((alerta.status, alerta.alunos.count()), ("ENVIADO", 2))
+        self.assertEqual(alerta.periodo, date.today().replace(day=1))
+        self.assertEqual(alerta.mensagem.count("Aluno "), 4)
+
+    def test_nao_duplica_no_mesmo_periodo(self):
+        gerar_alertas_atraso()
+        self.assertEqual(gerar_alertas_atraso()["alertas"], 0)
+        self.assertEqual(AlertaEnviado.objects.count(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_sem_envio_fica_fora_do_reenvio(self):
+        self.assertEqual(gerar_alertas_atraso(enviar=False)["alertas"], 2)
+        AlertaEnviado.objects.update(enviado_em=timezone.now() - timedelta(hours=2))
+        self.assertEqual(set(AlertaEnviado.objects.values_list("status", flat=True)), {"RETIDO"})
+        self.assertFalse(para_reenvio().exists())
+
+
+class BackendFalha(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("smtp indisponivel")
+
+
+class ReenvioAlertasTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.alertas = [
+            AlertaEnviado.objects.create(
+                encarregado=encarregado, tipo="OUTRO", email=f"enc{n}@teste.com", mensagem="Aviso",
+                status="FALHA NO ENVIO",
+            )
+            for n in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+
+    def test_endpoint_devolve_job_e_progresso(self):
+        response = self.client.post(reverse("alertaenviado-reprocessar"), {"taxa_por_segundo": 1000})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual((response.data["total"], response.data["processados"]), (5, 0))
+        self.assertNotIn("ids", response.data)
+
+        processar_fila()
+        url = reverse("alertaenviado-progresso-reprocessamento", args=[response.data["id"]])
+        progresso = self.client.get(url).data
+        self.assertEqual((progresso["status"], progresso["enviados"]), ("CONCLUIDO", 5))
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_inclui_pendentes_abandonados(self):
+        encarregado = self.alertas[0].encarregado
+        abandonado, recente = [
+            AlertaEnviado.objects.create(
+                encarregado=encarregado, tipo="ATRASO", email="pendente@teste.com", mensagem="Aviso", status="PENDENTE",
+            )
+            for _ in range(2)
+        ]
+        AlertaEnviado.objects.filter(pk=abandonado.pk).update(enviado_em=timezone.now() - timedelta(hours=2))
+        reenvio = executar_reenvio(criar_reenvio(taxa_por_segundo=1000))
+        self.assertEqual((reenvio.total, reenvio.enviados), (6, 6))
+        self.assertEqual(AlertaEnviado.objects.get(pk=abandonado.pk).status, "ENVIADO")
+        self.assertEqual(AlertaEnviado.objects.get(pk=recente.pk).status, "PENDENTE")
+
+    def test_retoma_apos_interrupcao(self):
+        reenvio = criar_reenvio(taxa_por_segundo=1000)
+        # simula um job que morreu depois do primeiro lote de 2
+        ReenvioAlertas.objects.filter(pk=reenvio.pk).update(
+            status="EXECUTANDO", processados=2, enviados=2, ultimo_alerta=self.alertas[1].pk
+        )
+        AlertaEnviado.objects.filter(pk__in=[a.pk for a in self.alertas[:2]]).update(status="ENVIADO")
+        reenvio = executar_reenvio(ReenvioAlertas.objects.get(pk=reenvio.pk), batch_size=2)
+        self.assertEqual((reenvio.processados, reenvio.enviados), (5, 5))
+        self.assertEqual(len(mail.outbox), 3)
+
+    @override_settings(EMAIL_BACKEND="financeiro.tests.BackendFalha")
+    def test_falha_reagenda_com_backoff(self):
+        reenvio = executar_reenvio(criar_reenvio(taxa_por_segundo=1000))
+        self.assertEqual(reenvio.falhas, 5)
+        alerta = AlertaEnviado.objects.get(pk=self.alertas[0].pk)
+        self.assertEqual((alerta.status, alerta.tentativas), ("FALHA NO ENVIO", 1))
+        self.assertGreater(alerta.proxima_tentativa, timezone.now())
+        self.assertIn("smtp indisponivel", alerta.ultimo_erro)
+
+
+class FolhaSalarialTest(TestCase):
+    def setUp(self):
+        for n, salario in enumerate([Decimal("15000.00"), Decimal("12000.00"), Decimal("9000.00")]):
+            User.objects.create(email=f"motorista{n}@teste.com", nome=f"Motorista {n}", role="MOTORISTA", salario=salario)
+        User.objects.create(email="semsalario@teste.com", nome="Sem Salario", role="MOTORISTA", salario=Decimal("0"))
+        criar_encarregado()
+
+    def test_cria_e_paga_em_lote(self):
+        with CaptureQueriesContext(connection) as ctx:
+            resultado = processar_folha(2026, 3)
+        self.assertLessEqual(len(ctx), 12)
+        self.assertEqual((resultado["criados"], resultado["existentes"], resultado["pagos"]), (3, 0, 3))
+        self.assertEqual(resultado["total_pago"], Decimal("36000.00"))
+        self.assertEqual(resultado["total_pago"], Salario.objects.total_pago())
+        self.assertFalse(Salario.objects.exclude(status="PAGO").exists())
+        tarefa_db = Tarefa.objects.get()
+        self.assertEqual((tarefa_db.nome, len(tarefa_db.args[1])), ("financeiro.tasks.gerar_recibos_lote", 3))
+
+    def test_idempotente_por_mes(self):
+        processar_folha(2026, 3, pagar=False)
+        resultado = processar_folha(2026, 3)
+        self.assertEqual((resultado["criados"], resultado["existentes"], resultado["pagos"]), (0, 3, 3))
+        self.assertEqual(processar_folha(2026, 3)["pagos"], 0)
+        self.assertEqual(Salario.objects.count(), 3)
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+    def test_nao_paga_salarios_manuais(self):
+        manual = Salario.objects.create(
+            funcionario=User.objects.create(email="extra@teste.com", nome="Extra", role="FUNCIONARIO"),
+            valor=Decimal("500.00"), mes_referente=date(2026, 3, 1),
+        )
+        resultado = processar_folha(2026, 3)
+        self.assertEqual(resultado["pagos"], 3)
+        manual.refresh_from_db()
+        self.assertEqual(manual.status, "PENDENTE")
+
+    def test_salario_manual_a_meio_do_mes_conta_como_existente(self):
+        funcionario = User.objects.get(email="motorista0@teste.com")
+        Salario.objects.create(funcionario=funcionario, valor=Decimal("15000.00"), mes_referente=date(2026, 3, 15))
+        resultado = processar_folha(2026, 3)
+        self.assertEqual((resultado["criados"], resultado["existentes"]), (2, 1))
+        self.assertEqual(Salario.objects.filter(funcionario=funcionario).count(), 1)
+
+
+class TransicaoStatusTest(TestCase):
+    def setUp(self):
+        self.fatura = Fatura.objects.create(
+            descricao="Combustivel", valor=Decimal("500.00"), data_emissao=date.today(),
+            data_vencimento=date.today() + timedelta(days=10), email_destinatario="fornecedor@teste.com",
+        )
+        self.fatura = Fatura.objects.get(pk=self.fatura.pk)
+
+    def test_mudanca_para_pago_sem_select_previo(self):
+        self.fatura.status = "PAGO"
+        with CaptureQueriesContext(connection) as ctx:
+            self.fatura.save()
+        self.assertFalse(any(q["sql"].startswith("SELECT") for q in ctx))
+        self.assertEqual(Tarefa.objects.get().args, ["fatura", self.fatura.pk])
+
+        # gravar de novo (sem transicao) nao volta a enfileirar
+        self.fatura.obs = "conferida"
+        self.fatura.save()
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+    def test_pagamento_so_recalcula_quando_valor_muda(self):
+        mensalidade = criar_mensalidade(criar_aluno(criar_encarregado()))
+        pagamento = Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("300.00"))
+        pagamento.observacao = "recibo 12"
+        with CaptureQueriesContext(connection) as ctx:
+            pagamento.save()
+        self.assertEqual(len([q for q in ctx if q["sql"].startswith("UPDATE")]), 1)
+        pagamento.valor = Decimal("400.00")
+        pagamento.save()
+        mensalidade.refresh_from_db()
+        self.assertEqual(mensalidade.valor_pago, Decimal("400.00"))
+
+
+class ProjecaoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        encarregado = criar_encarregado()
+        hoje = date.today()
+        for n in range(4):
+            aluno = criar_aluno(encarregado, n)
+            if n % 2:
+                Aluno.objects.filter(pk=aluno.pk).update(escola_dest="Escola Norte")
+            criar_mensalidade(aluno, vencimento=hoje - timedelta(days=12 + n))
+            criar_mensalidade(aluno, vencimento=hoje + timedelta(days=20), mes_referente=hoje.replace(day=1) + timedelta(days=40))
+        Pagamento.objects.create(mensalidade=Mensalidade.objects.first(), valor=Decimal("250.00"))
+        atualizar_status_em_lote()
+
+    def test_hoje_coincide_com_with_financials(self):
+        hoje = date.today()
+        projecao = calcular_projecao([hoje])
+        esperado = sum(m.valor_devido for m in Mensalidade.objects.exclude(status="PAGO").with_financials(hoje))
+        self.assertEqual(projecao["geral"][0]["divida"], esperado)
+        self.assertEqual(sum(e["projecao"][0]["divida"] for e in projecao["por_escola"]), esperado)
+        self.assertEqual([r["rota"] for r in projecao["por_rota"]], ["Sem rota"])
+
+    def test_endpoint_projeta_datas_futuras(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.first())
+        response = client.get(reverse("projecao-list"), {"dias": "0,30"})
+        self.assertEqual(response.status_code, 200)
+        hoje, futuro = response.data["geral"]
+        self.assertGreater(futuro["multas"], hoje["multas"])
+        self.assertGreater(futuro["receita_esperada"], hoje["receita_esperada"])
+
+        versao = response.data["versao"]
+        # a versao vem do cache versionado: um pedido em cache nao consulta a DB
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(reverse("projecao-list"), {"dias": "0,30"}).data["versao"], versao)
+        Pagamento.objects.create(mensalidade=Mensalidade.objects.last(), valor=Decimal("10.00"))
+        self.assertNotEqual(client.get(reverse("projecao-list"), {"dias": "0,30"}).data["versao"], versao)
+        self.assertEqual(client.get(reverse("projecao-list"), {"dias": "x"}).status_code, 400)
+
+    def test_escola_e_rotas_mudam_a_versao(self):
+        aluno = Aluno.objects.first()
+        versoes = [versao_dados()]
+        aluno.escola_dest = "Escola Sul"
+        aluno.save()
+        versoes.append(versao_dados())
+        veiculo = Veiculo.objects.create(marca="Toyota", modelo="Hiace", matricula="AAA-111-MC", capacidade=15)
+        rota = Rota.objects.create(nome="Rota A", veiculo=veiculo)
+        versoes.append(versao_dados())
+        rota.alunos.add(aluno)
+        versoes.append(versao_dados())
+        self.assertEqual(len(set(versoes)), 4)
+        self.assertIn("Escola Sul", [e["escola"] for e in obter_projecao([date.today()])["por_escola"]])
+        self.assertIn("Rota A", [r["rota"] for r in obter_projecao([date.today()])["por_rota"]])
+
+
+class RelatorioAntiguidadeTest(TestCase):
+    def setUp(self):
+        self.hoje = date(2026, 6, 30)
+        self.encarregados = [criar_encarregado(n) for n in range(2)]
+        alunos = [criar_aluno(self.encarregados[n % 2], n) for n in range(3)]
+        Aluno.objects.filter(pk=alunos[2].pk).update(escola_dest="Escola Norte")
+        for aluno, dias in [(alunos[0], 10), (alunos[0], 45), (alunos[1], 75), (alunos[2], 120)]:
+            criar_mensalidade(aluno, vencimento=self.hoje - timedelta(days=dias), taxa_atraso=Decimal("0"))
+        criar_mensalidade(alunos[1], vencimento=self.hoje - timedelta(days=200), status="PAGO")
+
+    def test_faixas_e_totais(self):
+        with CaptureQueriesContext(connection) as ctx:
+            relatorio = relatorio_antiguidade("encarregado", self.hoje)
+        self.assertEqual(len(ctx), 3)
+        totais = relatorio["totais"]
+        self.assertEqual(
+            [totais[faixa] for faixa in relatorio["faixas"]],
+            [Decimal("1000.00")] * 4,
+        )
+        self.assertEqual((totais["total"], totais["mensalidades"]), (Decimal("4000.00"), 4))
+        primeiro = relatorio["grupos"][0]
+        self.assertEqual((primeiro["grupo_id"], primeiro["total"]), (self.encarregados[0].pk, Decimal("3000.00")))
+        self.assertEqual(relatorio["maiores_devedores"][0]["grupo_id"], self.encarregados[0].pk)
+
+    def test_endpoint_por_escola(self):
+        client = APIClient()
+        client.force_authenticate(self.encarregados[0].user)
+        url = reverse("relatorio-antiguidade")
+        response = client.get(url, {"agrupar_por": "escola", "data": self.hoje.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        grupos = {g["grupo"]: g for g in response.data["grupos"]}
+        self.assertEqual(grupos["Escola Norte"]["90_mais"], Decimal("1000.00"))
+        self.assertEqual(client.get(url, {"agrupar_por": "turma"}).status_code, 400)
+        self.assertEqual(client.get(url, {"limite": "-1"}).status_code, 400)
+
+
+class ExtratoEncarregadoTest(TestCase):
+    def setUp(self):
+        self.encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(self.encarregado.user)
+        self.url = reverse("encarregado-extrato", args=[self.encarregado.pk])
+
+    def criar_alunos(self, inicio, quantidade):
+        for n in range(inicio, inicio + quantidade):
+            aluno = criar_aluno(self.encarregado, n)
+            for mes in (1, 2, 3):
+                mensalidade = criar_mensalidade(aluno, vencimento=date(2026, mes, 10))
+                Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal("400.00"))
+
+    def consultas(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx), response
+
+    def test_numero_fixo_de_queries(self):
+        self.criar_alunos(0, 1)
+        poucos, _ = self.consultas()
+        self.criar_alunos(1, 4)
+        muitos, response = self.consultas()
+        self.assertEqual(poucos, muitos)
+        self.assertEqual(len(response.data["alunos"]), 5)
+        self.assertEqual(response.data["totais"]["pago"], Decimal("6000.00"))
+        self.assertEqual(response.data["movimentos"][-1]["saldo"], response.data["totais"]["devido"])
+
+    def test_etag_devolve_304(self):
+        self.criar_alunos(0, 2)
+        response = self.client.get(self.url)
+        etag = response["ETag"]
+        with CaptureQueriesContext(connection) as ctx:
+            repetido = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repetido.status_code, 304)
+        self.assertLessEqual(len(ctx), 2)
+
+        Pagamento.objects.create(mensalidade=Mensalidade.objects.first(), valor=Decimal("1.00"))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_outro_encarregado_nao_ve(self):
+        outro = APIClient()
+        outro.force_authenticate(criar_encarregado(1).user)
+        self.assertEqual(outro.get(self.url).status_code, 403)
+
+
+class CacheAgregadosTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.encarregado = criar_encarregado()
+            self.aluno = criar_aluno(self.encarregado)
+            self.mensalidade = criar_mensalidade(self.aluno, vencimento=date.today() - timedelta(days=40))
+
+    def pagar(self, valor):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal(valor))
+
+    def assertSemQueries(self, funcao):
+        with CaptureQueriesContext(connection) as ctx:
+            valor = funcao()
+        self.assertEqual(len(ctx), 0)
+        return valor
+
+    def test_totais_invalidados_por_save_e_soft_delete(self):
+        pagamento = self.pagar("300.00")
+        self.assertEqual(Pagamento.objects.total_pago(), Decimal("300.00"))
+        self.assertEqual(self.assertSemQueries(Pagamento.objects.total_pago), Decimal("300.00"))
+        self.pagar("200.00")
+        self.assertEqual(Pagamento.objects.total_pago(), Decimal("500.00"))
+        self.assertEqual(Mensalidade.objects.total_recebido(), Decimal("500.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            pagamento.delete()
+        self.assertEqual(Pagamento.objects.total_pago(), Decimal("200.00"))
+        self.assertEqual(Mensalidade.objects.total_recebido(), Decimal("200.00"))
+        self.assertEqual(estatisticas_cache()["pagamentos_total_pago"], {"hits": 1, "misses": 3})
+
+    def test_saldos_por_aluno_e_encarregado(self):
+        outro = criar_aluno(criar_encarregado(1), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_mensalidade(outro)
+        self.assertEqual(saldo_aluno(self.aluno.pk)["total"], Decimal("1000.00"))
+        self.assertEqual(saldo_encarregado(self.encarregado.pk)["90_mais"], Decimal("0.00"))
+        self.assertSemQueries(lambda: saldo_aluno(self.aluno.pk))
+        saldo_outro = saldo_aluno(outro.pk)
+
+        self.pagar("400.00")
+        self.assertEqual(saldo_aluno(self.aluno.pk)["total"], Decimal("600.00"))
+        self.assertEqual(saldo_encarregado(self.encarregado.pk)["31_60"], Decimal("600.00"))
+        # pagamentos de um aluno nao invalidam os saldos dos outros
+        self.assertEqual(self.assertSemQueries(lambda: saldo_aluno(outro.pk)), saldo_outro)
+
+    def test_escritas_por_confirmar_nao_entram_no_cache(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("100.00"))
+        self.assertEqual(Pagamento.objects.total_pago(), Decimal("100.00"))
+        with CaptureQueriesContext(connection) as ctx:
+            Pagamento.objects.total_pago()
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual(estatisticas_cache()["pagamentos_total_pago"], {"hits": 0, "misses": 0})
+
+    def test_bulk_invalida_saldos(self):
+        self.assertEqual(saldo_aluno(self.aluno.pk)["total"], Decimal("1000.00"))
+        with self.captureOnCommitCallbacks(execute=True):
+            importar_pagamentos([(1, {"mensalidade": self.mensalidade.pk, "valor": "250.00"})])
+        self.assertEqual(saldo_aluno(self.aluno.pk)["total"], Decimal("750.00"))
+
+    def test_backend_em_ficheiro(self):
+        with tempfile.TemporaryDirectory() as pasta, override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": pasta}
+        }):
+            self.pagar("100.00")
+            self.assertEqual(Fatura.objects.total_faturado(), Decimal("0.00"))
+            self.assertEqual(Pagamento.objects.total_pago(), Decimal("100.00"))
+            self.assertSemQueries(Pagamento.objects.total_pago)
+            self.pagar("50.00")
+            self.assertEqual(Pagamento.objects.total_pago(), Decimal("150.00"))
+
+
+class IdempotenciaPagamentosTest(TestCase):
+    def setUp(self):
+        self.encarregado = criar_encarregado()
+        self.client = APIClient()
+        self.client.force_authenticate(self.encarregado.user)
+        self.mensalidade = criar_mensalidade(criar_aluno(self.encarregado), vencimento=date.today() + timedelta(days=5))
+        self.url = reverse("pagamento-list")
+        self.dados = {"mensalidade": self.mensalidade.pk, "valor": "300.00", "data_pagamento": "2026-03-01T10:00:00Z"}
+
+    def post(self, dados, chave="chave-1"):
+        return self.client.post(self.url, dados, format="json", HTTP_IDEMPOTENCY_KEY=chave)
+
+    def test_repeticao_devolve_resposta_guardada(self):
+        primeiro = self.post(self.dados)
+        self.assertEqual(primeiro.status_code, 201)
+        with CaptureQueriesContext(connection) as ctx:
+            repetido = self.post(self.dados)
+        self.assertEqual(repetido.status_code, 201)
+        self.assertEqual(repetido["Idempotent-Replayed"], "true")
+        self.assertEqual(repetido.json(), primeiro.json())
+        self.assertFalse(any("financeiro_pagamento" in query["sql"] for query in ctx.captured_queries))
+        self.assertEqual(Pagamento.objects.count(), 1)
+
+    def test_mesma_chave_com_outro_pedido(self):
+        self.post(self.dados)
+        response = self.post(dict(self.dados, valor="10.00"))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Pagamento.objects.count(), 1)
+
+    def test_erros_nao_ficam_guardados(self):
+        self.assertEqual(self.post(dict(self.dados, valor="0")).status_code, 400)
+        self.assertEqual(self.post(dict(self.dados, valor="0")).status_code, 400)
+        self.assertFalse(ChaveIdempotencia.objects.exists())
+        # sem header, um duplicado e um 400 (constraint da DB) e nao um 500
+        self.client.post(self.url, self.dados, format="json")
+        self.assertEqual(self.client.post(self.url, self.dados, format="json").status_code, 400)
+
+    def test_chave_expirada_e_reutilizada(self):
+        self.post(self.dados)
+        ChaveIdempotencia.objects.update(expira_em=timezone.now() - timedelta(seconds=1))
+        response = self.post(dict(self.dados, valor="50.00"))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Pagamento.objects.count(), 2)
+        call_command("limpar_idempotencia", stdout=StringIO())
+        self.assertEqual(ChaveIdempotencia.objects.count(), 1)
+
+    def test_reserva_em_curso_abandonada(self):
+        # processo morto depois de reservar a chave e antes de gravar o pagamento e a resposta
+        self.post(self.dados)
+        Pagamento.all_objects.all().delete()
+        ChaveIdempotencia.objects.update(status_code=None, resposta=None)
+        self.assertEqual(self.post(self.dados).status_code, 409)
+        ChaveIdempotencia.objects.update(criado_em=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(self.post(self.dados).status_code, 201)
+        self.assertEqual(self.post(self.dados)["Idempotent-Replayed"], "true")
+        self.assertEqual(Pagamento.objects.count(), 1)
+
+    def test_reserva_apagada_antes_de_ser_lida(self):
+        # o pedido que tinha a chave falha e liberta-a entre o INSERT em conflito e o SELECT
+        ChaveIdempotencia.objects.create(
+            utilizador=self.encarregado.user, escopo="pagamentos:create", chave="chave-1",
+            hash_pedido="outro", expira_em=timezone.now() + timedelta(hours=1),
+        )
+        get = ChaveIdempotencia.objects.get
+
+        def libertada(**filtros):
+            ChaveIdempotencia.objects.all().delete()
+            return get(**filtros)
+
+        with mock.patch.object(ChaveIdempotencia.objects, "get", side_effect=libertada):
+            self.assertEqual(self.post(self.dados).status_code, 201)
+        self.assertEqual(ChaveIdempotencia.objects.get().status_code, 201)
+
+    def test_importacao_idempotente(self):
+        conteudo = f"mensalidade,valor\n{self.mensalidade.pk},100.00\n".encode()
+        for _ in range(2):
+            response = self.client.post(
+                reverse("pagamento-importar"),
+                {"arquivo": SimpleUploadedFile("extrato.csv", conteudo)},
+                format="multipart",
+                HTTP_IDEMPOTENCY_KEY="lote-1",
+            )
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.data["importados"], 1)
+        self.assertEqual(Pagamento.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN so e verificado no PostgreSQL")
+class PlanoQueriesManagersTest(TestCase):
+    """Falha se algum metodo dos managers precisar de um Seq Scan ou nao usar o indice criado para ele."""
+
+    # com enable_seqscan=off qualquer indice evita o Seq Scan: confirmar o indice esperado
+    INDICES = {
+        "Mensalidade.de_mes": "mensalidade_mes_idx",
+        "Pagamento.de_periodo": "pagamento_ativo_data_idx",
+        "Fatura.vencidas": "fatura_venc_aberta_idx",
+        "Fatura.pendentes": "fatura_status_venc_idx",
+        "Fatura.pagas": "fatura_status_venc_idx",
+        "Fatura.do_periodo": "fatura_emissao_idx",
+        "AlertaEnviado.falhos": "alerta_falhos_idx",
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        encarregado = criar_encarregado()
+        cls.aluno = criar_aluno(encarregado)
+        alunos = [cls.aluno] + [criar_aluno(encarregado, n) for n in range(1, 20)]
+        hoje = date.today()
+        Mensalidade.objects.bulk_create([
+            Mensalidade(
+                aluno=aluno, valor=Decimal("1000.00"), mes_referente=date(2025, mes, 1),
+                data_vencimento=date(2025, mes, 10), data_limite=date(2025, mes, 15),
+                status=("PAGO", "PENDENTE", "ATRASADO", "PAGO PARCIAL")[mes % 4],
+            )
+            for aluno in alunos for mes in range(1, 13)
+        ])
+        Pagamento.objects.bulk_create([
+            Pagamento(mensalidade=mensalidade, valor=Decimal("100.00"), ativo=mensalidade.pk % 5 != 0)
+            for mensalidade in Mensalidade.objects.all()
+        ])
+        Fatura.objects.bulk_create([
+            Fatura(
+                descricao=f"Fatura {n}", valor=Decimal("50.00"), email_destinatario="f@teste.com",
+                data_emissao=hoje - timedelta(days=n), data_vencimento=hoje + timedelta(days=30 - n),
+                status=("PAGO", "PENDENTE", "ATRASADO")[n % 3],
+            )
+            for n in range(300)
+        ])
+        AlertaEnviado.objects.bulk_create([
+            AlertaEnviado(
+                encarregado=encarregado, email="e@teste.com", mensagem="m",
+                status=("ENVIADO", "FALHA NO ENVIO", "PENDENTE")[n % 3],
+            )
+            for n in range(300)
+        ])
+
+    def consultas(self):
+        hoje = date.today()
+        return {
+            "Mensalidade.atrasadas": Mensalidade.objects.atrasadas(),
+            "Mensalidade.pendentes": Mensalidade.objects.pendentes(),
+            "Mensalidade.pagas": Mensalidade.objects.pagas(),
+            "Mensalidade.parciais": Mensalidade.objects.parciais(),
+            "Mensalidade.de_mes": Mensalidade.objects.de_mes(2025, 3),
+            "Mensalidade.do_aluno": Mensalidade.objects.do_aluno(self.aluno),
+            "Pagamento.de_periodo": Pagamento.objects.de_periodo(timezone.now() - timedelta(days=7), timezone.now()),
+            "Pagamento.do_aluno": Pagamento.objects.do_aluno(self.aluno),
+            "Fatura.vencidas": Fatura.objects.vencidas(),
+            "Fatura.pendentes": Fatura.objects.pendentes(),
+            "Fatura.pagas": Fatura.objects.pagas(),
+            "Fatura.do_periodo": Fatura.objects.do_periodo(hoje - timedelta(days=30), hoje),
+            "AlertaEnviado.falhos": AlertaEnviado.objects.falhos(),
+            "AlertaEnviado.enviados": AlertaEnviado.objects.enviados(),
+            "AlertaEnviado.pendentes": AlertaEnviado.objects.pendentes(),
+        }
+
+    def test_sem_seq_scan(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            cursor.execute("SET LOCAL enable_seqscan = off")
+        for nome, qs in self.consultas().items():
+            with self.subTest(nome):
+                plano = qs.explain()
+                self.assertNotIn("Seq Scan", plano, f"{nome} sem indice:\n{plano}")
+                if nome in self.INDICES:
+                    self.assertIn(self.INDICES[nome], plano, f"{nome} nao usa {self.INDICES[nome]}:\n{plano}")
+
+
+class RegistarPagamentoTest(TestCase):
+    def setUp(self):
+        encarregado = criar_encarregado()
+        self.mensalidade = criar_mensalidade(criar_aluno(encarregado), vencimento=date.today() + timedelta(days=5))
+        self.client = APIClient()
+        self.client.force_authenticate(encarregado.user)
+
+    def test_valor_pago_e_status_na_mesma_transacao(self):
+        registar_pagamento(self.mensalidade.pk, Decimal("400.00"))
+        self.mensalidade.refresh_from_db()
+        self.assertEqual((self.mensalidade.valor_pago, self.mensalidade.status), (Decimal("400.00"), "PAGO PARCIAL"))
+        pagamento = registar_pagamento(self.mensalidade, Decimal("600.00"), metodo_pagamento="CARTAO")
+        self.assertEqual(pagamento.mensalidade.status, "PAGO")
+        self.assertIsNotNone(pagamento.mensalidade.data_pagamento)
+
+    def test_api_usa_o_service(self):
+        response = self.client.post(
+            reverse("pagamento-list"), {"mensalidade": self.mensalidade.pk, "valor": "1000.00"}, format="json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["mensalidade_status"], "PAGO")
+        self.mensalidade.refresh_from_db()
+        self.assertEqual(self.mensalidade.valor_pago, Decimal("1000.00"))
+
+
+class RecalculoNoCommitTest(TestCase):
+    def setUp(self):
+        aluno = criar_aluno(criar_encarregado())
+        futuro = date.today() + timedelta(days=5)
+        self.mensalidades = [criar_mensalidade(aluno, vencimento=futuro, mes_referente=date(2024, mes, 1)) for mes in (1, 2)]
+
+    def test_um_recalculo_por_transacao(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for mensalidade in self.mensalidades:
+                for valor in ("300.00", "700.00"):
+                    Pagamento.objects.create(mensalidade=mensalidade, valor=Decimal(valor))
+        self.assertEqual(Mensalidade.objects.filter(status="PAGO").count(), 0)
+        recalculos = [callback for callback in callbacks if isinstance(callback, _Recalculo)]
+        self.assertEqual(len(recalculos), 1)
+        self.assertEqual(recalculos[0].ids, {m.pk for m in self.mensalidades})
+        with CaptureQueriesContext(connection) as queries:
+            recalculos[0]()
+        self.assertEqual(sum(q["sql"].startswith("UPDATE") for q in queries.captured_queries), 1)
+        self.assertEqual(Mensalidade.objects.filter(status="PAGO").count(), 2)
+
+    def _recalculos(self, queries):
+        return [q["sql"] for q in queries.captured_queries if 'SET "status" = CASE' in q["sql"]]
+
+    def test_flush_antecipado_nao_repete_no_commit(self):
+        mensalidade = self.mensalidades[0]
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                registar_pagamento(mensalidade, Decimal("1000.00"))
+        self.assertEqual(len(self._recalculos(queries)), 1)
+        self.assertEqual(Mensalidade.objects.get(pk=mensalidade.pk).status, "PAGO")
+
+    def test_patch_recalcula_uma_vez(self):
+        mensalidade = self.mensalidades[0]
+        client = APIClient()
+        client.force_authenticate(mensalidade.aluno.encarregado.user)
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(
+                    reverse("mensalidade-detail", args=[mensalidade.pk]),
+                    {"data_vencimento": (date.today() - timedelta(days=1)).isoformat()}, format="json",
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "ATRASADO")
+        self.assertEqual(len(self._recalculos(queries)), 1)
+
+    def test_edicao_da_mensalidade_recalcula_no_commit(self):
+        mensalidade = self.mensalidades[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            mensalidade.data_vencimento = date.today() - timedelta(days=1)
+            mensalidade.save()
+            self.assertEqual(Mensalidade.objects.get(pk=mensalidade.pk).status, "PENDENTE")
+        self.assertEqual(Mensalidade.objects.get(pk=mensalidade.pk).status, "ATRASADO")
+
+
+@skipUnless(connection.vendor == "postgresql", "escritas concorrentes so no PostgreSQL")
+class PagamentosConcorrentesTest(TransactionTestCase):
+    def test_totais_consistentes(self):
+        out = StringIO()
+        call_command("benchmark_pagamentos", escritores=50, pagamentos=4, mensalidades=5, stdout=out)
+        self.assertIn("Totais consistentes!", out.getvalue())
+
+
+class RazaoTest(TestCase):
+    def setUp(self):
+        self.mensalidade = criar_mensalidade(criar_aluno(criar_encarregado()))
+
+    def test_pagamento_e_estorno(self):
+        pagamento = Pagamento.objects.create(
+            mensalidade=self.mensalidade, valor=Decimal("300.00"), data_pagamento=timezone.now() - timedelta(days=3)
+        )
+        lancamentos = list(Lancamento.objects.filter(origem_tipo="PAGAMENTO", origem_id=pagamento.pk))
+        self.assertEqual(len(lancamentos), 2)
+        self.assertEqual(sum(lancamento.valor for lancamento in lancamentos), 0)
+        self.assertEqual(lancamentos[0].data, timezone.localdate() - timedelta(days=3))
+        self.assertEqual(saldo("CAIXA"), Decimal("300.00"))
+        self.assertEqual(saldo("RECEITA_MENSALIDADES"), Decimal("-300.00"))
+
+        pagamento.observacao = "sem efeito no razao"
+        pagamento.save()
+        self.assertEqual(Lancamento.objects.count(), 2)
+        pagamento.delete()
+        self.assertEqual(saldo("CAIXA"), Decimal("0.00"))
+        self.assertEqual(saldo("CAIXA", timezone.localdate() - timedelta(days=1)), Decimal("300.00"))
+        self.assertEqual(Lancamento.objects.filter(estorno=True).count(), 2)
+
+    def test_lancamentos_imutaveis(self):
+        Pagamento.objects.create(mensalidade=self.mensalidade, valor=Decimal("100.00"))
+        lancamento = Lancamento.objects.first()
+        lancamento.valor = Decimal("1.00")
+        with self.assertRaises(ValidationError):
+            lancamento.save()
+        with self.assertRaises(ValidationError):
+            Lancamento.objects.all().delete()
+
+    def test_salarios_e_faturas(self):
+        User.objects.create(email="motorista@teste.com", nome="Motorista", role="MOTORISTA", salario=Decimal("900.00"))
+        processar_folha(2026, 3)
+        fatura = Fatura.objects.create(
+            descricao="Aluguer", valor=Decimal("250.00"), data_vencimento=date.today(), email_destinatario="c@teste.com",
+        )
+        self.assertEqual(saldo("CAIXA"), Decimal("-900.00"))
+        fatura.status = "PAGO"
+        fatura.save()
+        self.assertEqual(saldos()["CAIXA"], Decimal("-650.00"))
+        self.assertEqual(saldos()["DESPESA_SALARIOS"], Decimal("900.00"))
+
+    def test_backfill_e_snapshots(self):
+        hoje = timezone.localdate()
+        Pagamento.objects.bulk_create([
+            Pagamento(
+                mensalidade=self.mensalidade, valor=Decimal("100.00"), data_pagamento=timezone.now() - timedelta(days=n)
+            )
+            for n in (1, 5, 10)
+        ])
+        out = StringIO()
+        call_command("backfill_razao", stdout=out)
+        self.assertIn("PAGAMENTO: 3 movimentos lancados", out.getvalue())
+        call_command("backfill_razao", stdout=out)
+        self.assertIn("PAGAMENTO: 0 movimentos lancados", out.getvalue())
+        self.assertEqual(Lancamento.objects.count(), 6)
+
+        self.assertTrue(SaldoDiario.objects.filter(conta="CAIXA", data=hoje - timedelta(days=1)).exists())
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(saldo("CAIXA", hoje - timedelta(days=3)), Decimal("200.00"))
+        self.assertEqual(len(ctx), 2)
+        # um pagamento com data antiga soma-se aos snapshots seguintes, sem os apagar
+        snapshots = SaldoDiario.objects.count()
+        Pagamento.objects.create(
+            mensalidade=self.mensalidade, valor=Decimal("50.00"), data_pagamento=timezone.now() - timedelta(days=7)
+        )
+        self.assertEqual(SaldoDiario.objects.count(), snapshots)
+        self.assertEqual(SaldoDiario.objects.get(conta="CAIXA", data=hoje - timedelta(days=1)).saldo, Decimal("350.00"))
+        self.assertEqual(SaldoDiario.objects.get(conta="CAIXA", data=hoje - timedelta(days=10)).saldo, Decimal("100.00"))
+        self.assertEqual(saldo("CAIXA", hoje - timedelta(days=3)), Decimal("250.00"))
+        self.assertEqual(saldo("RECEITA_MENSALIDADES", hoje - timedelta(days=3)), Decimal("-250.00"))
+        # lancamentos em lote de varios dias: cada snapshot recebe so os de datas ate a dele
+        Pagamento.objects.bulk_create([
+            Pagamento(
+                mensalidade=self.mensalidade, valor=Decimal(valor), data_pagamento=timezone.now() - timedelta(days=n)
+            )
+            for n, valor in ((8, "20.00"), (2, "5.00"))
+        ])
+        call_command("backfill_razao", stdout=out)
+        for snapshot in SaldoDiario.objects.all():
+            self.assertEqual(
+                snapshot.saldo, Lancamento.objects.filter(conta=snapshot.conta, data__lte=snapshot.data).saldo()
+            )
+        criar_snapshots()
+        self.assertEqual(SaldoDiario.objects.get(conta="CAIXA", data=hoje - timedelta(days=1)).saldo, Decimal("375.00"))
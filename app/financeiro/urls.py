@@ -6,7 +6,10 @@ from financeiro.views import (
     SalarioViewSet,
     FaturaViewSet,
     AlertaEnviadoViewSet,
-    # FinceiroResumoViewSet,
+    FinanceiroResumoViewSet,
+    ExtratoEncarregadoViewSet,
+    ProjecaoViewSet,
+    RelatorioViewSet,
 )
 
 router = DefaultRouter()
@@ -15,7 +18,10 @@ router.register(r"pagamentos", PagamentoViewSet)
 router.register(r"salarios", SalarioViewSet)
 router.register(r"faturas", FaturaViewSet)
 router.register(r"alertas", AlertaEnviadoViewSet)
-# router.register(r"resumo", FinceiroResumoViewSet)
+router.register(r"encarregados", ExtratoEncarregadoViewSet, basename="encarregado")
+router.register(r"resumo", FinanceiroResumoViewSet, basename="resumo")
+router.register(r"projecao", ProjecaoViewSet, basename="projecao")
+router.register(r"relatorios", RelatorioViewSet, basename="relatorio")
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,164 +1,339 @@
 # financeiro/views.py
+import codecs
 from rest_framework.decorators import action
-from rest_framework import viewsets, permissions, decorators
+from rest_framework import viewsets, permissions, decorators, status
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from financeiro.tasks import enviar_alerta_email
-from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado
+from rest_framework.exceptions import ValidationError
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import parse_etags, quote_etag
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractYear
+from core.models import Encarregado
+from core.permissions import IsOwnerOrAdmin
+from financeiro.models import Mensalidade, Pagamento, Salario, Fatura, AlertaEnviado, ResumoMensal, ReenvioAlertas
 from financeiro.serializers import (
     MensalidadeSerializer,
     PagamentoSerializer,
     SalarioSerializer,
     FaturaSerializer,
     AlertaEnviadoSerializer,
+    ReenvioAlertasSerializer,
+    ResumoMensalSerializer,
 )
+from financeiro.pagination import (
+    MensalidadePagination,
+    PagamentoPagination,
+    SalarioPagination,
+    FaturaPagination,
+    AlertaEnviadoPagination,
+)
+from financeiro.services.resumo import obter_resumo
+from financeiro.services.saldos import estatisticas_cache
+from financeiro.services.importacao import importar_pagamentos, ler_linhas
+from financeiro.services.idempotencia import idempotente
+from financeiro.services.pagamentos import registar_pagamento
+from financeiro.services.razao import saldos
+from financeiro.services.status import marcar_mensalidades, recalcular_marcadas
+from financeiro.services.exportacao import exportar_mensalidades, exportar_pagamentos
+from financeiro.services.reenvio import criar_reenvio
+from financeiro.services.antiguidade import relatorio_antiguidade, AGRUPAMENTOS
+from financeiro.services.extrato import montar_extrato, versao_extrato
+from financeiro.services.projecao import obter_projecao, datas_projecao, DIAS_PADRAO, MAX_DATAS
+from financeiro.tasks import reenviar_alertas
+
+
+class ListagemPaginadaMixin:
+    """Aplica a paginacao do viewset tambem as actions de listagem."""
 
+    def listar(self, qs):
+        pagina = self.paginate_queryset(qs)
+        serializer = self.get_serializer(pagina, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class MensalidadeViewSet(viewsets.ModelViewSet):
+
+class MensalidadeViewSet(ListagemPaginadaMixin, viewsets.ModelViewSet):
     queryset = Mensalidade.objects.all()
     serializer_class = MensalidadeSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MensalidadePagination
+
+    @staticmethod
+    def com_financeiros(qs):
+        """Valores financeiros anotados em SQL + relacoes usadas pelo serializer, sem N+1."""
+        return qs.with_financials().select_related("aluno__user").prefetch_related("pagamentos")
+
+    def get_queryset(self):
+        return self.com_financeiros(Mensalidade.objects.all())
 
     def perform_update(self, serializer):
-        instance = serializer.save()
-        instance.atualizar_status()
+        # save e marcacao na mesma transacao: um unico recalculo, ja para a resposta levar o status
+        with transaction.atomic():
+            instance = serializer.save()
+            marcar_mensalidades([instance.pk])
+            recalcular_marcadas()
+        serializer.instance = self.get_queryset().get(pk=instance.pk)
 
     @decorators.action(detail=False, methods=["get"])
     def pendentes(self, request):
-        qs = Mensalidade.objects.pendentes()
-        return Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.com_financeiros(Mensalidade.objects.pendentes())
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def atrasadas(self, request):
-        qs = Mensalidade.objects.atrasadas()
-        return Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.com_financeiros(Mensalidade.objects.atrasadas())
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def pagas(self, request):
-        qs = Mensalidade.objects.pagas()
-        return Response(MensalidadeSerializer(qs, many=True).data)
+        qs = self.com_financeiros(Mensalidade.objects.pagas())
+        return self.listar(qs)
+
+    @decorators.action(detail=False, methods=["get"])
+    def exportar(self, request):
+        """CSV em streaming de todas as mensalidades (?status= opcional)."""
+        qs = Mensalidade.objects.all()
+        if request.query_params.get("status"):
+            qs = qs.filter(status=request.query_params["status"].upper())
+        return exportar_mensalidades(qs)
 
 
 class PagamentoViewSet(viewsets.ModelViewSet):
-    queryset = Pagamento.objects.all()
+    queryset = Pagamento.objects.select_related("mensalidade")
     serializer_class = PagamentoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PagamentoPagination
+
+    def create(self, request, *args, **kwargs):
+        """Aceita o header Idempotency-Key: repetir o POST devolve a resposta original."""
+        return idempotente(request, "pagamentos:create", lambda: super(PagamentoViewSet, self).create(request, *args, **kwargs))
 
     def perform_create(self, serializer):
-        pagamento = serializer.save()
-        pagamento.mensalidade.atualizar_status()
+        # duplicados sao detetados pela constraint unique_pagamento_mensalidade, sem SELECT previo
+        try:
+            serializer.instance = registar_pagamento(**serializer.validated_data)
+        except IntegrityError:
+            raise ValidationError({"detail": "Pagamento duplicado para esta mensalidade"})
 
+    @decorators.action(detail=False, methods=["get"])
+    def exportar(self, request):
+        """CSV em streaming dos pagamentos ativos (?metodo_pagamento= opcional)."""
+        qs = Pagamento.objects.all()
+        if request.query_params.get("metodo_pagamento"):
+            qs = Pagamento.objects.por_metodo(request.query_params["metodo_pagamento"])
+        return exportar_pagamentos(qs)
+
+    @decorators.action(detail=False, methods=["post"], parser_classes=[MultiPartParser])
+    def importar(self, request):
+        """Importa um ficheiro CSV ou JSON lines (campo `arquivo`) com muitos pagamentos (aceita Idempotency-Key)."""
+        arquivo = request.FILES.get("arquivo")
+        if not arquivo:
+            raise ValidationError({"arquivo": "Envie o ficheiro no campo 'arquivo'."})
+        formato = request.data.get("formato") or ("jsonl" if arquivo.name.endswith((".jsonl", ".json")) else "csv")
+        if formato not in ("csv", "jsonl"):
+            raise ValidationError({"formato": "Use csv ou jsonl."})
+
+        def importar():
+            resultado = importar_pagamentos(ler_linhas(codecs.iterdecode(arquivo, "utf-8-sig"), formato))
+            return Response(resultado, status=status.HTTP_201_CREATED if resultado["importados"] else status.HTTP_200_OK)
+
+        return idempotente(request, "pagamentos:importar", importar)
 
-class SalarioViewSet(viewsets.ModelViewSet):
-    queryset = Salario.objects.all()
+
+class SalarioViewSet(ListagemPaginadaMixin, viewsets.ModelViewSet):
+    queryset = Salario.objects.select_related("funcionario")
     serializer_class = SalarioSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SalarioPagination
 
     @decorators.action(detail=False, methods=["get"])
     def pagos(self, request):
-        qs = Salario.objects.pagos()
-        return Response(SalarioSerializer(qs, many=True).data)
+        qs = Salario.objects.pagos().select_related("funcionario")
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def pendentes(self, request):
-        qs = Salario.objects.pendentes()
-        return Response(SalarioSerializer(qs, many=True).data)
+        qs = Salario.objects.pendentes().select_related("funcionario")
+        return self.listar(qs)
 
 
-class FaturaViewSet(viewsets.ModelViewSet):
+class FaturaViewSet(ListagemPaginadaMixin, viewsets.ModelViewSet):
     queryset = Fatura.objects.all()
     serializer_class = FaturaSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FaturaPagination
 
     @decorators.action(detail=False, methods=["get"])
     def vencidas(self, request):
         qs = Fatura.objects.vencidas()
-        return Response(FaturaSerializer(qs, many=True).data)
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def pagas(self, request):
         qs = Fatura.objects.pagas()
-        return Response(FaturaSerializer(qs, many=True).data)
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def pendentes(self, request):
         qs = Fatura.objects.pendentes()
-        return Response(FaturaSerializer(qs, many=True).data)
+        return self.listar(qs)
 
 
-class AlertaEnviadoViewSet(viewsets.ModelViewSet):
-    queryset = AlertaEnviado.objects.all()
+class AlertaEnviadoViewSet(ListagemPaginadaMixin, viewsets.ModelViewSet):
+    queryset = AlertaEnviado.objects.prefetch_related("alunos__user")
     serializer_class = AlertaEnviadoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AlertaEnviadoPagination
 
     @decorators.action(detail=False, methods=["get"])
     def enviados(self, request):
-        qs = AlertaEnviado.objects.enviados()
-        return Response(AlertaEnviadoSerializer(qs, many=True).data)
+        qs = AlertaEnviado.objects.enviados().prefetch_related("alunos__user")
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def falhos(self, request):
-        qs = AlertaEnviado.objects.falhos()
-        return Response(AlertaEnviadoSerializer(qs, many=True).data)
+        qs = AlertaEnviado.objects.falhos().prefetch_related("alunos__user")
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["get"])
     def pendentes(self, request):
-        qs = AlertaEnviado.objects.pendentes()
-        return Response(AlertaEnviadoSerializer(qs, many=True).data)
+        qs = AlertaEnviado.objects.pendentes().prefetch_related("alunos__user")
+        return self.listar(qs)
 
     @decorators.action(detail=False, methods=["post"])
     def reprocessar(self, request):
-        falhos = AlertaEnviado.objects.filter(status="FALHA NO ENVIO")
-        reprocessados = []
-        for alerta in falhos:
-            enviar_alerta_email.delay(alerta.pk)
-            reprocessados.append(alerta.pk)
-        return Response({"mensagem": f"{len(reprocessados)} alertas reprocessados", "ids": reprocessados})
+        """Cria um job de reenvio dos alertas falhados e enfileira-o; o progresso e consultado pelo id."""
+        try:
+            taxa = float(request.data.get("taxa_por_segundo", 10))
+        except (TypeError, ValueError):
+            raise ValidationError({"taxa_por_segundo": "Deve ser um numero."})
+        if taxa <= 0:
+            raise ValidationError({"taxa_por_segundo": "Deve ser maior que zero."})
+        reenvio = criar_reenvio(taxa)
+        reenviar_alertas.delay(reenvio.pk)
+        return Response(ReenvioAlertasSerializer(reenvio).data, status=status.HTTP_202_ACCEPTED)
+
+    @decorators.action(detail=False, methods=["get"], url_path=r"reprocessar/(?P<reenvio_id>\d+)")
+    def progresso_reprocessamento(self, request, reenvio_id=None):
+        reenvio = get_object_or_404(ReenvioAlertas, pk=reenvio_id)
+        return Response(ReenvioAlertasSerializer(reenvio).data)
+
+
+class ExtratoEncarregadoViewSet(viewsets.GenericViewSet):
+    queryset = Encarregado.objects.select_related("user")
+    permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
+
+    @decorators.action(detail=True, methods=["get"])
+    def extrato(self, request, pk=None):
+        """Extrato de todos os educandos com ETag: If-None-Match igual devolve 304 sem montar o extrato."""
+        encarregado = self.get_object()
+        etag = quote_etag(versao_extrato(encarregado))
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(montar_extrato(encarregado))
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        return response
 
 
 class FinanceiroResumoViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
+    @staticmethod
+    def _data(request, nome):
+        valor = request.query_params.get(nome)
+        if not valor:
+            return None
+        try:
+            data = parse_date(valor)
+        except ValueError:
+            data = None
+        if data is None:
+            raise ValidationError({nome: "Data invalida, use o formato AAAA-MM-DD."})
+        return data
+
     @action(detail=False, methods=["get"])
     def resumo(self, request):
-        # total de mensalidades
-        total_mensalidade = Mensalidade.objects.count()
-        total_mensalidade_pagas = Mensalidade.objects.pagas().count()
-        total_mensalidade_pendentes = Mensalidade.objects.pendentes().count()
-        total_mensalidade_atrasadas = Mensalidade.objects.atrasadas().count()
-
-        # Totais de pagamentos
-        total_pagamento = Pagamento.objects.count()
-        valor_recebido = sum(p.valor for p in Pagamento.objects.all())
-
-        # Totais de salários
-        total_salarios = Salario.objects.count()
-        salarios_pagos = Salario.objects.pagos().count()
-        salarios_pendentes = Salario.objects.pendentes().count()
-
-        # Totais de faturas
-        total_faturas = Fatura.objects.count()
-        faturas_pagas = Fatura.objects.pagas().count()
-        faturas_vencidas = Fatura.objects.vencidas().count()
+        inicio = self._data(request, "inicio")
+        fim = self._data(request, "fim")
+        return Response(obter_resumo(inicio, fim))
+
+    @action(detail=False, methods=["get"])
+    def cache(self, request):
+        """Hits/misses do cache dos agregados (totais dos managers e saldos)."""
+        return Response(estatisticas_cache())
+
+
+class ProjecaoViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        """Projecao de divida, multas e receita esperada (?dias=0,30,60,90 ou ?datas=AAAA-MM-DD,...)."""
+        if "datas" in request.query_params:
+            try:
+                datas = [parse_date(valor) for valor in request.query_params["datas"].split(",")]
+            except ValueError:
+                datas = [None]
+            if None in datas:
+                raise ValidationError({"datas": "Use datas AAAA-MM-DD separadas por virgula."})
+        else:
+            try:
+                dias = [int(valor) for valor in request.query_params.get("dias", "").split(",") if valor]
+            except ValueError:
+                raise ValidationError({"dias": "Use numeros de dias separados por virgula, ex: 0,30,60."})
+            datas = datas_projecao(dias or DIAS_PADRAO)
+        if len(datas) > MAX_DATAS:
+            raise ValidationError({"datas": f"No maximo {MAX_DATAS} datas."})
+        return Response(obter_projecao(sorted(set(datas))))
+
 
+class RelatorioViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    @action(detail=False, methods=["get"])
+    def mensal(self, request):
+        """Relatorio mensal lido do rollup ResumoMensal (?entidade=&status=&metodo_pagamento=&anos=2025,2026)."""
+        qs = ResumoMensal.objects.all()
+        for campo in ("entidade", "status", "metodo_pagamento"):
+            if campo in request.query_params:
+                qs = qs.filter(**{campo: request.query_params[campo].upper()})
+        anos = request.query_params.get("anos")
+        if anos:
+            try:
+                qs = qs.filter(mes__year__in=[int(ano) for ano in anos.split(",")])
+            except ValueError:
+                raise ValidationError({"anos": "Use anos separados por virgula, ex: 2025,2026."})
+
+        totais = (
+            qs.annotate(ano=ExtractYear("mes")).order_by("ano", "entidade")
+            .values("ano", "entidade").annotate(quantidade=Sum("quantidade"), valor_total=Sum("valor_total"))
+        )
         return Response({
-            "mensalidade": {
-                "total": total_mensalidade,
-                "pagas": total_mensalidade_pagas,
-                "pendentes": total_mensalidade_pendentes,
-                "atrasadas": total_mensalidade_atrasadas,
-            },
-            "pagamento": {
-                "total": total_pagamento,
-                "valor_recebido": valor_recebido,
-            },
-            "salarios": {
-                "total": total_salarios,
-                "pagos": salarios_pagos,
-                "pendentes": salarios_pendentes,
-            },
-            "fatura": {
-                "total": total_faturas,
-                "pagas": faturas_pagas,
-                "vencidas": faturas_vencidas,
-            }
+            "totais": list(totais),
+            "resultados": ResumoMensalSerializer(qs, many=True).data,
         })
+
+    @action(detail=False, methods=["get"])
+    def antiguidade(self, request):
+        """Saldos em aberto por faixa de atraso (?agrupar_por=encarregado|escola|rota&data=&limite=)."""
+        agrupar_por = request.query_params.get("agrupar_por", "encarregado")
+        if agrupar_por not in AGRUPAMENTOS:
+            raise ValidationError({"agrupar_por": f"Use {', '.join(AGRUPAMENTOS)}."})
+        try:
+            limite = int(request.query_params.get("limite", 0))
+            if limite < 0:
+                raise ValueError
+        except ValueError:
+            raise ValidationError({"limite": "Deve ser um numero inteiro nao negativo."})
+        as_of = FinanceiroResumoViewSet._data(request, "data")
+        return Response(relatorio_antiguidade(agrupar_por, as_of, limite=limite or None))
+
+    @action(detail=False, methods=["get"])
+    def razao(self, request):
+        """Saldo de cada conta do razao no fim do dia (?data=AAAA-MM-DD, padrao: hoje)."""
+        data = FinanceiroResumoViewSet._data(request, "data") or timezone.localdate()
+        return Response({"data": data, "saldos": saldos(data)})